@@ -0,0 +1,80 @@
+"""
+app_startup.py
+
+Startup helpers for the Kivy apps:
+
+- StartupTimer: marks named startup phases relative to process start and
+  reports time-to-first-interactive-frame to registered hooks
+- LazyScreenManager: each screen's KV rules are loaded and the screen is
+  built on first navigation instead of all at once in build()
+
+Import this module first so its clock starts as early as possible.
+"""
+
+import time
+
+_PROCESS_START = time.perf_counter()
+
+from kivy.lang import Builder
+from kivy.uix.screenmanager import ScreenManager
+
+
+class StartupTimer:
+    def __init__(self):
+        self.marks = {}
+        self.hooks = [print_startup_report]
+        self._finished = False
+
+    def mark(self, name):
+        self.marks[name] = time.perf_counter() - _PROCESS_START
+
+    def add_hook(self, hook):
+        """hook(marks) is called once with {phase: seconds since process start}."""
+        self.hooks.append(hook)
+
+    def watch_first_frame(self):
+        """Record first_frame when the window is next flipped, i.e. the first frame is on screen."""
+        from kivy.core.window import Window
+
+        def on_flip(window):
+            Window.unbind(on_flip=on_flip)
+            self._finish()
+
+        Window.bind(on_flip=on_flip)
+
+    def _finish(self):
+        if self._finished:
+            return
+        self._finished = True
+        self.mark("first_frame")
+        for hook in self.hooks:
+            hook(dict(self.marks))
+
+
+def print_startup_report(marks):
+    phases = ", ".join(f"{name}={seconds * 1000:.0f}ms" for name, seconds in marks.items())
+    print(f"⏱️ Startup: {phases}")
+
+
+class LazyScreenManager(ScreenManager):
+    """ScreenManager whose screens are created on first use.
+
+    `factories` maps screen name -> (kv_rules, screen_class); the KV rules
+    are loaded right before the first instance is created.
+    """
+
+    def __init__(self, factories, **kwargs):
+        super().__init__(**kwargs)
+        self._factories = factories
+
+    def ensure(self, name):
+        if not self.has_screen(name):
+            kv, screen_class = self._factories[name]
+            if kv:
+                Builder.load_string(kv)
+            self.add_widget(screen_class(name=name))
+        return self.get_screen(name)
+
+    def show(self, name):
+        self.ensure(name)
+        self.current = name
@@ -0,0 +1,90 @@
+"""
+app_tasks.py
+
+Background work for the Kivy apps so event handlers never block a frame:
+
+- Tasks run on a small worker thread pool
+- Results/errors are delivered back on the Kivy main thread via Clock
+- Tasks are keyed: submitting again under the same key supersedes the
+  previous one (repeated taps coalesce, only the latest result is shown)
+- Pending tasks can be cancelled by key or all at once
+"""
+
+import threading
+import traceback
+from concurrent.futures import ThreadPoolExecutor
+
+from kivy.clock import Clock
+
+MAX_WORKERS = 2
+
+
+class Task:
+    def __init__(self, key):
+        self.key = key
+        self.cancelled = False
+        self.future = None
+
+    def cancel(self):
+        self.cancelled = True
+        if self.future is not None:
+            self.future.cancel()
+
+
+class TaskRunner:
+    def __init__(self, max_workers=MAX_WORKERS):
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="app-task")
+        self._current = {}
+        self._lock = threading.Lock()
+
+    def submit(self, key, fn, *args, on_result=None, on_error=None, **kwargs):
+        """Run fn(*args, **kwargs) in the background.
+
+        on_result(value) / on_error(exc) are called on the main thread, and
+        only if this task is still the latest one for `key`.
+        """
+        task = Task(key)
+        with self._lock:
+            previous = self._current.get(key)
+            if previous is not None:
+                previous.cancel()
+            self._current[key] = task
+        task.future = self._executor.submit(self._run, task, fn, args, kwargs, on_result, on_error)
+        return task
+
+    def cancel(self, key):
+        with self._lock:
+            task = self._current.pop(key, None)
+        if task is not None:
+            task.cancel()
+
+    def cancel_all(self):
+        with self._lock:
+            tasks, self._current = list(self._current.values()), {}
+        for task in tasks:
+            task.cancel()
+
+    def shutdown(self):
+        self.cancel_all()
+        self._executor.shutdown(wait=False)
+
+    def _run(self, task, fn, args, kwargs, on_result, on_error):
+        if task.cancelled:
+            return
+        try:
+            value = fn(*args, **kwargs)
+        except Exception as e:
+            traceback.print_exc()
+            self._deliver(task, on_error, e)
+        else:
+            self._deliver(task, on_result, value)
+
+    def _deliver(self, task, callback, value):
+        def _on_main_thread(dt):
+            with self._lock:
+                if task.cancelled or self._current.get(task.key) is not task:
+                    return
+                del self._current[task.key]
+            if callback is not None:
+                callback(value)
+        Clock.schedule_once(_on_main_thread)
@@ -0,0 +1,324 @@
+"""
+benchmark.py
+
+Reproducible load benchmark for the server.py endpoints:
+
+- Synthetic readings sampled (seeded) from Final_crop_data.csv
+- Drives each scenario in-process through Flask's test client and/or
+  against a locally started gunicorn over HTTP with concurrent clients
+- Reports throughput, p50/p95/p99 latency, errors and RSS, and saves
+  the results as JSON (tagged with the git commit) for comparison
+
+Usage:
+    python benchmark.py run [--mode inprocess|gunicorn|both] [--requests N] ...
+    python benchmark.py compare old.json new.json [--threshold 10]
+"""
+
+import argparse
+import http.client
+import json
+import os
+import platform
+import resource
+import socket
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timezone
+
+import numpy as np
+import pandas as pd
+
+DATA_FILE = "Final_crop_data.csv"
+RESULTS_DIR = "bench_results"
+SCENARIOS = ["sensor_data", "fertilizer_plan", "chart_npk", "chart_soil", "report_pdf", "dashboard"]
+
+
+# ---------------------------
+# Synthetic workload
+# ---------------------------
+def load_readings(n, seed=0, path=DATA_FILE):
+    """n readings sampled with replacement from the dataset, with small jitter."""
+    data = pd.read_csv(path).rename(columns={"ph": "pH"})
+    rng = np.random.default_rng(seed)
+    rows = data.iloc[rng.integers(0, len(data), n)]
+    features = ["N", "P", "K", "moisture", "temperature", "pH"]
+    values = rows[features].to_numpy(dtype=float) * rng.normal(1.0, 0.02, (n, len(features)))
+    crops = rows["label"].tolist()
+    return [({f: round(float(v), 2) for f, v in zip(features, row)}, crop)
+            for row, crop in zip(values, crops)]
+
+
+def build_request(scenario, reading, crop):
+    """(method, path, json body) for one request of a scenario."""
+    if scenario == "sensor_data":
+        return "POST", "/sensor-data", reading
+    if scenario == "fertilizer_plan":
+        return "POST", "/fertilizer-plan", {"crop": crop, "sensor_data": reading}
+    if scenario == "chart_npk":
+        return "POST", "/chart/npk", {"crop": crop, "sensor_data": reading}
+    if scenario == "chart_soil":
+        return "POST", "/chart/soil", {"crop": crop, "sensor_data": reading}
+    if scenario == "report_pdf":
+        return "POST", "/report/pdf", {"crop": crop, "sensor_data": reading}
+    if scenario == "dashboard":
+        return "GET", "/dashboard", None
+    raise ValueError(f"Unknown scenario: {scenario}")
+
+
+def summarize(latencies, errors, elapsed):
+    ms = np.asarray(latencies) * 1000
+    return {
+        "requests": len(latencies),
+        "errors": errors,
+        "seconds": round(elapsed, 3),
+        "throughput_rps": round(len(latencies) / elapsed, 1) if elapsed else None,
+        "p50_ms": round(float(np.percentile(ms, 50)), 3),
+        "p95_ms": round(float(np.percentile(ms, 95)), 3),
+        "p99_ms": round(float(np.percentile(ms, 99)), 3),
+        "max_ms": round(float(ms.max()), 3),
+    }
+
+
+# ---------------------------
+# In-process (Flask test client)
+# ---------------------------
+def self_rss_mb():
+    # ru_maxrss is KiB on Linux
+    return round(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024, 1)
+
+
+def scratch_env():
+    """Keep benchmark readings/metrics out of data/, quiet the per-request logs and measure
+    capacity rather than admission control (one client would otherwise hit the device limit)."""
+    scratch = tempfile.mkdtemp(prefix="crop-bench-")
+    return {"METRICS_DIR": os.path.join(scratch, "metrics"),
+            "READINGS_DIR": os.path.join(scratch, "readings"),
+            "RATE_LIMIT_DIR": os.path.join(scratch, "ratelimit"),
+            "WAL_DIR": os.path.join(scratch, "wal"),
+            "DEDUP_DIR": os.path.join(scratch, "dedup"),
+            "LOG_LEVEL": "WARNING",
+            "DEVICE_RATE": "0", "GLOBAL_UPLOAD_RATE": "0",
+            "CHART_CONCURRENCY": "0", "REPORT_CONCURRENCY": "0"}
+
+
+def run_inprocess(scenarios, workload, warmup):
+    for key, value in scratch_env().items():
+        os.environ.setdefault(key, value)
+    import server
+
+    client = server.app.test_client()
+    results = {}
+    for scenario in scenarios:
+        for reading, crop in workload[:warmup]:
+            method, path, body = build_request(scenario, reading, crop)
+            client.open(path, method=method, json=body).get_data()
+        latencies, errors = [], 0
+        start = time.perf_counter()
+        for reading, crop in workload:
+            method, path, body = build_request(scenario, reading, crop)
+            t = time.perf_counter()
+            response = client.open(path, method=method, json=body)
+            response.get_data()  # drain streamed bodies
+            latencies.append(time.perf_counter() - t)
+            errors += response.status_code >= 400
+        results[scenario] = {**summarize(latencies, errors, time.perf_counter() - start), "rss_mb": self_rss_mb()}
+        print(f"  {scenario:16s} {results[scenario]['throughput_rps']:>9} rps  "
+              f"p50 {results[scenario]['p50_ms']}ms  p99 {results[scenario]['p99_ms']}ms")
+    return results
+
+
+# ---------------------------
+# Gunicorn over HTTP
+# ---------------------------
+def free_port():
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def process_tree_rss_mb(pid):
+    """RSS of a process and its children from /proc (Linux); None elsewhere."""
+    def rss(p):
+        try:
+            with open(f"/proc/{p}/status") as f:
+                for line in f:
+                    if line.startswith("VmRSS:"):
+                        return int(line.split()[1])
+        except OSError:
+            pass
+        return 0
+
+    if not os.path.isdir("/proc"):
+        return None
+    total = rss(pid)
+    try:
+        children = open(f"/proc/{pid}/task/{pid}/children").read().split()
+    except OSError:
+        children = []
+    total += sum(rss(int(c)) for c in children)
+    return round(total / 1024, 1)
+
+
+class GunicornServer:
+    def __init__(self, workers=2, threads=1):
+        self.workers = workers
+        self.threads = threads
+        self.port = free_port()
+        self.process = None
+
+    def __enter__(self):
+        env = {**os.environ, **scratch_env()}
+        self.process = subprocess.Popen(
+            [sys.executable, "-m", "gunicorn", "server:app", "--bind", f"127.0.0.1:{self.port}",
+             "--workers", str(self.workers), "--threads", str(self.threads)],
+            env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+        deadline = time.time() + 60
+        while time.time() < deadline:
+            try:
+                conn = http.client.HTTPConnection("127.0.0.1", self.port, timeout=2)
+                conn.request("GET", "/crops")
+                if conn.getresponse().status == 200:
+                    return self
+            except OSError:
+                time.sleep(0.2)
+            if self.process.poll() is not None:
+                break
+        self.__exit__(None, None, None)
+        raise RuntimeError("gunicorn did not start")
+
+    def __exit__(self, *exc):
+        if self.process and self.process.poll() is None:
+            self.process.terminate()
+            self.process.wait(timeout=30)
+
+
+def run_http(scenarios, workload, warmup, concurrency, workers, threads):
+    results = {}
+    with GunicornServer(workers, threads) as gunicorn:
+        local = threading.local()
+
+        def send(item):
+            scenario, (reading, crop) = item
+            conn = getattr(local, "conn", None)
+            if conn is None:
+                conn = local.conn = http.client.HTTPConnection("127.0.0.1", gunicorn.port, timeout=60)
+            method, path, body = build_request(scenario, reading, crop)
+            payload = json.dumps(body) if body is not None else None
+            t = time.perf_counter()
+            try:
+                conn.request(method, path, body=payload, headers={"Content-Type": "application/json"})
+                response = conn.getresponse()
+                response.read()
+                status = response.status
+            except (OSError, http.client.HTTPException):
+                local.conn = None
+                status = 599
+            return time.perf_counter() - t, status
+
+        with ThreadPoolExecutor(max_workers=concurrency) as pool:
+            for scenario in scenarios:
+                list(pool.map(send, [(scenario, w) for w in workload[:warmup]]))
+                start = time.perf_counter()
+                outcomes = list(pool.map(send, [(scenario, w) for w in workload]))
+                elapsed = time.perf_counter() - start
+                latencies = [t for t, _ in outcomes]
+                errors = sum(status >= 400 for _, status in outcomes)
+                results[scenario] = {**summarize(latencies, errors, elapsed),
+                                     "rss_mb": process_tree_rss_mb(gunicorn.process.pid)}
+                print(f"  {scenario:16s} {results[scenario]['throughput_rps']:>9} rps  "
+                      f"p50 {results[scenario]['p50_ms']}ms  p99 {results[scenario]['p99_ms']}ms")
+    return results
+
+
+# ---------------------------
+# Results
+# ---------------------------
+def git_commit():
+    try:
+        return subprocess.check_output(["git", "rev-parse", "--short", "HEAD"], text=True).strip()
+    except (OSError, subprocess.CalledProcessError):
+        return "unknown"
+
+
+def run(args):
+    scenarios = args.scenarios or SCENARIOS
+    workload = load_readings(args.requests, args.seed)
+    report = {
+        "commit": git_commit(),
+        "timestamp": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+        "python": platform.python_version(),
+        "machine": platform.machine(),
+        "cpus": os.cpu_count(),
+        "config": {"requests": args.requests, "warmup": args.warmup, "seed": args.seed,
+                   "concurrency": args.concurrency, "workers": args.workers, "threads": args.threads},
+        "results": {},
+    }
+    if args.mode in ("inprocess", "both"):
+        print("In-process (Flask test client):")
+        report["results"]["inprocess"] = run_inprocess(scenarios, workload, args.warmup)
+    if args.mode in ("gunicorn", "both"):
+        print(f"gunicorn ({args.workers} workers, {args.concurrency} clients):")
+        report["results"]["gunicorn"] = run_http(scenarios, workload, args.warmup,
+                                                 args.concurrency, args.workers, args.threads)
+
+    output = args.output or os.path.join(RESULTS_DIR, f"{report['commit']}-{args.mode}.json")
+    os.makedirs(os.path.dirname(output) or ".", exist_ok=True)
+    with open(output, "w") as f:
+        json.dump(report, f, indent=2)
+    print(f"✅ Results saved to {output}")
+
+
+def compare(args):
+    """Print per-scenario changes; exit 1 if any p95 or throughput regressed beyond the threshold."""
+    with open(args.old) as f:
+        old = json.load(f)
+    with open(args.new) as f:
+        new = json.load(f)
+    regressed = False
+    print(f"{old['commit']} → {new['commit']}")
+    for mode, scenarios in new["results"].items():
+        for scenario, current in scenarios.items():
+            before = old["results"].get(mode, {}).get(scenario)
+            if before is None:
+                continue
+            p95 = (current["p95_ms"] - before["p95_ms"]) / before["p95_ms"] * 100
+            rps = (current["throughput_rps"] - before["throughput_rps"]) / before["throughput_rps"] * 100
+            flag = ""
+            if p95 > args.threshold or rps < -args.threshold:
+                flag, regressed = "  ⚠️ regression", True
+            print(f"  {mode:9s} {scenario:16s} p95 {before['p95_ms']:.2f} → {current['p95_ms']:.2f}ms ({p95:+.1f}%)  "
+                  f"rps {before['throughput_rps']} → {current['throughput_rps']} ({rps:+.1f}%){flag}")
+    return 1 if regressed else 0
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark the crop server endpoints")
+    commands = parser.add_subparsers(dest="command", required=True)
+    bench = commands.add_parser("run", help="Run the benchmark and save results as JSON")
+    bench.add_argument("--mode", choices=["inprocess", "gunicorn", "both"], default="inprocess")
+    bench.add_argument("--requests", type=int, default=300, help="Measured requests per scenario")
+    bench.add_argument("--warmup", type=int, default=20, help="Unmeasured requests per scenario")
+    bench.add_argument("--scenarios", nargs="+", choices=SCENARIOS)
+    bench.add_argument("--seed", type=int, default=0)
+    bench.add_argument("--concurrency", type=int, default=8, help="HTTP clients (gunicorn mode)")
+    bench.add_argument("--workers", type=int, default=2, help="gunicorn workers")
+    bench.add_argument("--threads", type=int, default=1, help="gunicorn threads per worker")
+    bench.add_argument("-o", "--output", help=f"Results file (default: {RESULTS_DIR}/<commit>-<mode>.json)")
+    diff = commands.add_parser("compare", help="Compare two result files")
+    diff.add_argument("old")
+    diff.add_argument("new")
+    diff.add_argument("--threshold", type=float, default=10.0, help="Regression threshold in percent")
+    args = parser.parse_args(argv)
+
+    if args.command == "run":
+        run(args)
+        return 0
+    return compare(args)
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -16,7 +16,7 @@ source.dir = .
 source.main = main.py
 
 # (list) List of source files to include (like KV files, images)
-source.include_exts = py,png,jpg,kv,txt
+source.include_exts = py,png,jpg,kv,txt,json
 
 # (str) Application version
 version = 1.0
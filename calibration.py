@@ -0,0 +1,134 @@
+"""
+calibration.py
+
+- Build a confidence calibration table for the crop model (training time)
+- Apply it at serve time with a vectorised interpolation
+- Load per-crop confidence thresholds from config
+
+Run `python calibration.py` after retraining to refresh
+confidence_calibration.pkl from Final_crop_data.csv.
+"""
+
+import json
+import os
+import sys
+
+import joblib
+import numpy as np
+
+CALIBRATION_FILE = "confidence_calibration.pkl"
+THRESHOLDS_FILE = "confidence_thresholds.json"
+DATA_FILE = "Final_crop_data.csv"
+
+# Points used to tabulate a Platt (sigmoid) fit so both methods share one format
+PLATT_GRID_SIZE = 101
+
+
+# ---------------------------
+# Serve time
+# ---------------------------
+def calibrate(confidence, table):
+    """Map raw forest vote shares to calibrated probabilities.
+
+    `confidence` may be a scalar or an array; `table` is the dict written by
+    build_calibration(). Without a table the raw value is returned.
+    """
+    if table is None:
+        return confidence
+    return np.interp(confidence, table["x"], table["y"])
+
+
+def load_calibration(path=CALIBRATION_FILE):
+    if not os.path.exists(path):
+        return None
+    table = joblib.load(path)
+    return {"x": np.asarray(table["x"], dtype=float),
+            "y": np.asarray(table["y"], dtype=float),
+            "method": table.get("method", "isotonic")}
+
+
+def load_thresholds(default, path=THRESHOLDS_FILE):
+    """Return (default_threshold, {crop: threshold}) from the JSON config."""
+    if not os.path.exists(path):
+        return default, {}
+    with open(path, "r") as f:
+        config = json.load(f)
+    crops = {str(k).lower(): float(v) for k, v in config.get("crops", {}).items()}
+    return float(config.get("default", default)), crops
+
+
+# ---------------------------
+# Training time
+# ---------------------------
+def held_out_confidences(model, X, y, n_splits=5, random_state=42):
+    """Out-of-fold top vote share and whether that vote was correct.
+
+    Each fold is scored by a fresh copy of `model` fitted on the other folds,
+    so the confidences match what the deployed model sees on unseen readings.
+    """
+    from sklearn.base import clone
+    from sklearn.model_selection import StratifiedKFold
+
+    confidences = np.empty(len(y), dtype=float)
+    correct = np.empty(len(y), dtype=float)
+    folds = StratifiedKFold(n_splits=n_splits, shuffle=True, random_state=random_state)
+    for train_idx, test_idx in folds.split(X, y):
+        fold_model = clone(model).fit(X[train_idx], y[train_idx])
+        proba = fold_model.predict_proba(X[test_idx])
+        confidences[test_idx] = proba.max(axis=1)
+        correct[test_idx] = fold_model.classes_[proba.argmax(axis=1)] == y[test_idx]
+    return confidences, correct
+
+
+def build_calibration(confidences, correct, n_classes, method="isotonic"):
+    """Fit a monotone confidence -> P(correct) map and return it as lookup arrays.
+
+    The table is anchored at chance level (1 / n_classes) so vote shares below
+    anything seen on held-out data are not extrapolated upwards.
+    """
+    if method == "isotonic":
+        from sklearn.isotonic import IsotonicRegression
+        iso = IsotonicRegression(y_min=0.0, y_max=1.0, out_of_bounds="clip")
+        iso.fit(confidences, correct)
+        x, y = iso.X_thresholds_, iso.y_thresholds_
+    elif method == "platt":
+        from sklearn.linear_model import LogisticRegression
+        if correct.min() == correct.max():
+            raise ValueError("Platt scaling needs both correct and incorrect held-out predictions; use isotonic")
+        lr = LogisticRegression()
+        lr.fit(confidences.reshape(-1, 1), correct.astype(int))
+        x = np.linspace(0.0, 1.0, PLATT_GRID_SIZE)
+        y = lr.predict_proba(x.reshape(-1, 1))[:, 1]
+    else:
+        raise ValueError(f"Unknown calibration method: {method}")
+
+    chance = 1.0 / n_classes
+    keep = x > chance
+    x = np.concatenate(([chance], x[keep]))
+    y = np.concatenate(([chance], np.maximum(y[keep], chance)))
+    return {"x": np.asarray(x, dtype=float), "y": np.asarray(y, dtype=float), "method": method}
+
+
+def main(argv=None):
+    argv = sys.argv[1:] if argv is None else argv
+    method = argv[0] if argv else "isotonic"
+
+    import pandas as pd
+
+    model = joblib.load("crop_recommendation_model.pkl")
+    le = joblib.load("label_encoder.pkl")
+    feature_order = joblib.load("feature_order.pkl")
+
+    data = pd.read_csv(DATA_FILE)
+    X = data[feature_order].to_numpy(dtype=float)
+    y = le.transform(data["label"])
+
+    confidences, correct = held_out_confidences(model, X, y)
+    table = build_calibration(confidences, correct, len(le.classes_), method)
+    joblib.dump(table, CALIBRATION_FILE)
+    print(f"Calibration ({method}) saved to {CALIBRATION_FILE}: {len(table['x'])} points, "
+          f"held-out accuracy {correct.mean():.3f}")
+
+
+if __name__ == "__main__":
+    main()
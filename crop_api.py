@@ -1,5 +1,8 @@
 from flask import Flask, request, jsonify
 import joblib
+import numpy as np
+from crop_registry import get_registry
+from crop_rules import RULE_FEATURES, rule_based_recommendation, rule_based_recommendation_batch
 
 app = Flask(__name__)
 
@@ -16,15 +19,10 @@ except Exception as e:
     print("⚠️ ML model not found, using rule-based fallback", e)
 
 # ---------------------------
-# Safe limits
+# Safe limits (crop_registry.json)
 # ---------------------------
-safe_limits = {
-    'N': (0, 130),
-    'P': (0, 90),
-    'K': (10, 60),
-    'temperature': (10, 40),
-    'rainfall': (0, 500)
-}
+registry = get_registry()
+safe_limits = registry.safe_limits
 
 def validate_crop_inputs(values: dict):
     for feature, (min_val, max_val) in safe_limits.items():
@@ -35,41 +33,17 @@ def validate_crop_inputs(values: dict):
             return False, f"{feature} = {value} is out of safe range ({min_val}-{max_val})"
     return True, "Inputs OK"
 
-# ---------------------------
-# Rule-based crop recommendation
-# ---------------------------
-def rule_based_recommendation(N, P, K, temperature, rainfall):
-    if N > 60 and P > 40 and K > 30 and temperature > 25 and rainfall > 120:
-        return "Maize"
-    elif N < 40 and P > 50 and K > 20 and rainfall > 150:
-        return "Beans"
-    elif temperature > 30 and rainfall < 80:
-        return "Mango"
-    elif N < 30 and rainfall < 100:
-        return "Cowpeas"
-    elif N > 50 and P > 50 and K > 30 and rainfall > 200:
-        return "Watermelon"
-    else:
-        return "Groundnuts"
-
 # ---------------------------
 # Ideal soil (ranges)
 # ---------------------------
-ideal_soil = {
-    "Maize": {"N": (70,90), "P": (35,45), "K": (50,65), "temperature": (24,28), "rainfall": (100,140), "pH": (6.3,6.8)},
-    "Groundnuts": {"N": (20,30), "P": (25,35), "K": (25,35), "temperature": (26,30), "rainfall": (90,120), "pH": (5.8,6.3)},
-    "Cowpeas": {"N": (15,25), "P": (20,30), "K": (15,25), "temperature": (28,32), "rainfall": (80,100), "pH": (5.8,6.2)},
-    "Beans": {"N": (35,45), "P": (45,55), "K": (25,35), "temperature": (20,25), "rainfall": (140,160), "pH": (5.8,6.2)},
-    "Watermelon": {"N": (50,70), "P": (50,60), "K": (35,45), "temperature": (30,34), "rainfall": (180,220), "pH": (6.2,6.8)},
-    "Mango": {"N": (45,55), "P": (35,45), "K": (30,40), "temperature": (32,35), "rainfall": (60,80), "pH": (5.8,6.2)}
-}
+PLAN_FEATURES = ["N", "P", "K", "temperature", "rainfall", "pH"]
+ideal_soil = registry.by_name({crop: {f: (r[f]["min"], r[f]["max"]) for f in PLAN_FEATURES}
+                               for crop, r in registry.ranges.items()})
 
 # ---------------------------
 # Fertilizer info
 # ---------------------------
-FERTILIZER_INFO = {"Urea":{"nutrient":"N","pct_nutrient":0.46},
-                   "DAP":{"nutrient":"P","pct_nutrient":0.18},
-                   "MOP":{"nutrient":"K","pct_nutrient":0.50}}
+FERTILIZER_INFO = registry.fertilizers
 
 def fertilizer_amounts_from_deficit(deficit_dict):
     rec = {}
@@ -85,13 +59,10 @@ def fertilizer_recommendation(crop, readings):
     crop = crop.capitalize()
     if crop not in ideal_soil:
         return None
-    ideal = ideal_soil[crop]
-    deficits = {}
-    for nutrient in ["N","P","K","temperature","rainfall","pH"]:
-        if nutrient in ideal:
-            min_val,max_val = ideal[nutrient]
-            value = readings.get(nutrient,0)
-            deficits[f"{nutrient}_needed"] = round(max(0,min_val - value),2)
+    values = np.array([[readings.get(f, 0) for f in PLAN_FEATURES]], dtype=float)
+    codes, gaps = registry.status(registry.crop_ids([crop]), values, PLAN_FEATURES)
+    shortfall = np.where(codes < 0, gaps, 0.0)[0]
+    deficits = {f"{f}_needed": round(float(v), 2) for f, v in zip(PLAN_FEATURES, shortfall)}
     ferts = fertilizer_amounts_from_deficit(deficits)
     return {"deficits": deficits, "fertilizers": ferts}
 
@@ -109,6 +80,36 @@ def ml_predict_crop(readings):
     except:
         return None
 
+def ml_predict_crops(columns):
+    """Batched ML prediction over column arrays; None if the model can't score them."""
+    if not use_ml:
+        return None
+    try:
+        features = np.column_stack([columns[f] for f in RULE_FEATURES])
+        pred = model.predict(features)
+        return le.inverse_transform(pred) if le else pred.astype(str)
+    except:
+        return None
+
+# ---------------------------
+# Batched recommendation (array in, array out)
+# ---------------------------
+def validate_crop_inputs_batch(columns):
+    """Return a boolean mask of rows that are inside safe_limits."""
+    features = list(safe_limits)
+    return registry.within_limits_batch(np.column_stack([columns[f] for f in features]), features, safe_limits)
+
+def recommend_crops_batch(columns):
+    """Recommend a crop for every row of `columns` ({feature: array}).
+
+    Uses the ML model when it can score the batch, otherwise the compiled
+    rule table; no per-row Python either way.
+    """
+    crops = ml_predict_crops(columns)
+    if crops is None:
+        crops = rule_based_recommendation_batch(*(columns[f] for f in RULE_FEATURES))
+    return crops
+
 # ---------------------------
 # Simulated sensor readings
 # ---------------------------
@@ -130,6 +131,23 @@ def recommend_crop():
         crop = rule_based_recommendation(readings['N'],readings['P'],readings['K'],readings['temperature'],readings['rainfall'])
     return jsonify({"recommended_crop": crop})
 
+@app.route('/recommend_crop_batch', methods=['POST'])
+def recommend_crop_batch():
+    data = request.get_json()
+    readings = data.get("readings", {})
+    try:
+        columns = {f: np.asarray(readings[f], dtype=float) for f in safe_limits}
+    except KeyError as e:
+        return jsonify({"error": f"Missing feature: {e.args[0]}"}),400
+    except (TypeError, ValueError):
+        return jsonify({"error": "Readings must be numeric arrays"}),400
+    if len({len(v) for v in columns.values()}) != 1:
+        return jsonify({"error": "All feature arrays must have the same length"}),400
+    valid = validate_crop_inputs_batch(columns)
+    if not valid.all():
+        return jsonify({"error": "Inputs out of safe range", "invalid_rows": np.flatnonzero(~valid).tolist()}),400
+    return jsonify({"recommended_crops": recommend_crops_batch(columns).tolist()})
+
 @app.route('/ideal_soil', methods=['POST'])
 def ideal_soil_endpoint():
     data = request.get_json()
@@ -1,69 +1,49 @@
 # crop_app.py
+from app_startup import StartupTimer, LazyScreenManager
 from kivymd.app import MDApp
-from kivy.lang import Builder
-from kivy.uix.screenmanager import ScreenManager, Screen
+from kivy.properties import StringProperty
+from kivy.uix.screenmanager import Screen
 from kivymd.uix.menu import MDDropdownMenu
 from kivy.metrics import dp
-import joblib
+from crop_registry import get_registry
+from crop_rules import rule_based_recommendation
+from crop_model_lite import load_lite_model
+from sync_client import SyncClient
+from app_tasks import TaskRunner
+from translations import translations
 
 # ---------------------------
-# Load ML model (optional)
+# On-device ML model (optional, loaded in the background at startup)
 # ---------------------------
 use_ml = False
-model = None
-le = None
-try:
-    model = joblib.load("crop_recommendation_model.pkl")
-    le = joblib.load("label_encoder.pkl")
-    use_ml = True
-    print("✅ ML Model + label encoder loaded.")
-except:
-    print("⚠️ ML model not loaded, fallback to rules.")
+lite_model = None
+
+def load_model():
+    global lite_model, use_ml
+    lite_model = load_lite_model()
+    use_ml = lite_model is not None
+    return use_ml
 
 # ---------------------------
-# Ideal soil and rule-based fallback
+# Ideal soil (crop_registry.json) and rule-based fallback
 # ---------------------------
-ideal_soil = {
-    "Maize":      {"N": 80, "P": 40, "K": 60, "temperature": 26, "rainfall": 120, "pH": 6.5},
-    "Groundnuts": {"N": 25, "P": 30, "K": 30, "temperature": 28, "rainfall": 100, "pH": 6.0},
-    "Cowpeas":    {"N": 20, "P": 25, "K": 20, "temperature": 30, "rainfall": 90,  "pH": 6.0},
-    "Beans":      {"N": 40, "P": 50, "K": 30, "temperature": 22, "rainfall": 150, "pH": 6.0},
-    "Watermelon": {"N": 60, "P": 55, "K": 40, "temperature": 32, "rainfall": 200, "pH": 6.5},
-    "Mango":      {"N": 50, "P": 40, "K": 35, "temperature": 33, "rainfall": 70,  "pH": 6.0},
-}
-
-def rule_based_recommendation(N, P, K, temperature, rainfall):
-    if N > 60 and P > 40 and K > 30 and temperature > 25 and rainfall > 120:
-        return "Maize"
-    elif N < 40 and P > 50 and K > 20 and rainfall > 150:
-        return "Beans"
-    elif temperature > 30 and rainfall < 80:
-        return "Mango"
-    elif N < 30 and rainfall < 100:
-        return "Cowpeas"
-    elif N > 50 and P > 50 and K > 30 and rainfall > 200:
-        return "Watermelon"
-    else:
-        return "Groundnuts"
+registry = get_registry()
+ideal_soil = registry.by_name(registry.ideal)
 
 def ml_predict_crop(readings):
+    """Same decision as the server; None when the model declines or inputs are missing."""
     if not use_ml:
         return None
     try:
-        features = [[readings['N'], readings['P'], readings['K'], readings['temperature'], readings['rainfall']]]
-        pred = model.predict(features)
-        return le.inverse_transform(pred)[0] if le else str(pred[0])
+        crop, _ = lite_model.recommend(readings)
     except:
         return None
+    return crop.capitalize() if crop in lite_model.classes else None
 
 # ---------------------------
 # Fertilizer helpers
 # ---------------------------
-FERTILIZER_INFO = {
-    "Urea": {"nutrient": "N", "pct_nutrient": 0.46},
-    "DAP": {"nutrient": "P", "pct_nutrient": 0.18},
-    "MOP": {"nutrient": "K", "pct_nutrient": 0.50},
-}
+FERTILIZER_INFO = registry.fertilizers
 
 def fertilizer_amounts_from_deficit(deficit_dict):
     rec = {}
@@ -98,12 +78,7 @@ def fertilizer_recommendation(crop, readings):
 # ---------------------------
 # KV STRING WITH BORDERED RESULTS BOXES
 # ---------------------------
-KV = """
-ScreenManager:
-    MenuScreen:
-    CropScreen:
-    FertilizerScreen:
-
+MENU_KV = """
 <MenuScreen>:
     name: "menu"
     MDBoxLayout:
@@ -116,20 +91,25 @@ ScreenManager:
             halign: "center"
             font_style: "H4"
 
+        MDLabel:
+            text: app.model_status
+            halign: "center"
+            theme_text_color: "Secondary"
+
         MDRaisedButton:
             text: "1) Recommend Crop from Soil Inputs"
             pos_hint: {"center_x":0.5}
-            on_release: app.root.current="crop"
+            on_release: app.root.show("crop")
 
         MDRaisedButton:
             text: "2) Show Ideal Soil for Crop"
             pos_hint: {"center_x":0.5}
-            on_release: app.root.current="fertilizer"
+            on_release: app.root.show("fertilizer")
 
         MDRaisedButton:
             text: "3) Fertilizer Plan for Crop & Current Soil"
             pos_hint: {"center_x":0.5}
-            on_release: app.root.current="fertilizer"
+            on_release: app.root.show("fertilizer")
 
         Widget:
         AnchorLayout:
@@ -138,7 +118,9 @@ ScreenManager:
             MDRaisedButton:
                 text: "Quit"
                 on_release: app.stop()
+"""
 
+CROP_KV = """
 <CropScreen>:
     name: "crop"
     MDBoxLayout:
@@ -204,6 +186,20 @@ ScreenManager:
                     size_hint_y: None
                     height: dp(50)
 
+                MDTextField:
+                    id: moisture_input
+                    hint_text: "Moisture (%) (optional)"
+                    input_filter: "float"
+                    size_hint_y: None
+                    height: dp(50)
+
+                MDTextField:
+                    id: ph_input
+                    hint_text: "pH (optional)"
+                    input_filter: "float"
+                    size_hint_y: None
+                    height: dp(50)
+
         # ----------- RESULTS BOX -----------
         MDBoxLayout:
             orientation: "vertical"
@@ -266,7 +262,9 @@ ScreenManager:
                     text: "Back to Menu"
                     size_hint_x: 0.5
                     on_release: app.root.current="menu"
+"""
 
+FERTILIZER_KV = """
 <FertilizerScreen>:
     name: "fertilizer"
     MDBoxLayout:
@@ -398,6 +396,45 @@ ScreenManager:
                     on_release: app.root.current="menu"
 """
 
+# ---------------------------
+# Background work (runs on app.tasks worker threads)
+# ---------------------------
+def recommend_crop_text(readings, sync=None):
+    """Runs off the UI thread: predict, queue the reading for upload, format the result."""
+    crop = ml_predict_crop(readings)
+    if not crop:
+        crop = rule_based_recommendation(readings['N'], readings['P'], readings['K'],
+                                         readings['temperature'], readings['rainfall'])
+
+    if sync is not None and 'moisture' in readings:
+        sync.enqueue(readings, crop)
+
+    return f"✅ Recommended Crop: {crop}"
+
+def fertilizer_plan_text(crop, readings):
+    rec = fertilizer_recommendation(crop, readings)
+    if not rec:
+        return "❌ No ideal data for this crop."
+
+    deficits = rec["deficits"]
+    ferts = rec["fertilizers"]
+
+    text = f"Fertilizer Plan for {crop}:\n"
+    for nut in ["N", "P", "K"]:
+        need_key = f"{nut}_needed"
+        fert_key = {
+            "N": "Urea_kg_per_ha",
+            "P": "DAP_kg_per_ha",
+            "K": "MOP_kg_per_ha",
+        }[nut]
+
+        if deficits[need_key] > 0:
+            text += f"{nut} deficit: {deficits[need_key]} → Apply {ferts[fert_key]} kg/ha\n"
+        else:
+            text += f"{nut} OK (No deficit)\n"
+
+    return text
+
 # ---------------------------
 # Screen classes
 # ---------------------------
@@ -414,15 +451,23 @@ class CropScreen(Screen):
                 'temperature': float(self.ids.temp_input.text),
                 'rainfall': float(self.ids.rain_input.text),
             }
+            if self.ids.moisture_input.text and self.ids.ph_input.text:
+                readings['moisture'] = float(self.ids.moisture_input.text)
+                readings['pH'] = float(self.ids.ph_input.text)
         except:
             self.ids.result_label.text = "❌ Please enter valid numbers."
             return
 
-        crop = ml_predict_crop(readings) if use_ml else rule_based_recommendation(**readings)
-        if not crop:
-            crop = rule_based_recommendation(**readings)
+        app = MDApp.get_running_app()
+        self.ids.result_label.text = "⏳ Working..."
+        app.tasks.submit("recommend_crop", recommend_crop_text, readings, app.sync,
+                         on_result=self._show_result, on_error=self._show_error)
 
-        self.ids.result_label.text = f"✅ Recommended Crop: {crop}"
+    def _show_result(self, text):
+        self.ids.result_label.text = text
+
+    def _show_error(self, error):
+        self.ids.result_label.text = f"❌ {error}"
 
 class FertilizerScreen(Screen):
     def on_pre_enter(self):
@@ -466,30 +511,17 @@ class FertilizerScreen(Screen):
             self.ids.plan_label.text = "❌ Enter valid numbers."
             return
 
-        rec = fertilizer_recommendation(crop, readings)
-        if not rec:
-            self.ids.plan_label.text = "❌ No ideal data for this crop."
-            return
-
-        deficits = rec["deficits"]
-        ferts = rec["fertilizers"]
-
-        text = f"Fertilizer Plan for {crop}:\n"
-        for nut in ["N", "P", "K"]:
-            need_key = f"{nut}_needed"
-            fert_key = {
-                "N": "Urea_kg_per_ha",
-                "P": "DAP_kg_per_ha",
-                "K": "MOP_kg_per_ha",
-            }[nut]
-
-            if deficits[need_key] > 0:
-                text += f"{nut} deficit: {deficits[need_key]} → Apply {ferts[fert_key]} kg/ha\n"
-            else:
-                text += f"{nut} OK (No deficit)\n"
+        app = MDApp.get_running_app()
+        self.ids.plan_label.text = "⏳ Working..."
+        app.tasks.submit("generate_plan", fertilizer_plan_text, crop, readings,
+                         on_result=self._show_plan, on_error=self._show_error)
 
+    def _show_plan(self, text):
         self.ids.plan_label.text = text
 
+    def _show_error(self, error):
+        self.ids.plan_label.text = f"❌ {error}"
+
     def show_ideal_soil(self):
         crop = self.ids.crop_dropdown_btn.text
         if crop not in ideal_soil:
@@ -509,9 +541,38 @@ class FertilizerScreen(Screen):
 # App class
 # ---------------------------
 class CropApp(MDApp):
+    model_status = StringProperty(translations["en"]["loading"])
+
     def build(self):
+        self.startup = StartupTimer()
+        self.startup.mark("build")
         self.theme_cls.primary_palette = "Green"
-        return Builder.load_string(KV)
+        self.tasks = TaskRunner()
+        # Only the menu is built up front; other screens on first navigation
+        root = LazyScreenManager({
+            "menu": (MENU_KV, MenuScreen),
+            "crop": (CROP_KV, CropScreen),
+            "fertilizer": (FERTILIZER_KV, FertilizerScreen),
+        })
+        root.show("menu")
+        return root
+
+    def on_start(self):
+        self.startup.mark("on_start")
+        self.startup.watch_first_frame()
+        self.tasks.submit("load_model", load_model,
+                          on_result=self._on_model_loaded, on_error=lambda e: self._on_model_loaded(False))
+        # Queue readings locally and upload them whenever the server is reachable
+        self.sync = SyncClient(self.user_data_dir)
+        self.sync.start()
+
+    def _on_model_loaded(self, loaded):
+        self.startup.mark("model_loaded")
+        self.model_status = "✅ ML model ready" if loaded else "⚠️ Using rule-based fallback"
+
+    def on_stop(self):
+        self.tasks.shutdown()
+        self.sync.stop()
 
 if __name__ == "__main__":
     CropApp().run()
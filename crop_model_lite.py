@@ -0,0 +1,173 @@
+"""
+crop_model_lite.py
+
+- Pure-Python evaluator for the crop recommendation forest (no numpy/sklearn)
+- Used by the Kivy apps on-device; reproduces server.py's decision exactly
+- Exporter that converts crop_recommendation_model.pkl + label_encoder.pkl
+  (plus feature stats and confidence calibration) into crop_model_lite.json
+
+Run `python crop_model_lite.py` on a machine with sklearn after retraining.
+"""
+
+import json
+import os
+import struct
+
+LITE_MODEL_FILE = "crop_model_lite.json"
+MODEL_FILE = "crop_recommendation_model.pkl"
+ENCODER_FILE = "label_encoder.pkl"
+
+_float32 = struct.Struct("f")
+
+
+def _to_float32(value):
+    # sklearn trees compare float32 inputs against float64 thresholds
+    return _float32.unpack(_float32.pack(value))[0]
+
+
+def _interp(x, xp, fp):
+    """Same arithmetic as numpy.interp for increasing xp."""
+    if x <= xp[0]:
+        return fp[0]
+    if x >= xp[-1]:
+        return fp[-1]
+    j = 0
+    while xp[j + 1] <= x:
+        j += 1
+    slope = (fp[j + 1] - fp[j]) / (xp[j + 1] - xp[j])
+    return slope * (x - xp[j]) + fp[j]
+
+
+# ---------------------------
+# On-device evaluator
+# ---------------------------
+class LiteCropModel:
+    def __init__(self, data):
+        self.feature_names = data["feature_names"]
+        # column order the trees were trained on; feature_names orders limits, means and stds
+        self.model_features = data.get("model_features", self.feature_names)
+        self.classes = data["classes"]
+        self.trees = data["trees"]
+        self.physical_limits = data.get("physical_limits")
+        self.means = data.get("means")
+        self.stds = data.get("stds")
+        self.z_threshold = data.get("z_threshold")
+        self.calibration = data.get("calibration")
+        self.default_threshold = data.get("confidence_threshold", 0.0)
+        self.crop_thresholds = data.get("crop_thresholds", {})
+
+    @classmethod
+    def load(cls, path=LITE_MODEL_FILE):
+        with open(path, "r") as f:
+            return cls(json.load(f))
+
+    def predict_proba(self, features):
+        """Vote shares for one reading, in self.classes order."""
+        x = [_to_float32(float(v)) for v in features]
+        total = [0.0] * len(self.classes)
+        for left, right, feature, threshold, leaf_proba in self.trees:
+            node = 0
+            while left[node] != -1:
+                node = left[node] if x[feature[node]] <= threshold[node] else right[node]
+            proba = leaf_proba[node]
+            for c in range(len(total)):
+                total[c] += proba[c]
+        n_trees = len(self.trees)
+        return [p / n_trees for p in total]
+
+    def predict(self, features):
+        """Return (crop, raw_confidence) for one reading, features in model_features order."""
+        proba = self.predict_proba(features)
+        best = proba.index(max(proba))
+        return self.classes[best], proba[best]
+
+    def recommend(self, readings):
+        """Mirror of server.py's /sensor-data decision for a dict of readings.
+
+        Returns (recommended_crop, confidence) with the same strings server.py
+        uses when no crop is recommended.
+        """
+        values = [float(readings[f]) for f in self.feature_names]
+        if self.physical_limits:
+            for f, v in zip(self.feature_names, values):
+                lo, hi = self.physical_limits[f]
+                if not (lo <= v <= hi):
+                    return "No crop recommended (physically impossible values)", None
+        if self.means is not None:
+            for v, m, s in zip(values, self.means, self.stds):
+                if not abs((v - m) / s) <= self.z_threshold:
+                    return "No crop recommended (unusual values)", None
+        crop, confidence = self.predict([float(readings[f]) for f in self.model_features])
+        if self.calibration:
+            confidence = _interp(confidence, self.calibration["x"], self.calibration["y"])
+        if confidence < self.crop_thresholds.get(crop, self.default_threshold):
+            return "No crop recommended (low confidence)", round(confidence, 2)
+        return crop, round(confidence, 2)
+
+
+def load_lite_model(path=LITE_MODEL_FILE):
+    if not os.path.exists(path):
+        return None
+    return LiteCropModel.load(path)
+
+
+# ---------------------------
+# Exporter (needs sklearn/numpy)
+# ---------------------------
+def export_forest(model):
+    """Flatten each fitted tree into plain lists with normalised leaf vote shares."""
+    n_classes = len(model.classes_)
+    trees = []
+    for estimator in model.estimators_:
+        tree = estimator.tree_
+        # Same normalisation DecisionTreeClassifier.predict_proba applies
+        proba = tree.value[:, 0, :n_classes].copy()
+        normalizer = proba.sum(axis=1)[:, None]
+        normalizer[normalizer == 0.0] = 1.0
+        proba /= normalizer
+        trees.append([
+            tree.children_left.tolist(),
+            tree.children_right.tolist(),
+            tree.feature.tolist(),
+            tree.threshold.tolist(),
+            proba.tolist(),
+        ])
+    return trees
+
+
+def export_lite_model(path=LITE_MODEL_FILE, model_path=MODEL_FILE, encoder_path=ENCODER_FILE):
+    # Load the artifacts directly: importing server would start its logging, metrics, WAL and
+    # dedup state, and its model may be a shared-memory forest or inference client, not sklearn's
+    import joblib
+    from calibration import load_calibration, load_thresholds
+    from crop_registry import get_registry
+    from model_config import CONFIDENCE_THRESHOLD, FEATURE_NAMES, Z_THRESHOLD, model_features
+
+    model = joblib.load(model_path)
+    le = joblib.load(encoder_path)
+    means = stds = None
+    if os.path.exists("feature_means.pkl") and os.path.exists("feature_stds.pkl"):
+        means, stds = joblib.load("feature_means.pkl"), joblib.load("feature_stds.pkl")
+    calibration = load_calibration()
+    confidence_threshold, crop_thresholds = load_thresholds(CONFIDENCE_THRESHOLD)
+    data = {
+        "feature_names": list(FEATURE_NAMES),
+        "model_features": model_features(),
+        "classes": [str(c) for c in le.inverse_transform(model.classes_)],
+        "trees": export_forest(model),
+        "physical_limits": {k: list(v) for k, v in get_registry().physical_limits.items()},
+        "means": None if means is None else [float(v) for v in means],
+        "stds": None if stds is None else [float(v) for v in stds],
+        "z_threshold": Z_THRESHOLD,
+        "calibration": None if calibration is None else {
+            "x": calibration["x"].tolist(), "y": calibration["y"].tolist()},
+        "confidence_threshold": confidence_threshold,
+        "crop_thresholds": crop_thresholds,
+    }
+    with open(path, "w") as f:
+        json.dump(data, f, separators=(",", ":"))
+    print(f"Lite model saved to {path}: {len(data['trees'])} trees, {len(data['classes'])} classes")
+
+
+if __name__ == "__main__":
+    export_lite_model()
@@ -0,0 +1,255 @@
+"""
+crop_registry.py
+
+Single source of crop knowledge and input limits (crop_registry.json):
+
+- Loaded once per process and shared by the server, crop_api.py,
+  crop_tool.py and the Kivy apps; adding a crop is a JSON edit only
+- Dict views (ranges, ideal points, limits, fertilizers) are built at load
+  time and need no NumPy, so the apps can use them on-device
+- Array views are compiled lazily: min/max/ideal matrices indexed by
+  (crop id, feature id), so range checks and plans over many readings are
+  plain array comparisons
+
+An ideal point value defaults to the midpoint of the crop's range unless
+the registry gives one explicitly under "ideal".
+
+Region/season profiles overlay the base ranges:
+
+    "seasons": {"wet": [11, 12, 1, 2, 3], ...},
+    "profiles": [{"region": "kgalagadi", "crops": {"maize": {"moisture": [50, 70]}}},
+                 {"region": "kgalagadi", "season": "dry", "crops": {...}}]
+
+An overlay without a season applies to the whole region; a seasonal one is
+applied on top of it. Every combination is resolved into its own
+CropRegistry when the file is loaded, so selecting one is a dict lookup.
+
+A registry loaded from a file carries a fingerprint of its contents and the
+file's modification time, which the server uses as HTTP cache validators.
+"""
+
+import hashlib
+import json
+import os
+
+REGISTRY_PATH = os.environ.get(
+    "CROP_REGISTRY", os.path.join(os.path.dirname(os.path.abspath(__file__)), "crop_registry.json"))
+
+# status codes returned by CropRegistry.status()
+LOW, OPTIMAL, HIGH = -1, 0, 1
+BASE_PROFILE = (None, None)
+
+_registry = None
+
+
+def _overlay(data, overrides):
+    """Copy of registry data with per-crop range overrides applied."""
+    crops = {}
+    for crop, spec in data["crops"].items():
+        ranges = dict(spec["ranges"])
+        ranges.update(overrides.get(crop, {}))
+        crops[crop] = {**spec, "ranges": ranges}
+    for crop, ranges in overrides.items():
+        if crop not in crops:
+            raise ValueError(f"Profile overrides unknown crop: {crop}")
+        unknown = set(ranges) - set(data["features"])
+        if unknown:
+            raise ValueError(f"Profile overrides unknown features for {crop}: {sorted(unknown)}")
+    return {**data, "crops": crops, "profiles": []}
+
+
+class CropRegistry:
+    def __init__(self, data, key=BASE_PROFILE):
+        self.key = key
+        self.features = list(data["features"])
+        self.feature_index = {f: i for i, f in enumerate(self.features)}
+        self.crops = list(data["crops"])
+        self.crop_index = {c: i for i, c in enumerate(self.crops)}
+        self.default_crop = data["default_crop"]
+        self.names = {c: spec.get("name", c.capitalize()) for c, spec in data["crops"].items()}
+        self.physical_limits = {f: tuple(v) for f, v in data["physical_limits"].items()}
+        self.safe_limits = {f: tuple(v) for f, v in data["safe_limits"].items()}
+        self.fertilizers = data["fertilizers"]
+
+        self.ranges = {}
+        self.ideal = {}
+        for crop, spec in data["crops"].items():
+            self.ranges[crop] = {f: {"min": lo, "max": hi} for f, (lo, hi) in spec["ranges"].items()}
+            explicit = spec.get("ideal", {})
+            self.ideal[crop] = {f: explicit.get(f, round((lo + hi) / 2, 2)) for f, (lo, hi) in spec["ranges"].items()}
+        self._arrays = None
+
+        self.fingerprint = None
+        self.modified = None
+
+        self.seasons = data.get("seasons", {})
+        self._month_season = {month: season for season, months in self.seasons.items() for month in months}
+        self.profiles = {BASE_PROFILE: self}
+        self._resolve_profiles(data)
+
+    # ---------------------------
+    # Region/season profiles
+    # ---------------------------
+    def _resolve_profiles(self, data):
+        overlays = data.get("profiles", [])
+        regional = {o["region"]: o["crops"] for o in overlays if not o.get("season")}
+        seasonal = {(o["region"], o["season"]): o["crops"] for o in overlays if o.get("season")}
+        region_data = {}
+        for region in set(regional) | {region for region, _ in seasonal}:
+            region_data[region] = _overlay(data, regional.get(region, {}))
+            self.profiles[(region, None)] = CropRegistry(region_data[region], (region, None))
+        for (region, season), overrides in seasonal.items():
+            self.profiles[(region, season)] = CropRegistry(_overlay(region_data[region], overrides), (region, season))
+
+    def season_for(self, month):
+        return self._month_season.get(month)
+
+    def profile_key(self, region=None, season=None):
+        """Most specific resolved profile for (region, season), else the base ranges."""
+        if (region, season) in self.profiles:
+            return (region, season)
+        if (region, None) in self.profiles:
+            return (region, None)
+        return BASE_PROFILE
+
+    def profile(self, key=BASE_PROFILE):
+        return self.profiles.get(key, self)
+
+    def compile(self):
+        """Build the array views of the base ranges and every profile up front."""
+        for profile in self.profiles.values():
+            profile.arrays()
+        return self
+
+    # ---------------------------
+    # Dict views (no NumPy)
+    # ---------------------------
+    def crop_key(self, name):
+        """Registry id for a crop name in any case ('Maize' -> 'maize'), or None."""
+        key = str(name).strip().lower()
+        return key if key in self.crop_index else None
+
+    def ranges_for(self, crop, features=None):
+        """{feature: {"min", "max"}} for a crop, falling back to the default crop."""
+        ranges = self.ranges.get(self.crop_key(crop), self.ranges[self.default_crop])
+        if features is None:
+            return ranges
+        return {f: ranges[f] for f in features}
+
+    def ideal_ranges(self, features=None):
+        return {crop: self.ranges_for(crop, features) for crop in self.crops}
+
+    def by_name(self, view):
+        """A per-crop view keyed by display name, as the apps and CLI show it."""
+        return {self.names[crop]: view[crop] for crop in self.crops}
+
+    def within_limits(self, values, limits=None):
+        """True if every limited feature is present and inside its bounds."""
+        limits = self.physical_limits if limits is None else limits
+        for feature, (lo, hi) in limits.items():
+            if feature not in values or not (lo <= values[feature] <= hi):
+                return False
+        return True
+
+    # ---------------------------
+    # Array views (compiled on first use)
+    # ---------------------------
+    def arrays(self):
+        """(min, max, ideal) matrices of shape (n_crops, n_features); NaN where a crop has no range."""
+        if self._arrays is None:
+            import numpy as np
+
+            shape = (len(self.crops), len(self.features))
+            lo, hi, ideal = np.full(shape, np.nan), np.full(shape, np.nan), np.full(shape, np.nan)
+            for c, crop in enumerate(self.crops):
+                for feature, bounds in self.ranges[crop].items():
+                    f = self.feature_index[feature]
+                    lo[c, f], hi[c, f] = bounds["min"], bounds["max"]
+                    ideal[c, f] = self.ideal[crop][feature]
+            for a in (lo, hi, ideal):
+                a.setflags(write=False)
+            self._arrays = (lo, hi, ideal)
+        return self._arrays
+
+    def feature_ids(self, features):
+        return [self.feature_index[f] for f in features]
+
+    def crop_ids(self, names, default=None):
+        """Crop ids for an array of names (any case); unknown names map to `default`'s id, or -1."""
+        import numpy as np
+
+        unique, inverse = np.unique(np.asarray(names, dtype=str), return_inverse=True)
+        fallback = self.crop_index[default] if default is not None else -1
+        ids = np.array([self.crop_index.get(name.strip().lower(), fallback) for name in unique], dtype=np.intp)
+        return ids[inverse]
+
+    def limit_bounds(self, features, limits=None):
+        import numpy as np
+
+        limits = self.physical_limits if limits is None else limits
+        lo = np.array([limits.get(f, (-np.inf, np.inf))[0] for f in features], dtype=float)
+        hi = np.array([limits.get(f, (-np.inf, np.inf))[1] for f in features], dtype=float)
+        return lo, hi
+
+    def within_limits_batch(self, X, features, limits=None):
+        """Row mask for X (n_readings, len(features)); NaN (missing) fails the check."""
+        import numpy as np
+
+        lo, hi = self.limit_bounds(features, limits)
+        return np.all((X >= lo) & (X <= hi), axis=1)
+
+    def bounds(self, crop_ids, features):
+        """Per-row (min, max, ideal) for `features`; rows with id -1 are NaN."""
+        import numpy as np
+
+        lo, hi, ideal = self.arrays()
+        cols = self.feature_ids(features)
+        crop_ids = np.asarray(crop_ids)
+        known = crop_ids >= 0
+        rows = np.where(known, crop_ids, 0)
+        out = []
+        for a in (lo, hi, ideal):
+            picked = a[rows][:, cols]
+            picked[~known] = np.nan
+            out.append(picked)
+        return tuple(out)
+
+    def status(self, crop_ids, X, features):
+        """LOW / OPTIMAL / HIGH per reading and feature, plus the distance outside the range.
+
+        The gap is min - value for LOW, value - max for HIGH and 0 otherwise.
+        """
+        import numpy as np
+
+        lo, hi, _ = self.bounds(crop_ids, features)
+        below, above = X < lo, X > hi
+        codes = np.where(below, LOW, np.where(above, HIGH, OPTIMAL)).astype(np.int8)
+        gap = np.where(below, lo - X, np.where(above, X - hi, 0.0))
+        return codes, gap
+
+    def fertilizer_rates(self, deficits, features):
+        """kg/ha of each fertilizer from nutrient deficits (columns in `features` order)."""
+        import numpy as np
+
+        rates = {}
+        for fert, info in self.fertilizers.items():
+            needed = deficits[:, features.index(info["nutrient"])]
+            rates[fert] = np.where(needed > 0, np.round(needed / info["pct_nutrient"], 1), 0.0)
+        return rates
+
+
+def load_registry(path=REGISTRY_PATH):
+    with open(path, "rb") as f:
+        raw = f.read()
+    registry = CropRegistry(json.loads(raw))
+    registry.fingerprint = hashlib.sha256(raw).hexdigest()[:16]
+    registry.modified = os.path.getmtime(path)
+    return registry
+
+
+def get_registry():
+    """The shared registry, loaded on first use."""
+    global _registry
+    if _registry is None:
+        _registry = load_registry()
+    return _registry
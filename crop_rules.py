@@ -0,0 +1,71 @@
+"""
+crop_rules.py
+
+- Rule-based crop recommendation expressed once as data
+- Scalar evaluation (pure Python, used on-device by the Kivy apps)
+- Vectorized evaluation compiled into NumPy bound matrices with
+  first-match semantics, for scoring many readings at once
+"""
+
+RULE_FEATURES = ["N", "P", "K", "temperature", "rainfall"]
+
+# Checked in order; the first rule whose conditions all hold wins.
+# Each condition is (feature, operator, threshold) with strict comparisons.
+RULES = [
+    ("Maize",      [("N", ">", 60), ("P", ">", 40), ("K", ">", 30), ("temperature", ">", 25), ("rainfall", ">", 120)]),
+    ("Beans",      [("N", "<", 40), ("P", ">", 50), ("K", ">", 20), ("rainfall", ">", 150)]),
+    ("Mango",      [("temperature", ">", 30), ("rainfall", "<", 80)]),
+    ("Cowpeas",    [("N", "<", 30), ("rainfall", "<", 100)]),
+    ("Watermelon", [("N", ">", 50), ("P", ">", 50), ("K", ">", 30), ("rainfall", ">", 200)]),
+]
+DEFAULT_CROP = "Groundnuts"
+
+_compiled = None
+
+
+# ---------------------------
+# Scalar evaluation
+# ---------------------------
+def rule_based_recommendation(N, P, K, temperature, rainfall):
+    values = {"N": N, "P": P, "K": K, "temperature": temperature, "rainfall": rainfall}
+    for crop, conditions in RULES:
+        if all(values[f] > t if op == ">" else values[f] < t for f, op, t in conditions):
+            return crop
+    return DEFAULT_CROP
+
+
+# ---------------------------
+# Vectorized evaluation
+# ---------------------------
+def compile_rules(rules=RULES, features=RULE_FEATURES):
+    """Turn the rule list into open-interval bounds of shape (n_rules, n_features)."""
+    import numpy as np
+
+    lower = np.full((len(rules), len(features)), -np.inf)
+    upper = np.full((len(rules), len(features)), np.inf)
+    for r, (_, conditions) in enumerate(rules):
+        for feature, op, threshold in conditions:
+            f = features.index(feature)
+            if op == ">":
+                lower[r, f] = max(lower[r, f], threshold)
+            else:
+                upper[r, f] = min(upper[r, f], threshold)
+    choices = np.array([crop for crop, _ in rules] + [DEFAULT_CROP])
+    return lower, upper, choices
+
+
+def rule_based_recommendation_batch(N, P, K, temperature, rainfall):
+    """Array-in/array-out version of rule_based_recommendation."""
+    import numpy as np
+
+    global _compiled
+    if _compiled is None:
+        _compiled = compile_rules()
+    lower, upper, choices = _compiled
+
+    X = np.column_stack(np.broadcast_arrays(*(np.asarray(v, dtype=float)
+                                              for v in (N, P, K, temperature, rainfall))))
+    # (n_readings, n_rules) match matrix, plus an always-true default column
+    matches = np.all((X[:, None, :] > lower) & (X[:, None, :] < upper), axis=2)
+    matches = np.column_stack([matches, np.ones(len(X), dtype=bool)])
+    return choices[np.argmax(matches, axis=1)]
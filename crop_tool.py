@@ -6,12 +6,20 @@ crop_tool.py
 - Recommend crop (ML or rule-based fallback)
 - Show ideal soil requirements for a crop
 - Compare current soil -> compute deficits -> suggest fertilizer kg/ha
+- Bulk scoring of CSV / JSON-lines files (python crop_tool.py score ...)
+- Watch mode: follow an append-only NDJSON sensor log (python crop_tool.py watch ...)
 """
 
+import argparse
 import json
 import joblib
 import os
 import math
+import time
+
+from crop_registry import get_registry
+from file_watch import ChangeWaiter, FileTail
+from crop_rules import RULE_FEATURES, rule_based_recommendation, rule_based_recommendation_batch
 
 # ---------------------------
 # 0. Model Loading (optional)
@@ -32,13 +40,8 @@ except Exception as e:
 # ---------------------------
 # 1. Safe limits & Rule-based fallback
 # ---------------------------
-safe_limits = {
-    'N': (0, 130),
-    'P': (0, 90),
-    'K': (10, 60),
-    'temperature': (10, 40),
-    'rainfall': (0, 500)
-}
+registry = get_registry()
+safe_limits = registry.safe_limits
 
 def validate_crop_inputs(values: dict):
     for feature, (min_val, max_val) in safe_limits.items():
@@ -49,40 +52,15 @@ def validate_crop_inputs(values: dict):
             return False, f"⚠️ {feature} = {value} is out of safe range ({min_val}-{max_val})"
     return True, "✅ Inputs OK"
 
-def rule_based_recommendation(N, P, K, temperature, rainfall):
-    if N > 60 and P > 40 and K > 30 and temperature > 25 and rainfall > 120:
-        return "Maize"
-    elif N < 40 and P > 50 and K > 20 and rainfall > 150:
-        return "Beans"
-    elif temperature > 30 and rainfall < 80:
-        return "Mango"
-    elif N < 30 and rainfall < 100:
-        return "Cowpeas"
-    elif N > 50 and P > 50 and K > 30 and rainfall > 200:
-        return "Watermelon"
-    else:
-        return "Groundnuts"
-
 # ---------------------------
 # 2. Ideal soil database
 # ---------------------------
-ideal_soil = {
-    "Maize":      {"N": 80, "P": 40, "K": 60, "temperature": 26, "rainfall": 120, "pH": 6.5},
-    "Groundnuts": {"N": 25, "P": 30, "K": 30, "temperature": 28, "rainfall": 100, "pH": 6.0},
-    "Cowpeas":    {"N": 20, "P": 25, "K": 20, "temperature": 30, "rainfall": 90,  "pH": 6.0},
-    "Beans":      {"N": 40, "P": 50, "K": 30, "temperature": 22, "rainfall": 150, "pH": 6.0},
-    "Watermelon": {"N": 60, "P": 55, "K": 40, "temperature": 32, "rainfall": 200, "pH": 6.5},
-    "Mango":      {"N": 50, "P": 40, "K": 35, "temperature": 33, "rainfall": 70,  "pH": 6.0},
-}
+ideal_soil = registry.by_name(registry.ideal)
 
 # ---------------------------
 # 3. Fertilizer helpers
 # ---------------------------
-FERTILIZER_INFO = {
-    "Urea":    {"nutrient": "N", "pct_nutrient": 0.46},
-    "DAP":     {"nutrient": "P", "pct_nutrient": 0.18},
-    "MOP":     {"nutrient": "K", "pct_nutrient": 0.50},
-}
+FERTILIZER_INFO = registry.fertilizers
 
 def fertilizer_amounts_from_deficit(deficit_dict):
     rec = {}
@@ -178,7 +156,180 @@ def ml_predict_crop(readings):
         return None
 
 # ---------------------------
-# 6. Interactive CLI
+# 6. Bulk scoring (vectorized per chunk)
+# ---------------------------
+INPUT_FEATURES = ["N", "P", "K", "temperature", "rainfall", "pH"]
+DEFICIT_COLUMNS = {"N_needed": "N", "P_needed": "P", "K_needed": "K",
+                   "temp_gap": "temperature", "rain_gap": "rainfall", "pH_gap": "pH"}
+FERTILIZER_COLUMNS = {"Urea_kg_per_ha": "Urea", "DAP_kg_per_ha": "DAP", "MOP_kg_per_ha": "MOP"}
+CHUNK_ROWS = 100_000
+
+def validate_crop_inputs_batch(frame):
+    """Boolean mask of rows inside safe_limits (missing features count as 0)."""
+    features = list(safe_limits)
+    return registry.within_limits_batch(frame[features].to_numpy(), features, safe_limits)
+
+def ml_predict_crops(frame):
+    """Batched ML prediction; None if the model is missing or can't score the features."""
+    if not use_ml:
+        return None
+    try:
+        pred = model.predict(frame[RULE_FEATURES].to_numpy())
+        return le.inverse_transform(pred) if le else pred.astype(str)
+    except Exception:
+        return None
+
+def fertilizer_plan_batch(crops, frame):
+    """Deficit and fertilizer columns for every row from the registry's ideal matrix."""
+    import numpy as np
+
+    features = list(DEFICIT_COLUMNS.values())
+    crop_ids = registry.crop_ids(crops)
+    _, _, ideal = registry.bounds(crop_ids, features)
+    deficits = np.round(ideal - frame[features].to_numpy(), 2)
+    plan = {column: deficits[:, j] for j, column in enumerate(DEFICIT_COLUMNS)}
+    rates = registry.fertilizer_rates(deficits, features)
+    for column, fert in FERTILIZER_COLUMNS.items():
+        plan[column] = np.where(crop_ids >= 0, rates[fert], np.nan)
+    return plan
+
+def score_chunk(frame):
+    """Validate, recommend (ML with rule-based fallback) and plan fertilizer for one chunk."""
+    import numpy as np
+    import pandas as pd
+
+    frame = frame.copy()
+    has_ph = "pH" in frame
+    for feature in INPUT_FEATURES:
+        if feature not in frame:
+            frame[feature] = 0.0  # same auto-fill as validate_crop_inputs
+        # non-numeric values are treated like missing ones rather than failing the chunk
+        frame[feature] = pd.to_numeric(frame[feature], errors="coerce").fillna(0).astype(float)
+
+    valid = validate_crop_inputs_batch(frame)
+    crops = rule_based_recommendation_batch(*(frame[f].to_numpy() for f in RULE_FEATURES)).astype(object)
+    source = np.full(len(frame), "rules", dtype=object)
+    if valid.any():
+        ml_crops = ml_predict_crops(frame[valid])
+        if ml_crops is not None:
+            crops[valid] = ml_crops
+            source[valid] = "ml"
+
+    frame["valid"] = valid
+    frame["recommended_crop"] = crops
+    frame["source"] = source
+    for column, values in fertilizer_plan_batch(crops, frame).items():
+        frame[column] = values
+    if not has_ph:
+        frame["pH_gap"] = np.nan
+    return frame
+
+def read_chunks(path, chunk_rows=CHUNK_ROWS):
+    import pandas as pd
+
+    if path.endswith((".jsonl", ".ndjson", ".json")):
+        return pd.read_json(path, lines=True, chunksize=chunk_rows)
+    return pd.read_csv(path, chunksize=chunk_rows)
+
+def score_file(input_path, output_path, chunk_rows=CHUNK_ROWS, workers=1):
+    """Score every row of a CSV / JSON-lines file and write the results (same format by extension)."""
+    start = time.perf_counter()
+    chunks = read_chunks(input_path, chunk_rows)
+    pool = None
+    if workers > 1:
+        import multiprocessing
+        pool = multiprocessing.Pool(workers)
+        results = pool.imap(score_chunk, chunks)
+    else:
+        results = map(score_chunk, chunks)
+
+    as_jsonl = output_path.endswith((".jsonl", ".ndjson", ".json"))
+    rows = 0
+    try:
+        with open(output_path, "w", newline="") as out:
+            for i, scored in enumerate(results):
+                if as_jsonl:
+                    scored.to_json(out, orient="records", lines=True)
+                else:
+                    scored.to_csv(out, index=False, header=(i == 0))
+                rows += len(scored)
+    finally:
+        if pool is not None:
+            pool.close()
+            pool.join()
+
+    elapsed = time.perf_counter() - start
+    print(f"✅ Scored {rows} rows in {elapsed:.1f}s → {output_path}")
+    return rows
+
+# ---------------------------
+# 7. Watch mode (append-only NDJSON log)
+# ---------------------------
+BATCH_DELAY = 0.5
+
+def numeric_or_missing(value):
+    if value is None:
+        return True
+    try:
+        float(value)
+        return True
+    except (TypeError, ValueError):
+        return False
+
+def parse_lines(lines):
+    """Records of the complete lines; malformed lines and non-numeric readings are reported and dropped."""
+    import pandas as pd
+
+    records = []
+    for line in lines:
+        try:
+            record = json.loads(line)
+        except ValueError:
+            print("⚠️ Skipping malformed line:", line[:80])
+            continue
+        if not isinstance(record, dict):
+            continue
+        bad = [f for f in INPUT_FEATURES if not numeric_or_missing(record.get(f))]
+        if bad:
+            print(f"⚠️ Skipping reading with non-numeric {', '.join(bad)}:", line[:80])
+            continue
+        records.append(record)
+    return pd.DataFrame.from_records(records)
+
+def emit_scored(scored, out=None):
+    for row in scored.itertuples(index=False):
+        print(f"🌱 {row.recommended_crop} ({row.source}) → Urea {row.Urea_kg_per_ha} kg/ha, "
+              f"DAP {row.DAP_kg_per_ha} kg/ha, MOP {row.MOP_kg_per_ha} kg/ha")
+    if out is not None:
+        scored.to_json(out, orient="records", lines=True)
+        out.flush()
+
+def watch_file(path, output_path=None, batch_delay=BATCH_DELAY):
+    """Score new lines of `path` as they are appended; resumes from the saved offset."""
+    tail = FileTail(path)
+    waiter = ChangeWaiter(path)
+    out = open(output_path, "a") if output_path else None
+    print(f"✅ Watching {path} from byte {tail.offset}")
+    try:
+        while True:
+            lines = tail.read_lines()
+            if not lines:
+                if waiter.wait():
+                    time.sleep(batch_delay)  # let the logger finish a burst → one micro-batch
+                continue
+            frame = parse_lines(lines)
+            if len(frame):
+                emit_scored(score_chunk(frame), out)
+            tail.commit()
+    except KeyboardInterrupt:
+        print("Stopped watching.")
+    finally:
+        waiter.close()
+        if out is not None:
+            out.close()
+
+# ---------------------------
+# 8. Interactive CLI
 # ---------------------------
 def run():
     while True:
@@ -222,5 +373,28 @@ def run():
         else:
             print("Invalid choice. Try again.")
 
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Crop recommendation tool (interactive when run without a command)")
+    commands = parser.add_subparsers(dest="command")
+    score = commands.add_parser("score", help="Score a CSV / JSON-lines file of soil samples")
+    score.add_argument("input", help="CSV or JSON-lines file with N, P, K, temperature, rainfall[, pH] columns")
+    score.add_argument("-o", "--output", help="Output file (default: <input>_scored.<ext>)")
+    score.add_argument("--chunk-size", type=int, default=CHUNK_ROWS, help="Rows per chunk")
+    score.add_argument("--workers", type=int, default=1, help="Processes to score chunks with")
+    watch = commands.add_parser("watch", help="Follow an append-only NDJSON sensor log")
+    watch.add_argument("input", nargs="?", default="sensor_readings.ndjson", help="NDJSON file to follow")
+    watch.add_argument("-o", "--output", help="Also append scored readings to this NDJSON file")
+    watch.add_argument("--batch-delay", type=float, default=BATCH_DELAY,
+                       help="Seconds to wait after a change so bursts are scored together")
+    args = parser.parse_args(argv)
+
+    if args.command == "score":
+        root, ext = os.path.splitext(args.input)
+        score_file(args.input, args.output or f"{root}_scored{ext}", args.chunk_size, args.workers)
+    elif args.command == "watch":
+        watch_file(args.input, args.output, args.batch_delay)
+    else:
+        run()
+
 if __name__ == "__main__":
-    run()
+    main()
@@ -0,0 +1,203 @@
+"""
+dedup.py
+
+Idempotency index for retried uploads:
+
+- reserve(key, fingerprint) returns the cached (status, body) of an earlier
+  request with the same key, PENDING while that request is still being
+  processed, MISMATCH if the earlier request had a different fingerprint
+  (hash of its body: the key was reused for other data), or None after
+  reserving the key for the caller; the caller then either complete()s it
+  with its response or release()s it (e.g. after a 5xx, so the retry runs
+  again)
+- Entries expire after DEDUP_WINDOW seconds; a reservation whose request
+  never finished (crashed worker) expires after PENDING_TIMEOUT
+- DedupIndex keeps at most max_entries per process (oldest dropped first);
+  SharedDedupIndex is a memory-mapped table of fixed-size slots shared by
+  every gunicorn worker, so a retry landing on another worker still hits.
+  A response too large for its slot is kept in a file beside the table
+"""
+
+import fcntl
+import hashlib
+import mmap
+import os
+import struct
+import threading
+import time
+from collections import OrderedDict
+
+DEDUP_DIR = os.environ.get("DEDUP_DIR", os.path.join("data", "dedup"))
+DEDUP_WINDOW = float(os.environ.get("DEDUP_WINDOW", "600"))
+PENDING_TIMEOUT = 30.0
+MAX_ENTRIES = 100000
+
+PENDING = object()
+MISMATCH = object()
+_EMPTY, _PENDING, _DONE, _DONE_FILE = 0, 1, 2, 3
+
+
+def fingerprint(body):
+    """64-bit hash of a request body."""
+    return int.from_bytes(hashlib.blake2b(body, digest_size=8).digest(), "little")
+
+
+class DedupIndex:
+    def __init__(self, window=DEDUP_WINDOW, max_entries=MAX_ENTRIES):
+        self.window = window
+        self.max_entries = max_entries
+        self._entries = OrderedDict()  # key -> (expires, fingerprint, status, body); status None while pending
+        self._lock = threading.Lock()
+
+    def _evict(self, now):
+        # insertion order is (nearly) expiry order, so expired entries sit at the front
+        while self._entries:
+            key, (expires, _, _, _) = next(iter(self._entries.items()))
+            if expires > now and len(self._entries) <= self.max_entries:
+                break
+            del self._entries[key]
+
+    def reserve(self, key, fingerprint=0):
+        now = time.time()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and entry[0] > now:
+                if entry[1] != fingerprint:
+                    return MISMATCH
+                return PENDING if entry[2] is None else (entry[2], entry[3])
+            self._entries.pop(key, None)
+            self._entries[key] = (now + PENDING_TIMEOUT, fingerprint, None, None)
+            self._evict(now)
+        return None
+
+    def complete(self, key, status, body, fingerprint=0):
+        with self._lock:
+            self._entries.pop(key, None)
+            self._entries[key] = (time.time() + self.window, fingerprint, status, body)
+
+    def release(self, key):
+        with self._lock:
+            self._entries.pop(key, None)
+
+
+class SharedDedupIndex:
+    """Slot = (key hash, body fingerprint, expires, state, status, body length) + body, in a shared file."""
+
+    HEADER = struct.Struct("<QQdBHI")
+    PROBE = 8
+
+    def __init__(self, path=None, slots=8192, slot_bytes=2048, window=DEDUP_WINDOW):
+        self.path = path or os.path.join(DEDUP_DIR, "index.bin")
+        self.bodies = os.path.join(os.path.dirname(self.path) or ".", "bodies")
+        self.slots = slots
+        self.slot_bytes = slot_bytes
+        self.window = window
+        self._map = None
+        self._fd = None
+        self._pid = None
+        self._swept = 0.0
+        # lockf() locks belong to the process, so they don't exclude this worker's own threads
+        self._lock = threading.Lock()
+
+    def _body_path(self, h):
+        return os.path.join(self.bodies, f"{h:016x}")
+
+    def _sweep(self, now):
+        """Remove overflow bodies older than the window, at most every window/10 seconds."""
+        if now - self._swept < self.window / 10:
+            return
+        self._swept = now
+        for entry in os.listdir(self.bodies):
+            path = os.path.join(self.bodies, entry)
+            try:
+                if os.path.getmtime(path) < now - self.window:
+                    os.remove(path)
+            except FileNotFoundError:
+                pass
+
+    def _open(self):
+        os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+        fd = os.open(self.path, os.O_RDWR | os.O_CREAT, 0o644)
+        size = self.slots * self.slot_bytes
+        if os.fstat(fd).st_size < size:
+            os.ftruncate(fd, size)
+        self._map = mmap.mmap(fd, size)
+        self._fd = fd
+        self._pid = os.getpid()
+
+    def _locked(self, key, update):
+        """Run update(slot offset or None, free slot offset, key hash, now) with the key's probe window locked."""
+        with self._lock:
+            return self._locked_window(key, update)
+
+    def _locked_window(self, key, update):
+        if self._pid != os.getpid():
+            self._open()
+        h = int.from_bytes(hashlib.blake2b(key.encode(), digest_size=8).digest(), "little") or 1
+        first = h % (self.slots - self.PROBE)
+        length = self.PROBE * self.slot_bytes
+        fcntl.lockf(self._fd, fcntl.LOCK_EX, length, first * self.slot_bytes)
+        try:
+            now = time.time()
+            found, free, oldest = None, None, None
+            for slot in range(first, first + self.PROBE):
+                offset = slot * self.slot_bytes
+                stored, _, expires, state = self.HEADER.unpack_from(self._map, offset)[:4]
+                if stored == h and state != _EMPTY and expires > now:
+                    found = offset
+                    break
+                if state == _EMPTY or expires <= now:
+                    free = offset if free is None else free
+                elif oldest is None or expires < oldest[1]:
+                    oldest = (offset, expires)
+            if free is None and oldest is not None:
+                free = oldest[0]  # window full: drop the entry closest to expiry
+            return update(found, free, h, now)
+        finally:
+            fcntl.lockf(self._fd, fcntl.LOCK_UN, length, first * self.slot_bytes)
+
+    def reserve(self, key, fingerprint=0):
+        def update(found, free, h, now):
+            if found is not None:
+                _, stored, _, state, status, size = self.HEADER.unpack_from(self._map, found)
+                if stored != fingerprint:
+                    return MISMATCH
+                if state == _PENDING:
+                    return PENDING
+                if state == _DONE_FILE:
+                    try:
+                        with open(self._body_path(h), "rb") as f:
+                            return status, f.read()
+                    except FileNotFoundError:
+                        pass  # swept: treat as a new request
+                else:
+                    start = found + self.HEADER.size
+                    return status, bytes(self._map[start:start + size])
+            if found is not None:
+                free = found
+            self.HEADER.pack_into(self._map, free, h, fingerprint, now + PENDING_TIMEOUT, _PENDING, 0, 0)
+            return None
+        return self._locked(key, update)
+
+    def complete(self, key, status, body, fingerprint=0):
+        def update(found, free, h, now):
+            offset = found if found is not None else free
+            if len(body) > self.slot_bytes - self.HEADER.size:
+                os.makedirs(self.bodies, exist_ok=True)
+                tmp_path = f"{self._body_path(h)}.{os.getpid()}.tmp"
+                with open(tmp_path, "wb") as f:
+                    f.write(body)
+                os.replace(tmp_path, self._body_path(h))
+                self.HEADER.pack_into(self._map, offset, h, fingerprint, now + self.window, _DONE_FILE, status, len(body))
+                self._sweep(now)
+                return
+            start = offset + self.HEADER.size
+            self._map[start:start + len(body)] = body
+            self.HEADER.pack_into(self._map, offset, h, fingerprint, now + self.window, _DONE, status, len(body))
+        self._locked(key, update)
+
+    def release(self, key):
+        def update(found, free, h, now):
+            if found is not None:
+                self.HEADER.pack_into(self._map, found, 0, 0, 0.0, _EMPTY, 0, 0)
+        self._locked(key, update)
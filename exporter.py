@@ -0,0 +1,152 @@
+"""
+exporter.py
+
+Bulk export of the reading log (reading_log.py) as CSV, Parquet or Arrow IPC:
+
+- Works chunk by chunk straight from the column arrays; fertilizer plan
+  columns are derived with vectorized comparisons, never per row
+- Every format is produced as a generator of byte chunks for streaming
+- Parquet/Arrow need pyarrow, which is optional
+"""
+
+import io
+
+import numpy as np
+
+try:
+    import pyarrow as pa
+    import pyarrow.ipc
+    import pyarrow.parquet as pq
+except ImportError:
+    pa = None
+
+EXPORT_FORMATS = {
+    "csv": "text/csv",
+    "parquet": "application/vnd.apache.parquet",
+    "arrow": "application/vnd.apache.arrow.stream",
+}
+
+PLAN_FEATURES = ["N", "P", "K", "pH", "moisture"]
+READING_COLUMNS = ["timestamp", "device", "N", "P", "K", "moisture", "temperature", "pH",
+                   "crop", "confidence"]
+
+
+def formats_available():
+    return [f for f in EXPORT_FORMATS if f == "csv" or pa is not None]
+
+
+def add_plan_columns(chunk, registry):
+    """Add <feature>_status (low/optimal/high) and <feature>_deficit columns.
+
+    Rows without a known crop ("No crop recommended ...") get empty plan columns.
+    """
+    crop_ids = registry.crop_ids(chunk["crop"])
+    known = crop_ids >= 0
+    values = np.column_stack([chunk[f] for f in PLAN_FEATURES])
+    codes, gaps = registry.status(crop_ids, values, PLAN_FEATURES)
+    labels = np.array(["low", "optimal", "high"], dtype=object)
+    for j, feature in enumerate(PLAN_FEATURES):
+        chunk[f"{feature}_status"] = np.where(known, labels[codes[:, j] + 1], None)
+        if feature != "moisture":
+            chunk[f"{feature}_deficit"] = np.where(known, np.where(codes[:, j] < 0, gaps[:, j], 0.0), np.nan)
+    return chunk
+
+
+def export_columns():
+    cols = list(READING_COLUMNS)
+    for feature in PLAN_FEATURES:
+        cols.append(f"{feature}_status")
+        if feature != "moisture":
+            cols.append(f"{feature}_deficit")
+    return cols
+
+
+# ---------------------------
+# Writers (generators of bytes)
+# ---------------------------
+def csv_stream(chunks):
+    import pandas as pd
+
+    columns = export_columns()
+    header = True
+    for chunk in chunks:
+        frame = pd.DataFrame({c: chunk[c] for c in columns}, columns=columns)
+        frame["timestamp"] = pd.to_datetime(frame["timestamp"], unit="s", utc=True)
+        yield frame.to_csv(index=False, header=header).encode()
+        header = False
+    if header:
+        yield (",".join(columns) + "\n").encode()
+
+
+def _arrow_batch(chunk, columns):
+    arrays = []
+    for c in columns:
+        values = chunk[c]
+        if c == "timestamp":
+            arrays.append(pa.array((values * 1e6).astype("int64"), type=pa.timestamp("us", tz="UTC")))
+        elif values.dtype == object:
+            arrays.append(pa.array(values, type=pa.string()))
+        else:
+            arrays.append(pa.array(values))
+    return pa.RecordBatch.from_arrays(arrays, names=columns)
+
+
+def _schema(columns):
+    fields = []
+    for c in columns:
+        if c == "timestamp":
+            fields.append(pa.field(c, pa.timestamp("us", tz="UTC")))
+        elif c in ("device", "crop") or c.endswith("_status"):
+            fields.append(pa.field(c, pa.string()))
+        else:
+            fields.append(pa.field(c, pa.float64()))
+    return pa.schema(fields)
+
+
+class _Drain(io.RawIOBase):
+    """Write-only sink whose buffered bytes can be taken after each batch."""
+
+    def __init__(self):
+        self.parts = []
+
+    def writable(self):
+        return True
+
+    def write(self, data):
+        self.parts.append(bytes(data))
+        return len(data)
+
+    def take(self):
+        out, self.parts = b"".join(self.parts), []
+        return out
+
+
+def arrow_stream(chunks):
+    columns = export_columns()
+    sink = _Drain()
+    writer = pa.ipc.new_stream(sink, _schema(columns))
+    for chunk in chunks:
+        writer.write_batch(_arrow_batch(chunk, columns))
+        yield sink.take()
+    writer.close()
+    yield sink.take()
+
+
+def parquet_stream(chunks):
+    columns = export_columns()
+    sink = _Drain()
+    writer = pq.ParquetWriter(sink, _schema(columns))
+    for chunk in chunks:
+        writer.write_batch(_arrow_batch(chunk, columns))
+        yield sink.take()
+    writer.close()
+    yield sink.take()
+
+
+def export_stream(fmt, chunks, registry):
+    chunks = (add_plan_columns(chunk, registry) for chunk in chunks)
+    if fmt == "csv":
+        return csv_stream(chunks)
+    if fmt == "arrow":
+        return arrow_stream(chunks)
+    return parquet_stream(chunks)
@@ -0,0 +1,16 @@
+"""
+gunicorn.conf.py
+
+Loaded automatically by gunicorn from the working directory. With
+MODEL_SERVING=shared the master publishes the model segment once before
+forking, so workers only attach to it (see shared_model.py).
+"""
+
+import os
+
+
+def on_starting(server):
+    if os.environ.get("MODEL_SERVING") == "shared":
+        from shared_model import publish
+        version = publish()
+        server.log.info("Shared model version %s published", version)
@@ -0,0 +1,288 @@
+"""
+inference_server.py
+
+Optional inference process for the web workers (INFERENCE_SOCKET=<path>):
+
+- Listens on a local Unix socket; each web worker thread keeps one
+  connection and sends the readings it needs scored as a float64 matrix
+- Requests arriving within BATCH_WINDOW (capped at MAX_BATCH_ROWS rows) are
+  stacked into one predict_proba call and the rows scattered back, so a
+  burst of single-reading /sensor-data requests costs one forest pass.
+  The batcher stops waiting as soon as every in-flight request has joined,
+  so a lone request is not delayed by the window
+- InferenceClient is a drop-in for the model in server.py (predict_proba,
+  classes_); while the socket is down it scores in-process with the local
+  model and retries the socket every RETRY_INTERVAL seconds
+
+Wire format (little-endian): request = <rows u32><cols u32> + float64 rows;
+reply = <status u8><rows u32><cols u32> + float64 probabilities, or an
+error message of `cols` bytes when status is 1. On connect the server sends
+<length u32> + JSON {"classes": [...], "version": ...}.
+
+Usage:
+    python inference_server.py [--socket data/inference.sock] [--window-ms 2] [--max-rows 256]
+"""
+
+import argparse
+import json
+import logging
+import os
+import queue
+import socket
+import socketserver
+import struct
+import sys
+import threading
+import time
+
+import numpy as np
+
+MODEL_FILE = "crop_recommendation_model.pkl"
+INFERENCE_SOCKET = os.environ.get("INFERENCE_SOCKET", os.path.join("data", "inference.sock"))
+BATCH_WINDOW = 0.002
+MAX_BATCH_ROWS = 256
+CLIENT_TIMEOUT = 1.0
+RETRY_INTERVAL = 5.0
+
+OK, ERROR = 0, 1
+_shape = struct.Struct("<II")
+_reply = struct.Struct("<BII")
+_length = struct.Struct("<I")
+
+log = logging.getLogger("crop_server.inference")
+
+
+# ---------------------------
+# Wire format
+# ---------------------------
+def _recv_exact(sock, size):
+    buf = bytearray(size)
+    view = memoryview(buf)
+    received = 0
+    while received < size:
+        n = sock.recv_into(view[received:])
+        if not n:
+            raise ConnectionError("Connection closed")
+        received += n
+    return buf
+
+
+def _send_matrix(sock, X):
+    X = np.ascontiguousarray(X, dtype="<f8")
+    sock.sendall(_shape.pack(*X.shape) + X.tobytes())
+
+
+def _recv_matrix(sock):
+    rows, cols = _shape.unpack(_recv_exact(sock, _shape.size))
+    data = _recv_exact(sock, rows * cols * 8)
+    return np.frombuffer(data, dtype="<f8").reshape(rows, cols)
+
+
+# ---------------------------
+# Micro-batching
+# ---------------------------
+class _Pending:
+    __slots__ = ("X", "result", "error", "done")
+
+    def __init__(self, X):
+        self.X = X
+        self.result = None
+        self.error = None
+        self.done = threading.Event()
+
+
+class MicroBatcher:
+    def __init__(self, model, window=BATCH_WINDOW, max_rows=MAX_BATCH_ROWS):
+        self.model = model
+        self.window = window
+        self.max_rows = max_rows
+        self.batches = 0
+        self.rows = 0
+        self._queue = queue.Queue()
+        self._inflight = 0
+        self._lock = threading.Lock()
+        threading.Thread(target=self._run, name="micro-batcher", daemon=True).start()
+
+    def submit(self, X):
+        """Block until the rows of X have been scored in some batch."""
+        pending = _Pending(X)
+        with self._lock:
+            self._inflight += 1
+        try:
+            self._queue.put(pending)
+            pending.done.wait()
+        finally:
+            with self._lock:
+                self._inflight -= 1
+        if pending.error is not None:
+            raise pending.error
+        return pending.result
+
+    def _collect(self):
+        batch = [self._queue.get()]
+        rows = len(batch[0].X)
+        deadline = time.monotonic() + self.window
+        while rows < self.max_rows and len(batch) < self._inflight:
+            timeout = deadline - time.monotonic()
+            if timeout <= 0:
+                break
+            try:
+                item = self._queue.get(timeout=timeout)
+            except queue.Empty:
+                break
+            batch.append(item)
+            rows += len(item.X)
+        return batch
+
+    def _run(self):
+        while True:
+            batch = self._collect()
+            try:
+                proba = self.model.predict_proba(np.vstack([p.X for p in batch]))
+                start = 0
+                for pending in batch:
+                    pending.result = proba[start:start + len(pending.X)]
+                    start += len(pending.X)
+                self.batches += 1
+                self.rows += start
+            except Exception as e:
+                for pending in batch:
+                    pending.error = e
+            for pending in batch:
+                pending.done.set()
+
+
+# ---------------------------
+# Socket server
+# ---------------------------
+class _Handler(socketserver.BaseRequestHandler):
+    def handle(self):
+        sock = self.request
+        sock.sendall(self.server.hello)
+        while True:
+            try:
+                X = _recv_matrix(sock)
+            except (ConnectionError, OSError):
+                return
+            try:
+                proba = self.server.batcher.submit(X)
+            except Exception as e:
+                message = str(e).encode()
+                sock.sendall(_reply.pack(ERROR, 0, len(message)) + message)
+                continue
+            proba = np.ascontiguousarray(proba, dtype="<f8")
+            sock.sendall(_reply.pack(OK, *proba.shape) + proba.tobytes())
+
+
+class InferenceServer(socketserver.ThreadingUnixStreamServer):
+    daemon_threads = True
+    # every web worker thread connects at once after a restart
+    request_queue_size = 128
+
+    def __init__(self, path, model, window=BATCH_WINDOW, max_rows=MAX_BATCH_ROWS):
+        if os.path.exists(path):
+            os.remove(path)  # stale socket from a previous run
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        super().__init__(path, _Handler)
+        self.batcher = MicroBatcher(model, window, max_rows)
+        hello = json.dumps({"classes": [int(c) for c in model.classes_],
+                            "version": getattr(model, "version", None)}).encode()
+        self.hello = _length.pack(len(hello)) + hello
+
+
+def load_model(path=MODEL_FILE):
+    """The model as server.py would load it (honours MODEL_SERVING=shared)."""
+    if os.environ.get("MODEL_SERVING") == "shared":
+        import shared_model
+        return shared_model.attach(path)
+    import joblib
+    return joblib.load(path)
+
+
+# ---------------------------
+# Client (web workers)
+# ---------------------------
+class InferenceClient:
+    """predict_proba() over the socket, scoring locally with `fallback` while it is unavailable."""
+
+    def __init__(self, fallback, path=INFERENCE_SOCKET, timeout=CLIENT_TIMEOUT, retry_interval=RETRY_INTERVAL):
+        self.fallback = fallback
+        self.path = path
+        self.timeout = timeout
+        self.retry_interval = retry_interval
+        self._local = threading.local()
+        self._retry_at = 0.0
+
+    @property
+    def classes_(self):
+        return self.fallback.classes_
+
+    def _connection(self):
+        sock = getattr(self._local, "sock", None)
+        if sock is not None and getattr(self._local, "pid", None) == os.getpid():
+            return sock
+        sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        sock.settimeout(self.timeout)
+        try:
+            sock.connect(self.path)
+            size = _length.unpack(_recv_exact(sock, _length.size))[0]
+            hello = json.loads(_recv_exact(sock, size))
+        except Exception:
+            sock.close()
+            raise
+        # predictions are decoded with the local label encoder, so the class order must agree
+        if hello["classes"] != [int(c) for c in self.fallback.classes_]:
+            sock.close()
+            raise ValueError(f"Inference server classes {hello['classes']} differ from the local model's")
+        self._local.sock, self._local.pid = sock, os.getpid()
+        return sock
+
+    def _drop_connection(self):
+        sock = getattr(self._local, "sock", None)
+        self._local.sock = None
+        if sock is not None:
+            sock.close()
+
+    def predict_proba(self, X):
+        if time.monotonic() >= self._retry_at:
+            try:
+                sock = self._connection()
+                _send_matrix(sock, X)
+                status, rows, cols = _reply.unpack(_recv_exact(sock, _reply.size))
+                if status == OK:
+                    return np.frombuffer(_recv_exact(sock, rows * cols * 8), dtype="<f8").reshape(rows, cols)
+                message = _recv_exact(sock, cols).decode()
+                log.error("Inference server error, scoring locally: %s", message)
+                return self.fallback.predict_proba(X)
+            except (OSError, ConnectionError, ValueError) as e:
+                self._drop_connection()
+                self._retry_at = time.monotonic() + self.retry_interval
+                log.warning("Inference server unavailable, scoring locally: %s", e)
+        return self.fallback.predict_proba(X)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Batched inference server for the web workers")
+    parser.add_argument("--socket", default=INFERENCE_SOCKET)
+    parser.add_argument("--model", default=MODEL_FILE)
+    parser.add_argument("--window-ms", type=float, default=BATCH_WINDOW * 1000)
+    parser.add_argument("--max-rows", type=int, default=MAX_BATCH_ROWS)
+    args = parser.parse_args(argv)
+
+    from structured_log import setup_logging
+    setup_logging()
+    server = InferenceServer(args.socket, load_model(args.model), args.window_ms / 1000, args.max_rows)
+    log.info("Inference server listening", extra={"fields": {
+        "socket": args.socket, "window_ms": args.window_ms, "max_rows": args.max_rows}})
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+        os.remove(args.socket)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,355 @@
+"""
+ingest_log.py
+
+Durable write-ahead log of accepted sensor readings:
+
+- Every accepted reading is appended (with its recommendation) before
+  /sensor-data answers, as a length-prefixed, CRC-checked binary record
+- Group commit: concurrent appenders hand their records to one leader that
+  writes and fdatasyncs them together, so a sync covers a whole group
+- WAL_SYNC=always (default) syncs before acknowledging; "interval" only
+  writes (safe against a server crash, not a power loss) and syncs every
+  SYNC_INTERVAL seconds in the background; "off" never syncs
+- One writer per process (safe under several gunicorn workers), segments
+  rotated at SEGMENT_BYTES and removed after WAL_RETENTION_DAYS
+- A torn record at the end of a segment (crash mid-write) ends that
+  segment when reading; a restarted writer always starts a new one, and so
+  does a writer whose write failed part way
+
+Record: <length u32><crc32 u32> + payload, payload = <ts, N, P, K, moisture,
+temperature, pH, confidence as float64> + <u16 length> device id +
+<u16 length> recommended crop (UTF-8). A missing confidence is NaN.
+
+Replay (device state, and optionally a rebuilt readings history):
+    python ingest_log.py replay [--since 2024-06-01] [--rebuild-history data/readings-rebuilt]
+"""
+
+import argparse
+import heapq
+import json
+import math
+import os
+import struct
+import sys
+import threading
+import time
+import zlib
+from datetime import datetime, timezone
+
+from reading_log import VALUE_COLUMNS, ReadingLog
+
+WAL_DIR = os.environ.get("WAL_DIR", os.path.join("data", "wal"))
+WAL_SYNC = os.environ.get("WAL_SYNC", "always")
+WAL_RETENTION_DAYS = float(os.environ.get("WAL_RETENTION_DAYS", "30"))
+SYNC_INTERVAL = 0.05
+SEGMENT_BYTES = 16 * 1024 * 1024
+REBUILD_BATCH = 10000
+
+FEATURES = VALUE_COLUMNS[:-1]
+_frame = struct.Struct("<II")
+_values = struct.Struct(f"<{len(FEATURES) + 2}d")
+_text = struct.Struct("<H")
+
+_fdatasync = getattr(os, "fdatasync", os.fsync)
+
+
+# ---------------------------
+# Record format
+# ---------------------------
+def encode_record(timestamp, reading, device, crop, confidence):
+    # device ids are any JSON scalar from the client; they are logged as text
+    device = ("" if device is None else str(device)).encode()[:0xFFFF]
+    crop = ("" if crop is None else str(crop)).encode()[:0xFFFF]
+    payload = b"".join([
+        _values.pack(timestamp, *(reading[f] for f in FEATURES), math.nan if confidence is None else confidence),
+        _text.pack(len(device)), device, _text.pack(len(crop)), crop,
+    ])
+    return _frame.pack(len(payload), zlib.crc32(payload)) + payload
+
+
+def decode_record(payload):
+    values = _values.unpack_from(payload)
+    position = _values.size
+    texts = []
+    for _ in range(2):
+        (size,) = _text.unpack_from(payload, position)
+        position += _text.size
+        texts.append(bytes(payload[position:position + size]).decode())
+        position += size
+    confidence = values[-1]
+    return {
+        "timestamp": values[0],
+        "sensor_data": dict(zip(FEATURES, values[1:-1])),
+        "device_id": texts[0] or None,
+        "recommended_crop": texts[1] or None,
+        "confidence": None if math.isnan(confidence) else confidence,
+    }
+
+
+def read_segment(path):
+    """Yield a segment's records in order, stopping at a torn or corrupt tail."""
+    with open(path, "rb") as f:
+        data = memoryview(f.read())
+    position = 0
+    while position + _frame.size <= len(data):
+        size, crc = _frame.unpack_from(data, position)
+        payload = data[position + _frame.size:position + _frame.size + size]
+        if len(payload) < size or zlib.crc32(payload) != crc:
+            return
+        yield decode_record(payload)
+        position += _frame.size + size
+
+
+def _fsync_dir(path):
+    fd = os.open(path, os.O_RDONLY)
+    try:
+        os.fsync(fd)
+    finally:
+        os.close(fd)
+
+
+class IngestLog:
+    def __init__(self, root=WAL_DIR, sync=WAL_SYNC, segment_bytes=SEGMENT_BYTES, retention_days=WAL_RETENTION_DAYS):
+        if sync not in ("always", "interval", "off"):
+            raise ValueError(f"Unknown WAL_SYNC mode: {sync}")
+        self.root = root
+        self.sync = sync
+        self.segment_bytes = segment_bytes
+        self.retention = retention_days * 86400
+        self._cond = threading.Condition()
+        self._pid = None
+
+    # ---------------------------
+    # Writing
+    # ---------------------------
+    def _start_writer(self):
+        # each process writes its own segments, named <writer>-<seq>.wal
+        self._writer = f"{int(time.time() * 1000)}-{os.getpid()}"
+        self._seq = 0
+        self._fd = None
+        self._size = 0
+        self._buffer = bytearray()
+        self._appended = 0      # tickets handed out
+        self._durable = 0       # tickets written (and synced per mode)
+        self._failed = []       # (after, through) ticket ranges whose write failed
+        self._flushing = False
+        self._dirty = False
+        self._pid = os.getpid()
+        if self.sync == "interval":
+            threading.Thread(target=self._sync_loop, name="wal-sync", daemon=True).start()
+
+    def _open_segment(self):
+        if self._fd is not None:
+            if self.sync != "off":
+                _fdatasync(self._fd)
+            os.close(self._fd)
+            self._remove_expired()
+        os.makedirs(self.root, exist_ok=True)
+        self._seq += 1
+        path = os.path.join(self.root, f"{self._writer}-{self._seq:06d}.wal")
+        self._fd = os.open(path, os.O_WRONLY | os.O_CREAT | os.O_APPEND, 0o644)
+        self._size = 0
+        if self.sync != "off":
+            _fsync_dir(self.root)
+
+    def _remove_expired(self):
+        cutoff = time.time() - self.retention
+        for path in self.segments():
+            try:
+                if os.path.getmtime(path) < cutoff:
+                    os.remove(path)
+            except FileNotFoundError:
+                pass  # another worker removed it first
+
+    def _write(self, data):
+        if self._fd is None or (self._size and self._size + len(data) > self.segment_bytes):
+            self._open_segment()
+        try:
+            view = memoryview(data)
+            while view:
+                written = os.write(self._fd, view)
+                view = view[written:]
+            if self.sync == "always":
+                _fdatasync(self._fd)
+        except OSError:
+            self._abandon_segment()
+            raise
+        self._size += len(data)
+        if self.sync != "always":
+            self._dirty = True
+
+    def _abandon_segment(self):
+        # a failed write may have left a torn record, which ends the segment for readers:
+        # later groups go to a new segment so they stay replayable
+        try:
+            os.close(self._fd)
+        except OSError:
+            pass
+        self._fd = None
+        self._size = 0
+
+    def _sync_loop(self):
+        while True:
+            time.sleep(SYNC_INTERVAL)
+            with self._cond:
+                fd, dirty, self._dirty = self._fd, self._dirty, False
+            if dirty and fd is not None:
+                try:
+                    _fdatasync(fd)
+                except OSError:
+                    pass  # segment rotated and closed meanwhile; rotation synced it
+
+    def append(self, readings, devices, crops, confidences, timestamp=None):
+        """Log a batch of accepted readings; returns once they are durable (per the sync mode).
+
+        `timestamp` is one time for the whole batch or one per reading.
+        """
+        if not readings:
+            return
+        now = time.time() if timestamp is None else timestamp
+        stamps = [now] * len(readings) if isinstance(now, (int, float)) else now
+        data = b"".join(encode_record(t, r, d, c, p)
+                        for t, r, d, c, p in zip(stamps, readings, devices, crops, confidences))
+        with self._cond:
+            if self._pid != os.getpid():
+                self._start_writer()
+            self._buffer += data
+            self._appended += 1
+            ticket = self._appended
+            while self._durable < ticket:
+                if self._flushing:
+                    self._cond.wait()
+                    continue
+                # leader: write everything buffered so far, letting others queue up meanwhile
+                self._flushing = True
+                group, after, through = bytes(self._buffer), self._durable, self._appended
+                self._buffer.clear()
+                self._cond.release()
+                try:
+                    self._write(group)
+                except OSError:
+                    self._failed = self._failed[-100:] + [(after, through)]
+                    raise
+                finally:
+                    self._cond.acquire()
+                    self._durable = through
+                    self._flushing = False
+                    self._cond.notify_all()
+            if any(after < ticket <= through for after, through in self._failed):
+                raise OSError("Ingestion log write failed")
+
+    def close(self):
+        with self._cond:
+            if self._pid == os.getpid() and self._fd is not None:
+                if self.sync != "off":
+                    _fdatasync(self._fd)
+                os.close(self._fd)
+                self._fd = None
+
+    # ---------------------------
+    # Reading / replay
+    # ---------------------------
+    def segments(self):
+        if not os.path.isdir(self.root):
+            return []
+        return sorted(os.path.join(self.root, e) for e in os.listdir(self.root) if e.endswith(".wal"))
+
+    def _writers(self):
+        writers = {}
+        for path in self.segments():
+            writer = os.path.basename(path).rsplit("-", 1)[0]
+            writers.setdefault(writer, []).append(path)
+        return writers
+
+    def replay(self, since=None):
+        """All records (optionally from `since` epoch seconds), each writer's in append order, merged by time.
+
+        Backdated readings (queued offline) keep their measurement time, so the
+        merged order is only approximately chronological around them.
+        """
+        def records(paths):
+            for path in paths:
+                for record in read_segment(path):
+                    if since is None or record["timestamp"] >= since:
+                        yield record
+
+        return heapq.merge(*(records(paths) for paths in self._writers().values()),
+                           key=lambda record: record["timestamp"])
+
+    def last_record(self):
+        """The most recent record, reading only each writer's newest non-empty segment."""
+        latest = None
+        for paths in self._writers().values():
+            for path in reversed(paths):
+                last = None
+                for last in read_segment(path):
+                    pass
+                if last is not None:
+                    if latest is None or last["timestamp"] >= latest["timestamp"]:
+                        latest = last
+                    break
+        return latest
+
+
+def device_state(records):
+    """Latest record per device (readings without a device id are under null)."""
+    state = {}
+    for record in records:
+        state[record["device_id"]] = record
+    return state
+
+
+def rebuild_history(records, root):
+    """Write the records into a new ReadingLog at `root`; returns the row count."""
+    history = ReadingLog(root)
+    count = 0
+    batch = []
+    for record in records:
+        batch.append(record)
+        if len(batch) >= REBUILD_BATCH:
+            count += _append_history(history, batch)
+            batch = []
+    return count + _append_history(history, batch)
+
+
+def _append_history(history, batch):
+    history.append([r["sensor_data"] for r in batch], [r["device_id"] for r in batch],
+                   [r["recommended_crop"] for r in batch], [r["confidence"] for r in batch],
+                   timestamp=[r["timestamp"] for r in batch])
+    return len(batch)
+
+
+def parse_since(value):
+    try:
+        return float(value)
+    except ValueError:
+        parsed = datetime.fromisoformat(value)
+        if parsed.tzinfo is None:
+            parsed = parsed.replace(tzinfo=timezone.utc)
+        return parsed.timestamp()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Inspect and replay the ingestion log")
+    commands = parser.add_subparsers(dest="command", required=True)
+    replay = commands.add_parser("replay", help="Print per-device state rebuilt from the log")
+    replay.add_argument("--dir", default=WAL_DIR)
+    replay.add_argument("--since", type=parse_since, help="Epoch seconds or ISO-8601 (UTC if naive)")
+    replay.add_argument("--rebuild-history", metavar="READINGS_DIR",
+                        help="Also write the replayed readings into a new reading log")
+    args = parser.parse_args(argv)
+
+    log = IngestLog(args.dir)
+    if args.rebuild_history:
+        if os.path.isdir(args.rebuild_history) and os.listdir(args.rebuild_history):
+            parser.error(f"{args.rebuild_history} is not empty")
+        count = rebuild_history(log.replay(args.since), args.rebuild_history)
+        print(f"✅ Rebuilt {count} readings into {args.rebuild_history}", file=sys.stderr)
+    state = device_state(log.replay(args.since))
+    json.dump({str(device): record for device, record in state.items()}, sys.stdout, indent=2)
+    print()
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
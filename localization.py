@@ -0,0 +1,90 @@
+"""
+localization.py
+
+Server-side localization built once at startup from translations.py:
+
+- compile_catalog(): flattens every language into one interned lookup table,
+  with keys missing from a language filled from the default language
+- negotiate_language(): picks a language from ?lang= or Accept-Language
+  (results cached per header value)
+- Catalog.text() / Catalog.advice(): constant-time lookups; advice templates
+  are cached per (language, message key) as ready-to-call formatters
+"""
+
+import sys
+from functools import lru_cache
+
+from translations import translations
+
+DEFAULT_LANGUAGE = "en"
+SUPPORTED_LANGUAGES = tuple(translations.keys())
+
+
+class Catalog:
+    def __init__(self, tables, default=DEFAULT_LANGUAGE):
+        self.tables = tables
+        self.default = default
+        self._formatters = {}
+
+    def text(self, lang, key):
+        return self.tables.get(lang, self.tables[self.default]).get(key, key)
+
+    def advice(self, lang, key, *args):
+        """Formatted advice message; the template lookup is cached per (lang, key)."""
+        formatter = self._formatters.get((lang, key))
+        if formatter is None:
+            formatter = self.text(lang, "advice_" + key).format
+            self._formatters[(lang, key)] = formatter
+        return formatter(*args)
+
+
+def compile_catalog(extra=None, default=DEFAULT_LANGUAGE):
+    """Merge translations.py with server-side strings into interned tables.
+
+    `extra` is {lang: {key: text}}; entries there are only used where
+    translations.py has no string for that key.
+    """
+    extra = extra or {}
+    languages = set(translations) | set(extra)
+    merged = {lang: {**extra.get(lang, {}), **translations.get(lang, {})} for lang in languages}
+    base = merged[default]
+    tables = {}
+    for lang in languages:
+        table = {**base, **merged[lang]}
+        tables[sys.intern(lang)] = {sys.intern(k): sys.intern(v) for k, v in table.items()}
+    return Catalog(tables, default)
+
+
+@lru_cache(maxsize=256)
+def _parse_accept_language(header):
+    choices = []
+    for part in header.split(","):
+        piece = part.strip().split(";")
+        tag = piece[0].strip().lower()
+        if not tag:
+            continue
+        q = 1.0
+        for param in piece[1:]:
+            name, _, value = param.strip().partition("=")
+            if name == "q":
+                try:
+                    q = float(value)
+                except ValueError:
+                    q = 0.0
+        primary = tag.split("-")[0]
+        if primary in SUPPORTED_LANGUAGES and q > 0:
+            choices.append((q, primary))
+    if not choices:
+        return DEFAULT_LANGUAGE
+    # highest q wins; ties keep header order
+    return max(choices, key=lambda c: c[0])[1]
+
+
+def negotiate_language(query_lang=None, accept_language=None):
+    if query_lang:
+        lang = query_lang.strip().lower().split("-")[0]
+        if lang in SUPPORTED_LANGUAGES:
+            return lang
+    if accept_language:
+        return _parse_accept_language(accept_language)
+    return DEFAULT_LANGUAGE
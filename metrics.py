@@ -0,0 +1,225 @@
+"""
+metrics.py
+
+Low-overhead request/stage instrumentation exported in Prometheus text format:
+
+- Counters and latency histograms with fixed buckets, declared up front
+- Every process writes its values into its own memory-mapped file of
+  float64 slots under METRICS_DIR (series keys in a JSON sidecar), so
+  recording is a few in-memory adds and /metrics can sum all gunicorn
+  workers by reading their files
+- Files are keyed by pid and reopened (not reset) if a pid is reused;
+  clear METRICS_DIR on deploy to start counting from zero
+"""
+
+import json
+import logging
+import mmap
+import os
+import threading
+import time
+from bisect import bisect_left
+from contextlib import contextmanager
+from functools import wraps
+
+log = logging.getLogger("crop_server")
+
+METRICS_DIR = os.environ.get("METRICS_DIR", os.path.join("data", "metrics"))
+SLOTS = 8192
+LATENCY_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+
+class _Series:
+    def __init__(self, kind, help_text, labelnames, buckets=None):
+        self.kind = kind
+        self.help = help_text
+        self.labelnames = tuple(labelnames)
+        self.buckets = buckets
+        # histogram block: one slot per bucket (+Inf last), then sum, then count
+        self.width = 1 if buckets is None else len(buckets) + 3
+
+
+class Metrics:
+    def __init__(self, directory=METRICS_DIR, slots=SLOTS):
+        self.directory = directory
+        self.slots = slots
+        self.series = {}
+        self._index = {}
+        self._next = 0
+        self._values = None
+        self._pid = None
+        self._lock = threading.Lock()
+        self._full = False
+
+    # ---------------------------
+    # Declaration
+    # ---------------------------
+    def counter(self, name, help_text, labelnames=()):
+        self.series[name] = _Series("counter", help_text, labelnames)
+
+    def histogram(self, name, help_text, labelnames=(), buckets=LATENCY_BUCKETS):
+        self.series[name] = _Series("histogram", help_text, labelnames, buckets)
+
+    # ---------------------------
+    # Per-process storage
+    # ---------------------------
+    def _open(self):
+        # after a fork the child must not share the parent's mapping
+        pid = os.getpid()
+        os.makedirs(self.directory, exist_ok=True)
+        fd = os.open(os.path.join(self.directory, f"{pid}.bin"), os.O_RDWR | os.O_CREAT, 0o644)
+        try:
+            if os.fstat(fd).st_size < self.slots * 8:
+                os.ftruncate(fd, self.slots * 8)
+            self._map = mmap.mmap(fd, self.slots * 8)
+        finally:
+            os.close(fd)
+        self._values = memoryview(self._map).cast("d")
+        self._keys_path = os.path.join(self.directory, f"{pid}.json")
+        self._index, self._next = {}, 0
+        if os.path.exists(self._keys_path):
+            # a reused pid keeps adding to the previous process's totals
+            with open(self._keys_path, "r") as f:
+                for name, labels, slot in json.load(f):
+                    self._index[(name, tuple(labels))] = slot
+                    width = self.series[name].width if name in self.series else 1
+                    self._next = max(self._next, slot + width)
+        self._pid = pid
+
+    def _slot(self, name, labels):
+        key = (name, labels)
+        slot = self._index.get(key)
+        if slot is None:
+            width = self.series[name].width
+            if self._next + width > self.slots:
+                if not self._full:
+                    log.warning("Metrics storage full, dropping new series such as %s%s", name, labels)
+                    self._full = True
+                return None
+            slot = self._next
+            self._next += width
+            self._index[key] = slot
+            tmp_path = self._keys_path + ".tmp"
+            with open(tmp_path, "w") as f:
+                json.dump([[n, list(l), s] for (n, l), s in self._index.items()], f)
+            os.replace(tmp_path, self._keys_path)
+        return slot
+
+    # ---------------------------
+    # Recording
+    # ---------------------------
+    def inc(self, name, labels=(), value=1.0):
+        with self._lock:
+            if self._pid != os.getpid():
+                self._open()
+            slot = self._slot(name, labels)
+            if slot is not None:
+                self._values[slot] += value
+
+    def observe(self, name, value, labels=()):
+        with self._lock:
+            if self._pid != os.getpid():
+                self._open()
+            slot = self._slot(name, labels)
+            if slot is not None:
+                series = self.series[name]
+                self._values[slot + bisect_left(series.buckets, value)] += 1
+                self._values[slot + series.width - 2] += value
+                self._values[slot + series.width - 1] += 1
+
+    @contextmanager
+    def timer(self, name, labels=()):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(name, time.perf_counter() - start, labels)
+
+    def timed(self, name, labels=()):
+        """Decorator form of timer()."""
+        def decorate(fn):
+            @wraps(fn)
+            def wrapper(*args, **kwargs):
+                with self.timer(name, labels):
+                    return fn(*args, **kwargs)
+            return wrapper
+        return decorate
+
+    def timed_iter(self, iterable, name, labels=()):
+        """Yield from `iterable`, observing only the time spent producing items."""
+        spent = 0.0
+        iterator = iter(iterable)
+        try:
+            while True:
+                start = time.perf_counter()
+                try:
+                    item = next(iterator)
+                except StopIteration:
+                    break
+                finally:
+                    spent += time.perf_counter() - start
+                yield item
+        finally:
+            self.observe(name, spent, labels)
+
+    # ---------------------------
+    # Aggregation / exposition
+    # ---------------------------
+    def collect(self):
+        """{(name, labels): [values]} summed over every process's file."""
+        totals = {}
+        if not os.path.isdir(self.directory):
+            return totals
+        for entry in os.listdir(self.directory):
+            if not entry.endswith(".json"):
+                continue
+            keys_path = os.path.join(self.directory, entry)
+            try:
+                with open(keys_path, "r") as f:
+                    keys = json.load(f)
+                with open(keys_path[:-5] + ".bin", "rb") as f:
+                    data = memoryview(f.read()).cast("d")
+            except (OSError, ValueError):
+                continue
+            for name, labels, slot in keys:
+                series = self.series.get(name)
+                if series is None or slot + series.width > len(data):
+                    continue
+                values = totals.setdefault((name, tuple(labels)), [0.0] * series.width)
+                for i in range(series.width):
+                    values[i] += data[slot + i]
+        return totals
+
+    def render(self):
+        totals = self.collect()
+        lines = []
+        for name, series in self.series.items():
+            lines.append(f"# HELP {name} {series.help}")
+            lines.append(f"# TYPE {name} {series.kind}")
+            for (series_name, labels), values in sorted(totals.items()):
+                if series_name != name:
+                    continue
+                pairs = [f'{k}="{_escape(v)}"' for k, v in zip(series.labelnames, labels)]
+                if series.kind == "counter":
+                    lines.append(f"{name}{_labels(pairs)} {_number(values[0])}")
+                    continue
+                cumulative = 0.0
+                for bound, count in zip(series.buckets + ("+Inf",), values):
+                    cumulative += count
+                    le = 'le="%s"' % (bound if bound == "+Inf" else repr(bound))
+                    lines.append(f"{name}_bucket{_labels(pairs + [le])} {_number(cumulative)}")
+                lines.append(f"{name}_sum{_labels(pairs)} {repr(values[-2])}")
+                lines.append(f"{name}_count{_labels(pairs)} {_number(values[-1])}")
+        return "\n".join(lines) + "\n"
+
+
+def _escape(value):
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _labels(pairs):
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+def _number(value):
+    return str(int(value)) if value == int(value) else repr(value)
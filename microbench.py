@@ -0,0 +1,117 @@
+"""
+microbench.py
+
+Micro-benchmarks for the server's internal hot functions, with
+pyperf-style repetition: each benchmark is calibrated to a loop count that
+runs for at least --min-time, warmed up, then timed over --samples
+samples; mean ± stdev, median and min per call are reported.
+
+Usage:
+    python microbench.py [--only predict_proba_1 chart_npk ...] [-o results.json]
+"""
+
+import argparse
+import json
+import os
+import statistics
+import sys
+import time
+
+import joblib
+import numpy as np
+
+from benchmark import git_commit, load_readings, scratch_env
+
+
+def calibrate(fn, min_time):
+    loops = 1
+    while True:
+        start = time.perf_counter()
+        for _ in range(loops):
+            fn()
+        if time.perf_counter() - start >= min_time or loops >= 1 << 20:
+            return loops
+        loops *= 2
+
+
+def bench(fn, samples, warmups, min_time):
+    loops = calibrate(fn, min_time)
+    timings = []
+    for i in range(warmups + samples):
+        start = time.perf_counter()
+        for _ in range(loops):
+            fn()
+        if i >= warmups:
+            timings.append((time.perf_counter() - start) / loops)
+    return {
+        "loops": loops,
+        "mean_us": statistics.fmean(timings) * 1e6,
+        "stdev_us": statistics.stdev(timings) * 1e6 if len(timings) > 1 else 0.0,
+        "median_us": statistics.median(timings) * 1e6,
+        "min_us": min(timings) * 1e6,
+    }
+
+
+def build_benchmarks():
+    """{name: zero-argument callable} over the real server functions."""
+    for key, value in scratch_env().items():
+        os.environ.setdefault(key, value)
+    import server
+
+    workload = load_readings(256, seed=0)
+    readings = [reading for reading, _ in workload]
+    crops = [crop for _, crop in workload]
+    X = np.array([[r[f] for f in server.MODEL_FEATURES] for r in readings])
+    one, crop = readings[0], crops[0]
+    npk, soil = server.chart_key(one, ["N", "P", "K"]), server.chart_key(one, ["moisture", "pH", "temperature"])
+    plan_X = np.array([[r[f] for f in server.PLAN_FEATURES] for r in readings])
+    crop_ids = server.registry.crop_ids(crops)
+
+    benchmarks = {
+        "model_load": lambda: joblib.load("crop_recommendation_model.pkl"),
+        "within_physical_limits": lambda: server.within_physical_limits(one),
+        "within_zscore": lambda: server.within_zscore(one),
+        "assess_readings_1": lambda: server.assess_readings([one]),
+        "assess_readings_256": lambda: server.assess_readings(readings),
+        "fertilizer_plan_1": lambda: server.build_fertilizer_plan(one, crop),
+        "deficits_batch_256": lambda: server.registry.status(crop_ids, plan_X, server.PLAN_FEATURES),
+        # bypass the lru_cache so every call renders
+        "chart_npk": lambda: server.render_npk_chart.__wrapped__(npk, crop),
+        "chart_soil": lambda: server.render_soil_chart.__wrapped__(soil, crop),
+    }
+    if server.model_loaded:
+        benchmarks["predict_proba_1"] = lambda: server.model.predict_proba(X[:1])
+        benchmarks["predict_proba_256"] = lambda: server.model.predict_proba(X)
+    return benchmarks
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Micro-benchmarks for inference and planning")
+    parser.add_argument("--only", nargs="+", help="Run only these benchmarks")
+    parser.add_argument("--samples", type=int, default=10)
+    parser.add_argument("--warmups", type=int, default=1)
+    parser.add_argument("--min-time", type=float, default=0.1, help="Minimum seconds per sample")
+    parser.add_argument("-o", "--output", help="Save results as JSON")
+    args = parser.parse_args(argv)
+
+    benchmarks = build_benchmarks()
+    names = args.only or list(benchmarks)
+    unknown = set(names) - set(benchmarks)
+    if unknown:
+        parser.error(f"Unknown benchmarks: {', '.join(sorted(unknown))}")
+
+    results = {}
+    for name in names:
+        results[name] = stats = bench(benchmarks[name], args.samples, args.warmups, args.min_time)
+        print(f"{name:24s} {stats['mean_us']:>12.1f} us ± {stats['stdev_us']:.1f}  "
+              f"(median {stats['median_us']:.1f}, min {stats['min_us']:.1f}, {stats['loops']} loops)")
+
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump({"commit": git_commit(), "results": results}, f, indent=2)
+        print(f"✅ Results saved to {args.output}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
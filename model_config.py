@@ -0,0 +1,28 @@
+"""
+model_config.py
+
+Model inputs and decision constants shared by server.py and the
+on-device model exporter (crop_model_lite.py)
+
+- FEATURE_NAMES: the reading keys the server requires, in the order of its
+  validation arrays (physical limits, feature_means.pkl / feature_stds.pkl)
+- model_features(): the same keys in the column order the forest was
+  trained on (feature_order.pkl), which is what predict_proba must be fed
+"""
+
+import os
+
+FEATURE_NAMES = ["N", "P", "K", "moisture", "temperature", "pH"]
+Z_THRESHOLD = 3.0
+CONFIDENCE_THRESHOLD = 0.60
+FEATURE_ORDER_FILE = "feature_order.pkl"
+
+
+def model_features(path=FEATURE_ORDER_FILE):
+    """Training column order as reading keys (the CSV's "ph" is "pH" here); FEATURE_NAMES if unknown."""
+    if not os.path.exists(path):
+        return list(FEATURE_NAMES)
+    import joblib
+
+    by_lower = {name.lower(): name for name in FEATURE_NAMES}
+    return [by_lower[column.lower()] for column in joblib.load(path)]
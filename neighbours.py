@@ -0,0 +1,87 @@
+"""
+neighbours.py
+
+- Build a KD-tree over the standardized Final_crop_data.csv rows (training time)
+- Memory-map it at serve time
+- Answer single and batched k-nearest-neighbour queries for readings that
+  fail the z-score check, so users still get a grounded suggestion
+
+Run `python neighbours.py` after retraining or refreshing the feature stats.
+"""
+
+import os
+
+import joblib
+import numpy as np
+
+INDEX_FILE = "neighbour_index.pkl"
+DATA_FILE = "Final_crop_data.csv"
+
+# Serving feature name (server.FEATURE_NAMES order) -> column in Final_crop_data.csv
+CSV_COLUMNS = {"N": "N", "P": "P", "K": "K", "moisture": "moisture",
+               "temperature": "temperature", "pH": "ph"}
+
+
+# ---------------------------
+# Serve time
+# ---------------------------
+def load_index(path=INDEX_FILE):
+    """Load the prebuilt index; the tree and label arrays stay memory-mapped."""
+    if not os.path.exists(path):
+        return None
+    return joblib.load(path, mmap_mode="r")
+
+
+def nearest(index, sensor_array, k=5):
+    """Return (labels, distances) for the k nearest training samples.
+
+    `sensor_array` is one reading (n_features,) or a batch (n, n_features) in
+    index["feature_names"] order. Distances are in standardized units.
+    """
+    X = np.atleast_2d(np.asarray(sensor_array, dtype=float))
+    Z = (X - index["means"]) / index["stds"]
+    distances, idx = index["tree"].query(Z, k=min(k, len(index["labels"])))
+    return np.asarray(index["labels"])[idx], distances
+
+
+def nearest_samples(index, sensor_values, k=5):
+    """Single-reading helper returning JSON-ready neighbours and their majority crop."""
+    sensor_array = [sensor_values[f] for f in index["feature_names"]]
+    labels, distances = nearest(index, sensor_array, k)
+    labels, distances = labels[0], distances[0]
+    crops, counts = np.unique(labels, return_counts=True)
+    samples = [{"crop": str(label), "distance": round(float(dist), 3)}
+               for label, dist in zip(labels, distances)]
+    return str(crops[np.argmax(counts)]), samples
+
+
+# ---------------------------
+# Training time
+# ---------------------------
+def build_index(feature_names, means, stds, data_file=DATA_FILE, leaf_size=16):
+    from sklearn.neighbors import KDTree
+    import pandas as pd
+
+    data = pd.read_csv(data_file)
+    X = data[[CSV_COLUMNS[f] for f in feature_names]].to_numpy(dtype=float)
+    means = np.asarray(means, dtype=float)
+    stds = np.asarray(stds, dtype=float)
+    return {
+        "feature_names": list(feature_names),
+        "means": means,
+        "stds": stds,
+        "tree": KDTree((X - means) / stds, leaf_size=leaf_size),
+        "labels": data["label"].to_numpy(dtype=str),
+    }
+
+
+def main():
+    index = build_index(list(CSV_COLUMNS),
+                        joblib.load("feature_means.pkl"),
+                        joblib.load("feature_stds.pkl"))
+    joblib.dump(index, INDEX_FILE)
+    print(f"Neighbour index saved to {INDEX_FILE}: {len(index['labels'])} samples")
+
+
+if __name__ == "__main__":
+    main()
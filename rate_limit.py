@@ -0,0 +1,171 @@
+"""
+rate_limit.py
+
+Admission control for the server:
+
+- Token-bucket rate limits with O(1) checks, on one of two backends:
+  MemoryBackend (per process) or SharedBackend (a memory-mapped hash table
+  of buckets shared by every gunicorn worker, guarded by byte-range locks
+  on just the probed slots)
+- Concurrency caps for expensive endpoints: a per-process semaphore, or
+  flock()ed slot files shared across workers (a crashed worker's slot is
+  released by the kernel)
+
+Every check returns how long the caller should wait (0 = admitted), which
+the server turns into 429/503 with Retry-After.
+"""
+
+import fcntl
+import hashlib
+import mmap
+import os
+import struct
+import threading
+import time
+
+RATE_LIMIT_DIR = os.environ.get("RATE_LIMIT_DIR", os.path.join("data", "ratelimit"))
+
+
+def _refill(tokens, last, now, rate, burst):
+    return min(burst, tokens + (now - last) * rate)
+
+
+# ---------------------------
+# Token-bucket backends
+# ---------------------------
+class MemoryBackend:
+    def __init__(self, max_keys=100000):
+        self.max_keys = max_keys
+        self._buckets = {}
+        self._lock = threading.Lock()
+
+    def take(self, key, rate, burst, cost=1.0, now=None):
+        now = time.monotonic() if now is None else now
+        with self._lock:
+            tokens, last = self._buckets.get(key, (burst, now))
+            tokens = _refill(tokens, last, now, rate, burst)
+            if tokens >= cost:
+                self._buckets[key] = (tokens - cost, now)
+                wait = 0.0
+            else:
+                self._buckets[key] = (tokens, now)
+                wait = (cost - tokens) / rate
+            if len(self._buckets) > self.max_keys:
+                # forget buckets that have refilled completely: they hold no state
+                self._buckets = {k: v for k, v in self._buckets.items()
+                                 if _refill(v[0], v[1], now, rate, burst) < burst}
+        return wait
+
+
+class SharedBackend:
+    """Bucket table in a shared file: slot = (key hash, tokens, last refill)."""
+
+    SLOT = struct.Struct("Qdd")
+    PROBE = 8
+
+    def __init__(self, path=None, slots=65536):
+        self.path = path or os.path.join(RATE_LIMIT_DIR, "buckets.bin")
+        self.slots = slots
+        self._map = None
+        self._fd = None
+        self._pid = None
+        # lockf() locks belong to the process, so they don't exclude this worker's own threads
+        self._lock = threading.Lock()
+
+    def _open(self):
+        os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+        fd = os.open(self.path, os.O_RDWR | os.O_CREAT, 0o644)
+        size = self.slots * self.SLOT.size
+        if os.fstat(fd).st_size < size:
+            os.ftruncate(fd, size)
+        self._map = mmap.mmap(fd, size)
+        self._fd = fd
+        self._pid = os.getpid()
+
+    def take(self, key, rate, burst, cost=1.0, now=None):
+        with self._lock:
+            return self._take(key, rate, burst, cost, now)
+
+    def _take(self, key, rate, burst, cost, now):
+        if self._pid != os.getpid():
+            self._open()
+        # wall clock: monotonic clocks are not comparable between processes
+        now = time.time() if now is None else now
+        h = int.from_bytes(hashlib.blake2b(key.encode(), digest_size=8).digest(), "little") or 1
+        first = h % (self.slots - self.PROBE)
+        offset = first * self.SLOT.size
+        length = self.PROBE * self.SLOT.size
+        fcntl.lockf(self._fd, fcntl.LOCK_EX, length, offset)
+        try:
+            empty, oldest = None, None
+            for slot in range(first, first + self.PROBE):
+                stored, tokens, last = self.SLOT.unpack_from(self._map, slot * self.SLOT.size)
+                if stored == h:
+                    break
+                if stored == 0:
+                    empty = slot if empty is None else empty
+                elif oldest is None or last < oldest[1]:
+                    oldest = (slot, last)
+            else:
+                # new key: take a free slot, else recycle the least recently used bucket
+                slot = empty if empty is not None else oldest[0]
+                tokens, last = burst, now
+            tokens = _refill(tokens, last, now, rate, burst)
+            wait = 0.0 if tokens >= cost else (cost - tokens) / rate
+            if not wait:
+                tokens -= cost
+            self.SLOT.pack_into(self._map, slot * self.SLOT.size, h, tokens, now)
+        finally:
+            fcntl.lockf(self._fd, fcntl.LOCK_UN, length, offset)
+        return wait
+
+
+class RateLimiter:
+    def __init__(self, backend, rate, burst, prefix=""):
+        self.backend = backend
+        self.rate = float(rate)
+        self.burst = float(burst)
+        self.prefix = prefix
+
+    def check(self, key, cost=1.0):
+        """Seconds until `cost` tokens are available for `key`; 0 means admitted (and taken)."""
+        return self.backend.take(self.prefix + key, self.rate, self.burst, cost)
+
+
+# ---------------------------
+# Concurrency caps
+# ---------------------------
+class ConcurrencyLimit:
+    """At most `limit` holders within this process."""
+
+    def __init__(self, limit):
+        self.limit = limit
+        self._semaphore = threading.BoundedSemaphore(limit)
+
+    def acquire(self):
+        return True if self._semaphore.acquire(blocking=False) else None
+
+    def release(self, token):
+        self._semaphore.release()
+
+
+class SharedConcurrencyLimit:
+    """At most `limit` holders across processes, one flock()ed file per slot."""
+
+    def __init__(self, name, limit, directory=RATE_LIMIT_DIR):
+        self.limit = limit
+        self.paths = [os.path.join(directory, f"{name}.{i}.lock") for i in range(limit)]
+        os.makedirs(directory, exist_ok=True)
+
+    def acquire(self):
+        for path in self.paths:
+            fd = os.open(path, os.O_RDWR | os.O_CREAT, 0o644)
+            try:
+                fcntl.flock(fd, fcntl.LOCK_EX | fcntl.LOCK_NB)
+                return fd
+            except BlockingIOError:
+                os.close(fd)
+        return None
+
+    def release(self, token):
+        os.close(token)  # closing drops the lock
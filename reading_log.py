@@ -0,0 +1,194 @@
+"""
+reading_log.py
+
+Compact column-oriented on-disk log of accepted sensor readings:
+
+- One segment directory per writer process (safe under several gunicorn
+  workers), one fixed-width binary file per column, appended in place
+- Strings (device id, recommended crop) are dictionary-encoded per segment
+- Readers memory-map the column files and walk them in fixed-size chunks,
+  so exports use constant memory regardless of log size
+- Rows are usually appended in time order; when a batch is not (backdated
+  readings from offline clients) the segment's time bounds are kept in
+  bounds.json so time-filtered reads can still skip whole segments
+"""
+
+import json
+import os
+import threading
+import time
+
+import numpy as np
+
+READINGS_DIR = os.environ.get("READINGS_DIR", os.path.join("data", "readings"))
+CHUNK_ROWS = 65536
+
+# Float columns after the timestamp, in file order
+VALUE_COLUMNS = ["N", "P", "K", "moisture", "temperature", "pH", "confidence"]
+COLUMN_DTYPES = {
+    "timestamp": np.float64,
+    "device": np.int32,
+    "crop": np.int32,
+    **{name: np.float64 for name in VALUE_COLUMNS},
+}
+
+
+class _Dictionary:
+    """Append-only string <-> code table persisted as a JSON list."""
+
+    def __init__(self, path):
+        self.path = path
+        self.values = []
+        if os.path.exists(path):
+            with open(path, "r") as f:
+                self.values = json.load(f)
+        self.codes = {v: i for i, v in enumerate(self.values)}
+
+    def encode(self, value):
+        code = self.codes.get(value)
+        if code is None:
+            code = len(self.values)
+            self.values.append(value)
+            self.codes[value] = code
+            tmp_path = self.path + ".tmp"
+            with open(tmp_path, "w") as f:
+                json.dump(self.values, f)
+            os.replace(tmp_path, self.path)
+        return code
+
+
+class ReadingLog:
+    def __init__(self, root=READINGS_DIR):
+        self.root = root
+        self._lock = threading.Lock()
+        self._segment = None
+        self._files = None
+        self._dicts = None
+        self._bounds = None
+        self._pid = None
+
+    # ---------------------------
+    # Writing
+    # ---------------------------
+    def _open_segment(self):
+        # A fresh segment per process: columns from different writers never interleave
+        name = f"{int(time.time() * 1000)}-{os.getpid()}"
+        self._segment = os.path.join(self.root, name)
+        os.makedirs(self._segment, exist_ok=True)
+        self._files = {col: open(os.path.join(self._segment, f"{col}.bin"), "ab")
+                       for col in COLUMN_DTYPES}
+        self._dicts = {"device": _Dictionary(os.path.join(self._segment, "device.json")),
+                       "crop": _Dictionary(os.path.join(self._segment, "crop.json"))}
+        self._bounds = None
+        self._pid = os.getpid()
+
+    def _track_bounds(self, timestamps):
+        """Persist the segment's (min, max) time once rows stop arriving in order."""
+        lo, hi = float(timestamps.min()), float(timestamps.max())
+        in_order = self._bounds is None or timestamps[0] >= self._bounds[1]
+        if in_order and np.all(timestamps[1:] >= timestamps[:-1]):
+            self._bounds = (lo if self._bounds is None else self._bounds[0], hi)
+            return
+        self._bounds = (lo, hi) if self._bounds is None else (min(lo, self._bounds[0]), max(hi, self._bounds[1]))
+        # written before the rows, so the bounds always cover every visible row
+        tmp_path = os.path.join(self._segment, "bounds.json.tmp")
+        with open(tmp_path, "w") as f:
+            json.dump(list(self._bounds), f)
+        os.replace(tmp_path, os.path.join(self._segment, "bounds.json"))
+
+    def append(self, readings, devices, crops, confidences, timestamp=None):
+        """Append a batch: readings are dicts with VALUE_COLUMNS[:-1] keys.
+
+        `timestamp` is one time for the whole batch or one per reading.
+        """
+        if not readings:
+            return
+        with self._lock:
+            if self._segment is None or self._pid != os.getpid():
+                self._open_segment()
+            n = len(readings)
+            now = time.time() if timestamp is None else timestamp
+            timestamps = np.broadcast_to(np.asarray(now, dtype=np.float64), (n,))
+            self._track_bounds(timestamps)
+            columns = {
+                "timestamp": timestamps,
+                "device": np.array([self._dicts["device"].encode(d or "") for d in devices], dtype=np.int32),
+                "crop": np.array([self._dicts["crop"].encode(c or "") for c in crops], dtype=np.int32),
+                "confidence": np.array([np.nan if c is None else c for c in confidences], dtype=np.float64),
+            }
+            for col in VALUE_COLUMNS[:-1]:
+                columns[col] = np.array([r[col] for r in readings], dtype=np.float64)
+            for col, f in self._files.items():
+                f.write(columns[col].tobytes())
+                f.flush()
+
+    # ---------------------------
+    # Reading
+    # ---------------------------
+    def segments(self):
+        if not os.path.isdir(self.root):
+            return []
+        return sorted(os.path.join(self.root, d) for d in os.listdir(self.root)
+                      if os.path.isdir(os.path.join(self.root, d)))
+
+    def _open_columns(self, segment):
+        sizes = {}
+        for col, dtype in COLUMN_DTYPES.items():
+            path = os.path.join(segment, f"{col}.bin")
+            sizes[col] = os.path.getsize(path) // np.dtype(dtype).itemsize if os.path.exists(path) else 0
+        # a crash mid-append can leave columns of unequal length
+        rows = min(sizes.values())
+        if rows == 0:
+            return 0, None
+        maps = {col: np.memmap(os.path.join(segment, f"{col}.bin"), dtype=dtype, mode="r", shape=(rows,))
+                for col, dtype in COLUMN_DTYPES.items()}
+        return rows, maps
+
+    def iter_chunks(self, start=None, end=None, devices=None, chunk_rows=CHUNK_ROWS):
+        """Yield filtered column chunks as dicts of arrays.
+
+        'device' and 'crop' come back decoded as object arrays of strings.
+        """
+        for segment in self.segments():
+            rows, maps = self._open_columns(segment)
+            if not rows:
+                continue
+            # whole segments outside the range are skipped without reading their rows
+            first, last = segment_bounds(segment, maps["timestamp"], rows)
+            if (start is not None and last < start) or (end is not None and first >= end):
+                continue
+            # read after the column sizes: every visible row's code is already in the dictionary
+            device_names = np.array(_Dictionary(os.path.join(segment, "device.json")).values, dtype=object)
+            crop_names = np.array(_Dictionary(os.path.join(segment, "crop.json")).values, dtype=object)
+            device_codes = None
+            if devices:
+                device_codes = [i for i, name in enumerate(device_names) if name in devices]
+                if not device_codes:
+                    continue
+            for lo in range(0, rows, chunk_rows):
+                hi = min(lo + chunk_rows, rows)
+                ts = maps["timestamp"][lo:hi]
+                mask = np.ones(hi - lo, dtype=bool)
+                if start is not None:
+                    mask &= ts >= start
+                if end is not None:
+                    mask &= ts < end
+                if device_codes is not None:
+                    mask &= np.isin(maps["device"][lo:hi], device_codes)
+                if not mask.any():
+                    continue
+                chunk = {col: np.asarray(m[lo:hi][mask]) for col, m in maps.items()}
+                chunk["device"] = device_names[chunk["device"]]
+                chunk["crop"] = crop_names[chunk["crop"]]
+                yield chunk
+
+
+def segment_bounds(segment, timestamps, rows):
+    """(earliest, latest) row time: the first and last row, widened by bounds.json if present."""
+    first, last = timestamps[0], timestamps[rows - 1]
+    try:
+        with open(os.path.join(segment, "bounds.json"), "r") as f:
+            lo, hi = json.load(f)
+    except FileNotFoundError:
+        return first, last
+    return min(first, lo), max(last, hi)
@@ -0,0 +1,292 @@
+"""
+report_engine.py
+
+Streaming PDF writer for crop reports:
+
+- Static parts (file header, font objects, per-language title block) are
+  built once and reused for every report
+- Each field is laid out into its own page(s) and written out as soon as it
+  is complete, so a many-field season report streams with flat memory
+- Chart PNGs are embedded as image XObjects; conversions are cached so a
+  chart already rendered by a chart endpoint is not re-rendered or re-encoded
+
+Uses the PDF core fonts (Helvetica, WinAnsi) with fpdf's glyph widths for
+line wrapping, so no font files are embedded.
+"""
+
+import hashlib
+import io
+import zlib
+from collections import OrderedDict
+from functools import lru_cache
+
+from fpdf.fonts import fpdf_charwidths
+
+K = 72 / 25.4  # points per mm
+PAGE_WIDTH = 210 * K
+PAGE_HEIGHT = 297 * K
+MARGIN = 10 * K
+CONTENT_WIDTH = PAGE_WIDTH - 2 * MARGIN
+
+# Object 1 is the catalog, 2 the page tree; fonts follow
+FONTS = OrderedDict([("F1", "Helvetica"), ("F2", "Helvetica-Bold")])
+_WIDTHS = {"F1": fpdf_charwidths["helvetica"], "F2": fpdf_charwidths["helveticaB"]}
+FIRST_FREE_ID = 3 + len(FONTS)
+IMAGE_CACHE_SIZE = 64
+
+
+def _encode(text):
+    return str(text).encode("cp1252", "replace")
+
+
+def _escape(raw):
+    return raw.replace(b"\\", b"\\\\").replace(b"(", b"\\(").replace(b")", b"\\)")
+
+
+def text_width(text, size, font="F1"):
+    widths = _WIDTHS[font]
+    return sum(widths.get(chr(b), 500) for b in _encode(text)) * size / 1000.0
+
+
+def wrap_text(text, size, width, font="F1"):
+    lines, line = [], ""
+    for word in str(text).split(" "):
+        candidate = f"{line} {word}" if line else word
+        if line and text_width(candidate, size, font) > width:
+            lines.append(line)
+            line = word
+        else:
+            line = candidate
+    lines.append(line)
+    return lines
+
+
+# ---------------------------
+# Static template (built once)
+# ---------------------------
+def _font_objects():
+    out = []
+    for i, base in enumerate(FONTS.values()):
+        out.append((3 + i, f"<< /Type /Font /Subtype /Type1 /BaseFont /{base} "
+                           f"/Encoding /WinAnsiEncoding >>".encode()))
+    return out
+
+
+FONT_OBJECTS = _font_objects()
+RESOURCE_FONTS = b"/Font << " + b" ".join(
+    f"/{name} {3 + i} 0 R".encode() for i, name in enumerate(FONTS)) + b" >>"
+
+
+@lru_cache(maxsize=None)
+def title_block(title):
+    """Content-stream ops for the centred report title, cached per title text."""
+    size = 16
+    x = MARGIN + (CONTENT_WIDTH - text_width(title, size, "F2")) / 2
+    y = PAGE_HEIGHT - MARGIN - 7 * K
+    return b"BT /F2 %d Tf %.2f %.2f Td (%s) Tj ET\n" % (size, x, y, _escape(_encode(title)))
+
+
+@lru_cache(maxsize=IMAGE_CACHE_SIZE)
+def png_to_xobject(png_bytes):
+    """(width, height, stream dict, deflated RGB data) for an image XObject."""
+    from PIL import Image
+
+    image = Image.open(io.BytesIO(png_bytes))
+    if image.mode in ("RGBA", "LA", "P"):
+        image = image.convert("RGBA")
+        background = Image.new("RGB", image.size, (255, 255, 255))
+        background.paste(image, mask=image.split()[-1])
+        image = background
+    else:
+        image = image.convert("RGB")
+    data = zlib.compress(image.tobytes(), 6)
+    width, height = image.size
+    header = (f"<< /Type /XObject /Subtype /Image /Width {width} /Height {height} "
+              f"/ColorSpace /DeviceRGB /BitsPerComponent 8 /Filter /FlateDecode "
+              f"/Length {len(data)} >>").encode()
+    return width, height, header, data
+
+
+# ---------------------------
+# Page layout
+# ---------------------------
+class Page:
+    def __init__(self):
+        self.ops = []
+        self.images = {}
+        self.y = PAGE_HEIGHT - MARGIN
+
+    def fits(self, height):
+        return self.y - height >= MARGIN
+
+    def raw(self, ops, height=0):
+        self.ops.append(ops)
+        self.y -= height
+
+    def text(self, text, size=11, bold=False, line_mm=8, indent=0):
+        font = "F2" if bold else "F1"
+        line = line_mm * K
+        baseline = self.y - (line + size * 0.7) / 2
+        self.ops.append(b"BT /%s %d Tf %.2f %.2f Td (%s) Tj ET\n" % (
+            font.encode(), size, MARGIN + indent, baseline, _escape(_encode(text))))
+        self.y -= line
+
+    def gap(self, mm):
+        self.y -= mm * K
+
+    def image(self, name, width_px, height_px, width_mm):
+        width = width_mm * K
+        height = width * height_px / width_px
+        self.ops.append(b"q %.2f 0 0 %.2f %.2f %.2f cm /%s Do Q\n" % (
+            width, height, MARGIN, self.y - height, name.encode()))
+        self.y -= height
+
+    def content(self):
+        return b"".join(self.ops)
+
+
+# ---------------------------
+# Streaming writer
+# ---------------------------
+class StreamingPDF:
+    """Writes a PDF incrementally; each method returns the bytes to send."""
+
+    def __init__(self):
+        self.position = 0
+        self.offsets = {}
+        self.next_id = FIRST_FREE_ID
+        self.page_ids = []
+        self.images = {}
+
+    def _object(self, obj_id, body, stream=None):
+        self.offsets[obj_id] = self.position
+        chunk = b"%d 0 obj\n%s\n" % (obj_id, body)
+        if stream is not None:
+            chunk += b"stream\n" + stream + b"\nendstream\n"
+        chunk += b"endobj\n"
+        self.position += len(chunk)
+        return chunk
+
+    def _new_id(self):
+        obj_id = self.next_id
+        self.next_id += 1
+        return obj_id
+
+    def begin(self):
+        header = b"%PDF-1.4\n%\xe2\xe3\xcf\xd3\n"
+        self.position = len(header)
+        return header + b"".join(self._object(i, body) for i, body in FONT_OBJECTS)
+
+    def image(self, key, png_bytes):
+        """Register an image once per document; returns (name, width, height, bytes_to_send)."""
+        if key in self.images:
+            name, width, height = self.images[key]
+            return name, width, height, b""
+        width, height, header, data = png_to_xobject(png_bytes)
+        obj_id = self._new_id()
+        name = f"Im{obj_id}"
+        self.images[key] = (name, width, height)
+        return name, width, height, self._object(obj_id, header, data)
+
+    def page(self, page):
+        content = zlib.compress(page.content(), 6)
+        content_id, page_id = self._new_id(), self._new_id()
+        self.page_ids.append(page_id)
+        xobjects = b""
+        if page.images:
+            xobjects = b" /XObject << " + b" ".join(
+                b"/%s %d 0 R" % (name.encode(), int(name[2:])) for name in page.images) + b" >>"
+        page_body = (b"<< /Type /Page /Parent 2 0 R /MediaBox [0 0 %.2f %.2f] "
+                     b"/Resources << %s%s >> /Contents %d 0 R >>") % (
+            PAGE_WIDTH, PAGE_HEIGHT, RESOURCE_FONTS, xobjects, content_id)
+        return (self._object(content_id, b"<< /Length %d /Filter /FlateDecode >>" % len(content), content)
+                + self._object(page_id, page_body))
+
+    def finish(self):
+        kids = b" ".join(b"%d 0 R" % i for i in self.page_ids)
+        out = self._object(2, b"<< /Type /Pages /Kids [%s] /Count %d >>" % (kids, len(self.page_ids)))
+        out += self._object(1, b"<< /Type /Catalog /Pages 2 0 R >>")
+        xref_at = self.position
+        size = self.next_id
+        xref = [b"xref\n0 %d\n" % size, b"0000000000 65535 f \n"]
+        for obj_id in range(1, size):
+            xref.append(b"%010d 00000 n \n" % self.offsets.get(obj_id, 0))
+        out += b"".join(xref)
+        out += b"trailer\n<< /Size %d /Root 1 0 R >>\nstartxref\n%d\n%%%%EOF\n" % (size, xref_at)
+        return out
+
+
+# ---------------------------
+# Report generation
+# ---------------------------
+def image_key(png_bytes):
+    return hashlib.sha1(png_bytes).hexdigest()
+
+
+def generate_report(sections, title, subtitle):
+    """Yield the PDF chunk by chunk.
+
+    `sections` is an iterable of callables; each receives a `Layout` and adds
+    its rows. Every section starts on a new page and is flushed when done.
+    """
+    pdf = StreamingPDF()
+    yield pdf.begin()
+    first = True
+    for section in sections:
+        layout = Layout(pdf)
+        if first:
+            layout.page.raw(title_block(title), 14 * K)
+            layout.page.text(subtitle, size=10, line_mm=10)
+            layout.page.gap(5)
+            first = False
+        section(layout)
+        yield layout.flush()
+    if first:
+        # no sections: still emit a valid one-page document
+        layout = Layout(pdf)
+        layout.page.raw(title_block(title), 14 * K)
+        yield layout.flush()
+    yield pdf.finish()
+
+
+class Layout:
+    """Adds rows to the current page, starting new pages as needed."""
+
+    def __init__(self, pdf):
+        self.pdf = pdf
+        self.page = Page()
+        self._pending = []
+
+    def _ensure(self, height):
+        if not self.page.fits(height):
+            self._pending.append(self.pdf.page(self.page))
+            self.page = Page()
+
+    def heading(self, text, size=12):
+        self._ensure(10 * K)
+        self.page.text(text, size=size, bold=True, line_mm=10)
+
+    def row(self, text, size=11):
+        self._ensure(8 * K)
+        self.page.text(text, size=size, line_mm=8)
+
+    def paragraph(self, text, size=11, indent=2 * K):
+        for line in wrap_text(text, size, CONTENT_WIDTH - indent):
+            self._ensure(8 * K)
+            self.page.text(line, size=size, line_mm=8, indent=indent)
+
+    def gap(self, mm=5):
+        self.page.gap(mm)
+
+    def image(self, png_bytes, width_mm=180):
+        name, width_px, height_px, data = self.pdf.image(image_key(png_bytes), png_bytes)
+        if data:
+            self._pending.append(data)
+        self._ensure(width_mm * K * height_px / width_px)
+        self.page.images[name] = True
+        self.page.image(name, width_px, height_px, width_mm)
+
+    def flush(self):
+        self._pending.append(self.pdf.page(self.page))
+        out, self._pending = b"".join(self._pending), []
+        return out
@@ -0,0 +1,146 @@
+"""
+serialization.py
+
+Response serialization fast path for server.py:
+
+- dumps() encodes with orjson when it is installed (numpy scalars/arrays
+  included), falling back to the standard json module
+- FastJSONProvider routes every jsonify() through dumps()
+- Prepared holds a payload serialized once (crop lists, ideal ranges,
+  endpoint catalogue) together with its compressed variants, so serving it
+  is a dictionary lookup; members()/merge() splice such pre-serialized
+  fragments into bodies that also carry a few per-request fields
+- compress_response() negotiates brotli (if installed) or gzip for
+  compressible bodies above COMPRESS_MIN_BYTES; a strong ETag becomes weak
+  on the compressed variant
+"""
+
+import gzip
+import json
+import os
+
+from flask.json.provider import DefaultJSONProvider
+
+try:
+    import orjson
+    ORJSON_OPTIONS = orjson.OPT_SERIALIZE_NUMPY | orjson.OPT_NON_STR_KEYS
+except ImportError:
+    orjson = None
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+COMPRESS_MIN_BYTES = int(os.environ.get("COMPRESS_MIN_BYTES", "1024"))
+GZIP_LEVEL = 6
+BROTLI_QUALITY = 5
+COMPRESSIBLE_TYPES = ("application/json", "text/", "image/svg+xml")
+ENCODINGS = ["br", "gzip"] if brotli is not None else ["gzip"]
+
+
+# ---------------------------
+# Encoding
+# ---------------------------
+def _default(obj):
+    if hasattr(obj, "tolist"):  # numpy scalars/arrays without orjson
+        return obj.tolist()
+    raise TypeError(f"Object of type {type(obj).__name__} is not JSON serializable")
+
+
+def dumps(obj):
+    """Compact UTF-8 JSON bytes."""
+    if orjson is not None:
+        try:
+            return orjson.dumps(obj, option=ORJSON_OPTIONS)
+        except TypeError:
+            pass  # types orjson doesn't know (e.g. Decimal): let json's default handle them
+    return json.dumps(obj, separators=(",", ":"), ensure_ascii=False, default=_default).encode()
+
+
+def members(obj):
+    """A dict's serialized members without the braces, for splicing with merge()."""
+    return dumps(obj)[1:-1]
+
+
+def merge(*fragments):
+    """Join member fragments into one JSON object body."""
+    return b"{" + b",".join(f for f in fragments if f) + b"}"
+
+
+class FastJSONProvider(DefaultJSONProvider):
+    """jsonify() through dumps(); debug mode keeps Flask's indented output."""
+
+    sort_keys = False
+
+    def dumps(self, obj, **kwargs):
+        if kwargs:
+            return super().dumps(obj, **kwargs)
+        return dumps(obj).decode()
+
+    def response(self, *args, **kwargs):
+        if (self.compact is None and self._app.debug) or self.compact is False:
+            return super().response(*args, **kwargs)
+        obj = self._prepare_response_obj(args, kwargs)
+        return self._app.response_class(dumps(obj) + b"\n", mimetype=self.mimetype)
+
+
+# ---------------------------
+# Pre-serialized payloads
+# ---------------------------
+def compress(data, encoding):
+    if encoding == "br":
+        return brotli.compress(data, quality=BROTLI_QUALITY)
+    return gzip.compress(data, compresslevel=GZIP_LEVEL, mtime=0)
+
+
+class Prepared:
+    """A body serialized once; compressed variants are built on first request and kept."""
+
+    __slots__ = ("body", "_variants")
+
+    def __init__(self, obj):
+        self.body = obj if isinstance(obj, bytes) else dumps(obj) + b"\n"
+        self._variants = {}
+
+    def encoded(self, encoding):
+        data = self._variants.get(encoding)
+        if data is None:
+            data = self._variants[encoding] = compress(self.body, encoding)
+        return data
+
+
+def json_response(response_class, payload, status=200):
+    """Response for a Prepared payload or raw JSON bytes."""
+    if isinstance(payload, Prepared):
+        response = response_class(payload.body, status=status, mimetype="application/json")
+        response.prepared = payload
+        return response
+    return response_class(payload + b"\n", status=status, mimetype="application/json")
+
+
+# ---------------------------
+# Content negotiation
+# ---------------------------
+def compress_response(response, accept_encodings):
+    """Compress a buffered response in place if the client accepts it and it is worth it."""
+    if (response.direct_passthrough or response.is_streamed
+            or "Content-Encoding" in response.headers
+            or not (response.mimetype or "").startswith(COMPRESSIBLE_TYPES)):
+        return response
+    response.vary.add("Accept-Encoding")
+    prepared = getattr(response, "prepared", None)
+    size = len(prepared.body) if prepared is not None else response.content_length
+    if size is None or size < COMPRESS_MIN_BYTES or response.status_code < 200 or response.status_code in (204, 304):
+        return response
+    encoding = accept_encodings.best_match(ENCODINGS)
+    if encoding is None:
+        return response
+    data = prepared.encoded(encoding) if prepared is not None else compress(response.get_data(), encoding)
+    response.set_data(data)
+    response.headers["Content-Encoding"] = encoding
+    etag, weak = response.get_etag()
+    if etag and not weak:
+        # the compressed bytes differ from the identity body the strong tag names
+        response.set_etag(etag, weak=True)
+    return response
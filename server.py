@@ -1,85 +1,395 @@
-from flask import Flask, request, jsonify, send_file
+from flask import Flask, Request, Response, g, request, jsonify, stream_with_context
 from flask_cors import CORS
+import cProfile
 import joblib
-import traceback
+import logging
+import pstats
 import os
+import re
+import uuid
 import numpy as np
 import matplotlib
 matplotlib.use('Agg')
 import matplotlib.pyplot as plt
 import io
 import base64
-from fpdf import FPDF
-from datetime import datetime
+import gzip
+import json
+import math
+import time
+from datetime import datetime, timezone
+from functools import lru_cache
+from crop_registry import BASE_PROFILE, LOW, HIGH, get_registry
+from calibration import calibrate, load_calibration, load_thresholds
+from model_config import CONFIDENCE_THRESHOLD, FEATURE_NAMES, Z_THRESHOLD, model_features
+from neighbours import load_index, nearest_samples
+from localization import compile_catalog, negotiate_language
+from report_engine import generate_report
+from reading_log import ReadingLog
+from ingest_log import IngestLog
+from exporter import EXPORT_FORMATS, export_stream, formats_available
+from metrics import Metrics
+from structured_log import request_id, setup_logging
+from dedup import MISMATCH, PENDING, DedupIndex, SharedDedupIndex, fingerprint
+from rate_limit import ConcurrencyLimit, MemoryBackend, RateLimiter, SharedBackend, SharedConcurrencyLimit
+import shared_model
+from inference_server import InferenceClient
+from serialization import FastJSONProvider, Prepared, compress_response, json_response, members, merge
+
+setup_logging()
+log = logging.getLogger("crop_server")
 
 app = Flask(__name__)
 CORS(app)
 
 # =========================================================
-# CONFIGURATION
+# RESPONSE SERIALIZATION (see serialization.py)
+# =========================================================
+app.json = FastJSONProvider(app)
+
+# registered first so it runs last, after every other hook has set the body
+@app.after_request
+def compress_body(response):
+    return compress_response(response, request.accept_encodings)
+
+# =========================================================
+# METRICS (aggregated across gunicorn workers, see metrics.py)
+# =========================================================
+STAGE_SECONDS = "stage_duration_seconds"
+
+metrics = Metrics()
+metrics.counter("http_requests_total", "HTTP requests by endpoint, method and status", ["endpoint", "method", "status"])
+metrics.counter("http_request_errors_total", "HTTP requests answered with a 5xx status", ["endpoint"])
+metrics.histogram("http_request_duration_seconds", "Time to build the response (streamed bodies excluded)", ["endpoint"])
+metrics.histogram(STAGE_SECONDS, "Time spent in request sub-stages", ["stage"])
+
+class TimedRequest(Request):
+    def get_json(self, *args, **kwargs):
+        # Later calls return Flask's cached parse; only the first one does any work
+        if self._cached_json != (Ellipsis, Ellipsis):
+            return super().get_json(*args, **kwargs)
+        with metrics.timer(STAGE_SECONDS, ("json_parse",)):
+            return super().get_json(*args, **kwargs)
+
+app.request_class = TimedRequest
+
+@app.before_request
+def start_request_timer():
+    g.request_start = time.perf_counter()
+    g.request_id = request.headers.get("X-Request-ID") or uuid.uuid4().hex
+    request_id.set(g.request_id)
+
+@app.after_request
+def record_request_metrics(response):
+    elapsed = time.perf_counter() - g.get("request_start", time.perf_counter())
+    endpoint = request.url_rule.rule if request.url_rule is not None else "unmatched"
+    metrics.inc("http_requests_total", (endpoint, request.method, str(response.status_code)))
+    if response.status_code >= 500:
+        metrics.inc("http_request_errors_total", (endpoint,))
+    metrics.observe("http_request_duration_seconds", elapsed, (endpoint,))
+    response.headers["X-Request-ID"] = g.get("request_id", "")
+    return response
+
+@app.teardown_request
+def clear_request_id(exc):
+    request_id.set(None)
+
 # =========================================================
-FEATURE_NAMES = ["N", "P", "K", "moisture", "temperature", "pH"]
-Z_THRESHOLD = 3.0
-CONFIDENCE_THRESHOLD = 0.60
+# ADMISSION CONTROL (rate limits + concurrency caps, see rate_limit.py)
+# =========================================================
+# RATE_LIMIT_BACKEND=shared makes limits hold across gunicorn workers; a rate or cap of 0 disables it
+RATE_LIMIT_BACKEND = os.environ.get("RATE_LIMIT_BACKEND", "memory")
+DEVICE_RATE = float(os.environ.get("DEVICE_RATE", "2"))
+DEVICE_BURST = float(os.environ.get("DEVICE_BURST", "20"))
+GLOBAL_UPLOAD_RATE = float(os.environ.get("GLOBAL_UPLOAD_RATE", "200"))
+GLOBAL_UPLOAD_BURST = float(os.environ.get("GLOBAL_UPLOAD_BURST", "400"))
+CHART_CONCURRENCY = int(os.environ.get("CHART_CONCURRENCY", "4"))
+REPORT_CONCURRENCY = int(os.environ.get("REPORT_CONCURRENCY", "2"))
+UPLOAD_ENDPOINTS = {"/sensor-data", "/sensor-data/batch"}
+
+metrics.counter("http_rejected_total", "Requests refused by admission control", ["endpoint", "reason"])
 
-PHYSICAL_LIMITS = {
-    "N": (0, 200), "P": (0, 200), "K": (0, 300),
-    "moisture": (0, 100), "temperature": (-10, 60), "pH": (3.0, 10.0)
+def concurrency_limit(name, limit):
+    if limit <= 0:
+        return None
+    if RATE_LIMIT_BACKEND == "shared":
+        return SharedConcurrencyLimit(name, limit)
+    return ConcurrencyLimit(limit)
+
+rate_backend = SharedBackend() if RATE_LIMIT_BACKEND == "shared" else MemoryBackend()
+device_limiter = RateLimiter(rate_backend, DEVICE_RATE, DEVICE_BURST, "device:") if DEVICE_RATE > 0 else None
+upload_limiter = RateLimiter(rate_backend, GLOBAL_UPLOAD_RATE, GLOBAL_UPLOAD_BURST, "global:") if GLOBAL_UPLOAD_RATE > 0 else None
+chart_cap = concurrency_limit("chart", CHART_CONCURRENCY)
+endpoint_caps = {
+    "/chart/npk": chart_cap,
+    "/chart/soil": chart_cap,
+    "/report/pdf": concurrency_limit("report", REPORT_CONCURRENCY),
 }
 
+def upload_device_key():
+    """Header or query first so most checks skip the body; /sensor-data bodies carry device_id"""
+    device = request.headers.get("X-Device-Id") or request.args.get("device_id")
+    if not device and request.path == "/sensor-data" and request.is_json:
+        data = request.get_json(silent=True)
+        if isinstance(data, dict):
+            device = data.get("device_id")
+    return str(device) if device else f"ip:{request.remote_addr}"
+
+def reject(endpoint, reason, status, retry_after, message):
+    metrics.inc("http_rejected_total", (endpoint, reason))
+    log.warning("Request rejected", extra={"sample": True, "fields": {"endpoint": endpoint, "reason": reason}})
+    response = jsonify({"status": "error", "message": message})
+    response.status_code = status
+    response.headers["Retry-After"] = str(max(1, math.ceil(retry_after)))
+    return response
+
+@app.before_request
+def admit_request():
+    endpoint = request.url_rule.rule if request.url_rule is not None else None
+    if endpoint in UPLOAD_ENDPOINTS:
+        if device_limiter is not None:
+            wait = device_limiter.check(upload_device_key())
+            if wait:
+                return reject(endpoint, "device_rate", 429, wait, "Too many uploads from this device")
+        if upload_limiter is not None:
+            wait = upload_limiter.check("uploads")
+            if wait:
+                return reject(endpoint, "global_rate", 429, wait, "Server is receiving too many uploads")
+    cap = endpoint_caps.get(endpoint)
+    if cap is not None:
+        token = cap.acquire()
+        if token is None:
+            return reject(endpoint, "concurrency", 503, 1, "Server busy, try again shortly")
+        g.admission_slot = (cap, token)
+
+@app.teardown_request
+def release_admission_slot(exc):
+    # streamed bodies (PDF) keep their slot until the stream is closed
+    slot = g.pop("admission_slot", None)
+    if slot is not None:
+        slot[0].release(slot[1])
+
 # =========================================================
-# IDEAL RANGES FOR ALL CROPS
-# =========================================================
-IDEAL_RANGES = {
-    "maize": {
-        "N": {"min": 60, "max": 100},
-        "P": {"min": 35, "max": 60},
-        "K": {"min": 15, "max": 25},
-        "pH": {"min": 5.5, "max": 7.0},
-        "moisture": {"min": 55, "max": 75},
-        "temperature": {"min": 18, "max": 26}
-    },
-    "beans": {
-        "N": {"min": 0, "max": 40},
-        "P": {"min": 55, "max": 80},
-        "K": {"min": 15, "max": 25},
-        "pH": {"min": 5.5, "max": 6.0},
-        "moisture": {"min": 18, "max": 25},
-        "temperature": {"min": 15, "max": 25}
-    },
-    "cowpeas": {
-        "N": {"min": 0, "max": 40},
-        "P": {"min": 35, "max": 60},
-        "K": {"min": 15, "max": 25},
-        "pH": {"min": 6.2, "max": 7.2},
-        "moisture": {"min": 80, "max": 90},
-        "temperature": {"min": 27, "max": 30}
-    },
-    "groundnuts": {
-        "N": {"min": 0, "max": 40},
-        "P": {"min": 35, "max": 60},
-        "K": {"min": 15, "max": 25},
-        "pH": {"min": 3.5, "max": 9.9},
-        "moisture": {"min": 40, "max": 65},
-        "temperature": {"min": 24, "max": 32}
-    },
-    "mango": {
-        "N": {"min": 0, "max": 40},
-        "P": {"min": 15, "max": 40},
-        "K": {"min": 25, "max": 35},
-        "pH": {"min": 4.5, "max": 7.0},
-        "moisture": {"min": 45, "max": 55},
-        "temperature": {"min": 27, "max": 36}
-    },
-    "watermelon": {
-        "N": {"min": 80, "max": 120},
-        "P": {"min": 5, "max": 30},
-        "K": {"min": 45, "max": 55},
-        "pH": {"min": 6.0, "max": 7.0},
-        "moisture": {"min": 80, "max": 90},
-        "temperature": {"min": 24, "max": 27}
-    }
+# IDEMPOTENT UPLOADS (see dedup.py)
+# =========================================================
+# Retries carrying the same Idempotency-Key header (or device_id + seq/timestamp in a
+# /sensor-data body) get the original response without running inference again; a key
+# reused with a different body is refused with 422 rather than answered from the cache.
+# DEDUP_BACKEND=shared lets a retry that lands on another gunicorn worker hit too
+DEDUP_BACKEND = os.environ.get("DEDUP_BACKEND", "memory")
+dedup_index = SharedDedupIndex() if DEDUP_BACKEND == "shared" else DedupIndex()
+
+metrics.counter("http_deduplicated_total", "Retried uploads answered from the idempotency index", ["endpoint"])
+
+def idempotency_key(endpoint):
+    """(namespaced key, derived) from the header, else from a /sensor-data body; None if neither"""
+    key = request.headers.get("Idempotency-Key")
+    if key:
+        return f"{endpoint}|{key}", False
+    if endpoint == "/sensor-data" and request.is_json:
+        data = request.get_json(silent=True)
+        if isinstance(data, dict) and data.get("device_id") is not None:
+            sequence = data.get("seq", data.get("timestamp"))
+            if sequence is not None:
+                return f"{endpoint}|{data['device_id']}:{sequence}", True
+    return None
+
+def body_fingerprint():
+    body = request.get_data()
+    if request.headers.get("Content-Encoding", "").lower() == "gzip":
+        try:
+            body = gzip.decompress(body)  # gzip headers carry a timestamp, so a resent batch differs
+        except (OSError, EOFError):
+            pass
+    return fingerprint(body)
+
+@app.before_request
+def replay_duplicate():
+    endpoint = request.url_rule.rule if request.url_rule is not None else None
+    if endpoint not in UPLOAD_ENDPOINTS:
+        return
+    found = idempotency_key(endpoint)
+    if found is None:
+        return
+    key, derived = found
+    body_hash = body_fingerprint()
+    cached = dedup_index.reserve(key, body_hash)
+    if cached is None:
+        g.idempotency_key = (key, derived, body_hash)
+        return
+    if cached is MISMATCH:
+        return jsonify({"status": "error", "message": "Idempotency key was already used for a different request"}), 422
+    metrics.inc("http_deduplicated_total", (endpoint,))
+    if cached is PENDING:
+        response = jsonify({"status": "error", "message": "A request with this idempotency key is still being processed"})
+        response.status_code = 409
+        response.headers["Retry-After"] = "1"
+        return response
+    status, body = cached
+    response = app.response_class(body, status=status, mimetype="application/json")
+    response.headers["Idempotent-Replayed"] = "true"
+    return response
+
+@app.after_request
+def remember_response(response):
+    # runs before compress_body, so the identity body is what gets cached
+    reserved = g.pop("idempotency_key", None)
+    if reserved is not None:
+        key, derived, body_hash = reserved
+        status = response.status_code
+        # 5xx may succeed on retry; a 4xx under a key derived from the reading is not worth
+        # pinning, the client's next attempt is a corrected reading
+        cacheable = status < 400 or (status < 500 and not derived)
+        if cacheable and not response.is_streamed:
+            dedup_index.complete(key, status, response.get_data(), body_hash)
+        else:
+            dedup_index.release(key)
+    return response
+
+@app.teardown_request
+def release_idempotency_key(exc):
+    # the request failed before a response was built
+    reserved = g.pop("idempotency_key", None)
+    if reserved is not None:
+        dedup_index.release(reserved[0])
+
+# =========================================================
+# PROFILING (opt-in: PROFILE_REQUESTS=1, then send "X-Profile: 1" or ?profile=1)
+# =========================================================
+PROFILE_REQUESTS = os.environ.get("PROFILE_REQUESTS") == "1"
+PROFILE_DIR = os.environ.get("PROFILE_DIR", os.path.join("data", "profiles"))
+PROFILE_TOP = 25
+
+@app.before_request
+def start_profile():
+    if not PROFILE_REQUESTS:
+        return
+    mode = request.headers.get("X-Profile") or request.args.get("profile")
+    if not mode:
+        return
+    if mode == "pyinstrument":
+        try:
+            from pyinstrument import Profiler
+            g.profiler = Profiler()
+            g.profiler.start()
+            g.profile_mode = mode
+            return
+        except ImportError:
+            log.warning("pyinstrument not installed, using cProfile")
+            mode = "cprofile"
+    g.profiler = cProfile.Profile()
+    g.profile_mode = mode
+    g.profiler.enable()
+
+@app.after_request
+def finish_profile(response):
+    """Save the request's profile (streamed bodies are not included); "X-Profile: text" returns it inline"""
+    profiler = g.pop("profiler", None)
+    if profiler is None:
+        return response
+    os.makedirs(PROFILE_DIR, exist_ok=True)
+    endpoint = request.url_rule.rule if request.url_rule is not None else "unmatched"
+    # the request id may come from the client's X-Request-ID: keep it to a plain file name
+    name = re.sub(r"[^A-Za-z0-9_-]", "", g.request_id)[:64] or uuid.uuid4().hex
+    if g.profile_mode == "pyinstrument":
+        profiler.stop()
+        path = os.path.join(PROFILE_DIR, f"{name}.html")
+        with open(path, "w") as f:
+            f.write(profiler.output_html())
+        summary = profiler.output_text()
+    else:
+        profiler.disable()
+        path = os.path.join(PROFILE_DIR, f"{name}.prof")
+        profiler.dump_stats(path)
+        buf = io.StringIO()
+        pstats.Stats(profiler, stream=buf).sort_stats("cumulative").print_stats(PROFILE_TOP)
+        summary = buf.getvalue()
+    log.info("Request profile", extra={"fields": {"endpoint": endpoint, "profile_file": path}})
+    if g.profile_mode == "text":
+        response = Response(summary, mimetype="text/plain", status=response.status_code)
+    response.headers["X-Profile-File"] = path
+    return response
+
+# =========================================================
+# CONFIGURATION
+# =========================================================
+# FEATURE_NAMES, Z_THRESHOLD and CONFIDENCE_THRESHOLD live in model_config.py (shared with the lite exporter)
+# The forest was trained on feature_order.pkl's column order: validation works on FEATURE_NAMES
+# arrays, and MODEL_COLUMNS reorders them for predict_proba
+MODEL_FEATURES = model_features()
+MODEL_COLUMNS = [FEATURE_NAMES.index(f) for f in MODEL_FEATURES]
+NEIGHBOUR_K = 5
+
+# Crop knowledge and limits come from crop_registry.json
+registry = get_registry().compile()
+DEFAULT_CROP = registry.default_crop
+RANGE_FEATURES = ["N", "P", "K", "pH", "moisture", "temperature"]
+PHYSICAL_LIMITS = registry.physical_limits
+
+# =========================================================
+# IDEAL RANGES FOR ALL CROPS (base + region/season profiles)
+# =========================================================
+IDEAL_RANGES = registry.ideal_ranges(RANGE_FEATURES)
+PROFILE_RANGES = {key: profile.ideal_ranges(RANGE_FEATURES) for key, profile in registry.profiles.items()}
+
+def crop_ranges(crop, profile_key=BASE_PROFILE):
+    """Ideal ranges for a crop under a resolved profile, falling back to the default crop"""
+    ranges = PROFILE_RANGES[profile_key]
+    return ranges.get(crop, ranges[DEFAULT_CROP])
+
+# Device metadata (region, optional fixed season) selects the profile per request
+DEVICE_METADATA_PATH = os.environ.get("DEVICE_METADATA", "device_metadata.json")
+device_metadata = {}
+try:
+    with open(DEVICE_METADATA_PATH, "r") as f:
+        device_metadata = json.load(f)
+    log.info("Device metadata loaded", extra={"fields": {"devices": len(device_metadata)}})
+except FileNotFoundError:
+    pass
+except Exception as e:
+    log.error("Error loading device metadata: %s", e)
+
+def request_profile(data=None):
+    """Resolved profile key from explicit region/season, else the requesting device's metadata.
+
+    A request that names no device gets the season (or default) profile, never the
+    profile of whichever device uploaded last.
+    """
+    data = data or {}
+    device = scalar_text(data.get("device_id")) or request.args.get("device_id") or request.headers.get("X-Device-Id")
+    meta = device_metadata.get(device, {})
+    region = scalar_text(data.get("region")) or request.args.get("region") or meta.get("region")
+    season = (scalar_text(data.get("season")) or request.args.get("season") or meta.get("season")
+              or registry.season_for(datetime.now().month))
+    return registry.profile_key(region, season)
+
+def scalar_text(value):
+    """A JSON string or number as text (metadata keys are strings); lists, objects and booleans are ignored"""
+    if isinstance(value, bool) or not isinstance(value, (str, int, float)):
+        return None
+    return str(value)
+
+def profile_info(profile_key):
+    region, season = profile_key
+    return {"region": region, "season": season}
+
+# Reference payloads only change with the registry, so they are serialized once
+CROPS_PAYLOAD = Prepared({"status": "success", "crops": list(IDEAL_RANGES.keys())})
+IDEAL_RANGES_PAYLOADS = {
+    (crop, key): Prepared({"status": "success", "crop": crop, "ranges": crop_ranges(crop, key),
+                           "profile": profile_info(key)})
+    for key in PROFILE_RANGES for crop in IDEAL_RANGES
 }
+DASHBOARD_RANGES = {(crop, key): members({"ideal_ranges": crop_ranges(crop, key)})
+                    for key in PROFILE_RANGES for crop in IDEAL_RANGES}
+
+# HTTP validators: ETags from the registry fingerprint, Last-Modified from its file
+CACHE_CONTROL_CROPS = os.environ.get("CACHE_CONTROL_CROPS", "public, max-age=3600")
+CACHE_CONTROL_RANGES = os.environ.get("CACHE_CONTROL_RANGES", "public, max-age=300")
+REGISTRY_MODIFIED = datetime.fromtimestamp(int(registry.modified), timezone.utc)
+CROPS_ETAG = f"{registry.fingerprint}-crops"
+IDEAL_RANGES_ETAGS = {(crop, key): f"{registry.fingerprint}-{crop}-{key[0] or '_'}-{key[1] or '_'}"
+                      for crop, key in IDEAL_RANGES_PAYLOADS}
 
 # =========================================================
 # FERTILIZER RECOMMENDATIONS (No emojis)
@@ -106,23 +416,53 @@ FERTILIZER_ADVICE = {
     "moisture_optimal": "Moisture level is optimal. Maintain current irrigation."
 }
 
+# =========================================================
+# LOCALIZATION (server strings join translations.py)
+# =========================================================
+REPORT_TEXT = {
+    "report_title": "Crop Recommendation Report",
+    "report_generated": "Generated",
+    "report_recommended_crop": "Recommended Crop",
+    "report_sensor_data": "Sensor Data:",
+    "report_ideal_ranges": "Ideal Ranges:",
+    "report_recommendations": "Recommendations:",
+}
+
+catalog = compile_catalog({"en": {
+    **{f"advice_{key}": text for key, text in FERTILIZER_ADVICE.items()},
+    **REPORT_TEXT,
+}})
+
+def request_language():
+    return negotiate_language(request.args.get("lang"), request.headers.get("Accept-Language"))
+
 # =========================================================
 # LOAD MODEL + ENCODER
 # =========================================================
+# MODEL_SERVING=shared maps one copy of the forest for all workers (see shared_model.py);
+# INFERENCE_SOCKET sends scoring to inference_server.py, with the local model as fallback
+MODEL_SERVING = os.environ.get("MODEL_SERVING", "local")
+INFERENCE_SOCKET = os.environ.get("INFERENCE_SOCKET")
 model = None
 le = None
 model_loaded = False
 
 try:
     if os.path.exists("crop_recommendation_model.pkl") and os.path.exists("label_encoder.pkl"):
-        model = joblib.load("crop_recommendation_model.pkl")
+        if MODEL_SERVING == "shared":
+            model = shared_model.attach("crop_recommendation_model.pkl")
+        else:
+            model = joblib.load("crop_recommendation_model.pkl")
         le = joblib.load("label_encoder.pkl")
         model_loaded = True
-        print("Model loaded successfully")
+        log.info("Model loaded successfully", extra={"fields": {
+            "serving": MODEL_SERVING, "version": getattr(model, "version", None)}})
+        if INFERENCE_SOCKET:
+            model = InferenceClient(model, INFERENCE_SOCKET)
     else:
-        print("Model files not found")
+        log.warning("Model files not found")
 except Exception as e:
-    print("Model loading failed:", e)
+    log.error("Model loading failed: %s", e)
 
 # =========================================================
 # LOAD FEATURE STATS
@@ -134,29 +474,67 @@ try:
     if os.path.exists("feature_means.pkl") and os.path.exists("feature_stds.pkl"):
         feature_means = joblib.load("feature_means.pkl")
         feature_stds = joblib.load("feature_stds.pkl")
-        print("Feature statistics loaded")
+        log.info("Feature statistics loaded")
     else:
-        print("Feature stats not found")
+        log.warning("Feature stats not found")
+except Exception as e:
+    log.error("Failed to load feature stats: %s", e)
+
+# =========================================================
+# LOAD CONFIDENCE CALIBRATION + PER-CROP THRESHOLDS
+# =========================================================
+calibration_table = None
+crop_thresholds = {}
+
+try:
+    calibration_table = load_calibration()
+    log.info("Confidence calibration loaded" if calibration_table is not None else "Confidence calibration not found")
+    CONFIDENCE_THRESHOLD, crop_thresholds = load_thresholds(CONFIDENCE_THRESHOLD)
 except Exception as e:
-    print("Failed to load feature stats:", e)
+    log.error("Failed to load confidence calibration: %s", e)
+
+# =========================================================
+# LOAD NEAREST-NEIGHBOUR FALLBACK INDEX
+# =========================================================
+neighbour_index = None
+
+try:
+    neighbour_index = load_index()
+    log.info("Neighbour index loaded" if neighbour_index is not None else "Neighbour index not found")
+except Exception as e:
+    log.error("Failed to load neighbour index: %s", e)
 
 # =========================================================
 # MEMORY STORAGE
 # =========================================================
 latest_sensor_data = {}
+latest_device_id = None
 latest_recommendation = None
 latest_confidence = None
 
+# Every accepted reading is also kept on disk for /export
+reading_log = ReadingLog()
+
+# ...and made durable in the ingestion log before it is acknowledged; the latest
+# reading is restored from it after a restart (see ingest_log.py)
+ingest_log = IngestLog()
+try:
+    last_reading = ingest_log.last_record()
+    if last_reading is not None:
+        latest_sensor_data = last_reading["sensor_data"]
+        latest_device_id = last_reading["device_id"]
+        latest_recommendation = last_reading["recommended_crop"]
+        latest_confidence = last_reading["confidence"]
+        log.info("Latest reading restored from ingestion log", extra={"fields": {
+            "timestamp": last_reading["timestamp"], "device_id": latest_device_id}})
+except Exception as e:
+    log.error("Failed to restore from ingestion log: %s", e)
+
 # =========================================================
 # VALIDATION FUNCTIONS
 # =========================================================
 def within_physical_limits(sensor_values):
-    for key, (min_val, max_val) in PHYSICAL_LIMITS.items():
-        if key not in sensor_values:
-            return False
-        if not (min_val <= sensor_values[key] <= max_val):
-            return False
-    return True
+    return registry.within_limits(sensor_values, PHYSICAL_LIMITS)
 
 def within_zscore(sensor_values):
     if feature_means is None or feature_stds is None:
@@ -168,25 +546,128 @@ def within_zscore(sensor_values):
     except:
         return False
 
+def reading_matrix(readings):
+    """(n, FEATURE_NAMES) float matrix; missing or non-numeric values become NaN"""
+    X = np.full((len(readings), len(FEATURE_NAMES)), np.nan)
+    for i, values in enumerate(readings):
+        for j, f in enumerate(FEATURE_NAMES):
+            try:
+                X[i, j] = float(values[f])
+            except (KeyError, TypeError, ValueError):
+                pass
+    return X
+
+# =========================================================
+# RECOMMENDATION
+# =========================================================
+def assess_readings(readings):
+    """Recommend a crop for each validated reading dict.
+
+    Readings that pass both checks are scored in one predict_proba call.
+    Each result has recommended_crop and confidence, plus the
+    nearest-neighbour fallback for unusual readings.
+    """
+    with metrics.timer(STAGE_SECONDS, ("validation",)):
+        X = reading_matrix(readings)
+        plausible = registry.within_limits_batch(X, FEATURE_NAMES, PHYSICAL_LIMITS)
+        if feature_means is not None and feature_stds is not None:
+            usual = np.all(np.abs((X - feature_means) / feature_stds) <= Z_THRESHOLD, axis=1)
+        else:
+            usual = np.zeros(len(readings), dtype=bool)
+    
+    results = []
+    to_score = []
+    for i, values in enumerate(readings):
+        if not plausible[i]:
+            results.append({"recommended_crop": "No crop recommended (physically impossible values)", "confidence": None})
+        elif not usual[i]:
+            result = {"recommended_crop": "No crop recommended (unusual values)", "confidence": None}
+            if neighbour_index is not None:
+                suggested, samples = nearest_samples(neighbour_index, values, NEIGHBOUR_K)
+                result.update(suggested_crop=suggested, nearest_samples=samples)
+            results.append(result)
+        elif model_loaded:
+            results.append(None)
+            to_score.append(i)
+        else:
+            results.append({"recommended_crop": "Model unavailable", "confidence": None})
+
+    if to_score:
+        with metrics.timer(STAGE_SECONDS, ("inference",)):
+            probabilities = model.predict_proba(X[to_score][:, MODEL_COLUMNS])
+            best = np.argmax(probabilities, axis=1)
+            crops = le.inverse_transform(model.classes_[best])
+            confidences = calibrate(probabilities[np.arange(len(best)), best], calibration_table)
+        for i, crop, confidence in zip(to_score, crops, confidences):
+            confidence = float(confidence)
+            if confidence < crop_thresholds.get(crop, CONFIDENCE_THRESHOLD):
+                crop = "No crop recommended (low confidence)"
+            results[i] = {"recommended_crop": str(crop), "confidence": round(confidence, 2)}
+    return results
+
+# =========================================================
+# FERTILIZER PLANNING
+# =========================================================
+PLAN_FEATURES = ["N", "P", "K", "pH", "moisture"]
+PLAN_DEFAULTS = {"N": 0, "P": 0, "K": 0, "pH": 6.5, "moisture": 50}
+STATUS_SUFFIX = {LOW: "low", HIGH: "high"}
+
+def build_fertilizer_plan(sensor, crop, lang="en", profile_key=BASE_PROFILE):
+    """Fertilizer/irrigation advice for one reading against a crop's ideal ranges"""
+    profile = registry.profile(profile_key)
+    values = np.array([[float(sensor.get(f, PLAN_DEFAULTS[f])) for f in PLAN_FEATURES]])
+    crop_ids = profile.crop_ids([crop], default=DEFAULT_CROP)
+    codes, gaps = profile.status(crop_ids, values, PLAN_FEATURES)
+    
+    plan = []
+    for feature, code, gap in zip(PLAN_FEATURES, codes[0], gaps[0]):
+        key = f"{feature}_{STATUS_SUFFIX.get(code, 'optimal')}"
+        # NPK shortfalls and pH in either direction are quantified; moisture is not
+        if (code == LOW and feature != "moisture") or (code == HIGH and feature == "pH"):
+            plan.append(catalog.advice(lang, key, gap))
+        else:
+            plan.append(catalog.advice(lang, key))
+    return plan
+
 # =========================================================
 # ENDPOINT: GET IDEAL RANGES FOR A CROP
 # =========================================================
+def reference_response(payload, etag, cache_control, last_modified=REGISTRY_MODIFIED):
+    """Prepared payload with validators, or a bodiless 304 if the client's copy is current
+
+    Pass last_modified=None when the payload can change without the registry file
+    (region/season profiles); only the ETag then validates.
+    """
+    if request.if_none_match:
+        current = request.if_none_match.contains_weak(etag)
+    else:
+        since = request.if_modified_since
+        current = last_modified is not None and since is not None and last_modified <= since
+    if current:
+        response = app.response_class(status=304, mimetype="application/json")
+    else:
+        response = json_response(app.response_class, payload)
+    response.set_etag(etag)
+    if last_modified is not None:
+        response.last_modified = last_modified
+    response.headers["Cache-Control"] = cache_control
+    return response
+
 @app.route("/ideal-ranges/<crop>", methods=["GET"])
 def get_ideal_ranges(crop):
-    """Get ideal soil ranges for a specific crop"""
+    """Get ideal soil ranges for a specific crop (region/season aware)"""
     crop = crop.lower()
-    if crop in IDEAL_RANGES:
-        return jsonify({
-            "status": "success",
-            "crop": crop,
-            "ranges": IDEAL_RANGES[crop]
-        })
-    else:
-        return jsonify({
-            "status": "success",
-            "crop": "maize",
-            "ranges": IDEAL_RANGES["maize"]
-        })
+    if crop not in IDEAL_RANGES:
+        crop = DEFAULT_CROP
+    profile = request_profile()
+    key = (crop, profile)
+    # the file mtime doesn't change when the caller's profile does, so IMS only holds for the base ranges
+    last_modified = REGISTRY_MODIFIED if profile == BASE_PROFILE else None
+    response = reference_response(IDEAL_RANGES_PAYLOADS[key], IDEAL_RANGES_ETAGS[key], CACHE_CONTROL_RANGES,
+                                  last_modified)
+    # the profile can come from the device header
+    response.vary.add("X-Device-Id")
+    return response
 
 # =========================================================
 # ENDPOINT: GET ALL CROPS
@@ -194,10 +675,7 @@ def get_ideal_ranges(crop):
 @app.route("/crops", methods=["GET"])
 def get_crops():
     """Get list of all supported crops"""
-    return jsonify({
-        "status": "success",
-        "crops": list(IDEAL_RANGES.keys())
-    })
+    return reference_response(CROPS_PAYLOAD, CROPS_ETAG, CACHE_CONTROL_CROPS)
 
 # =========================================================
 # ENDPOINT: GENERATE FERTILIZER PLAN
@@ -207,66 +685,117 @@ def fertilizer_plan():
     """Generate fertilizer plan based on sensor data and crop"""
     try:
         data = request.get_json(force=True)
-        crop = data.get("crop", "maize").lower()
+        crop = data.get("crop", DEFAULT_CROP).lower()
         sensor = data.get("sensor_data", latest_sensor_data)
         
         if not sensor:
             return jsonify({"status": "error", "message": "No sensor data provided"}), 400
         
-        ranges = IDEAL_RANGES.get(crop, IDEAL_RANGES["maize"])
-        plan = []
-        
-        # Check NPK
-        for nutrient in ["N", "P", "K"]:
-            current = sensor.get(nutrient, 0)
-            ideal_min = ranges[nutrient]["min"]
-            ideal_max = ranges[nutrient]["max"]
-            
-            if current < ideal_min:
-                deficit = ideal_min - current
-                plan.append(FERTILIZER_ADVICE[f"{nutrient}_low"].format(deficit))
-            elif current > ideal_max:
-                plan.append(FERTILIZER_ADVICE[f"{nutrient}_high"])
-            else:
-                plan.append(FERTILIZER_ADVICE[f"{nutrient}_optimal"])
-        
-        # Check pH
-        current_ph = sensor.get("pH", 6.5)
-        ph_min = ranges["pH"]["min"]
-        ph_max = ranges["pH"]["max"]
-        
-        if current_ph < ph_min:
-            diff = ph_min - current_ph
-            plan.append(FERTILIZER_ADVICE["pH_low"].format(diff))
-        elif current_ph > ph_max:
-            diff = current_ph - ph_max
-            plan.append(FERTILIZER_ADVICE["pH_high"].format(diff))
-        else:
-            plan.append(FERTILIZER_ADVICE["pH_optimal"])
-        
-        # Check moisture
-        current_moisture = sensor.get("moisture", 50)
-        moisture_min = ranges["moisture"]["min"]
-        moisture_max = ranges["moisture"]["max"]
-        
-        if current_moisture < moisture_min:
-            plan.append(FERTILIZER_ADVICE["moisture_low"])
-        elif current_moisture > moisture_max:
-            plan.append(FERTILIZER_ADVICE["moisture_high"])
-        else:
-            plan.append(FERTILIZER_ADVICE["moisture_optimal"])
+        lang = request_language()
+        profile_key = request_profile(data)
+        plan = build_fertilizer_plan(sensor, crop, lang, profile_key)
         
         return jsonify({
             "status": "success",
             "crop": crop,
+            "crop_name": catalog.text(lang, crop),
+            "language": lang,
+            "profile": profile_info(profile_key),
             "plan": plan
         })
         
     except Exception as e:
-        print("Error generating fertilizer plan:", e)
-        traceback.print_exc()
+        log.exception("Error generating fertilizer plan")
         return jsonify({"status": "error", "message": str(e)}), 500
 
+# =========================================================
+# CHART RENDERING (cached, shared with PDF reports)
+# =========================================================
+CHART_CACHE_SIZE = 128
+
+def chart_key(sensor, features):
+    return tuple(float(sensor.get(f, 0)) for f in features)
+
+@lru_cache(maxsize=CHART_CACHE_SIZE)
+@metrics.timed(STAGE_SECONDS, ("chart_render",))
+def render_npk_chart(values, crop, profile_key=BASE_PROFILE):
+    """PNG bytes of the NPK chart for (N, P, K) values and a crop"""
+    fig, (ax1, ax2) = plt.subplots(1, 2, figsize=(10, 4))
+    
+    values = list(values)
+    nutrients = ["N", "P", "K"]
+    colors = ["#4CAF50", "#FFC107", "#2196F3"]
+    
+    ax1.pie(values, labels=nutrients, autopct="%1.1f%%",
+            startangle=90, colors=colors)
+    ax1.set_title("Current NPK Distribution")
+    
+    ranges = crop_ranges(crop, profile_key)
+    x_pos = np.arange(len(nutrients))
+    width = 0.35
+    
+    ax2.bar(x_pos, values, width, color='orange', label='Current')
+    
+    for i, nutrient in enumerate(nutrients):
+        min_val = ranges[nutrient]["min"]
+        max_val = ranges[nutrient]["max"]
+        ax2.bar(i + width, max_val - min_val, width, 
+               bottom=min_val, color='green', alpha=0.3, label='Ideal Range' if i == 0 else "")
+    
+    ax2.set_xticks(x_pos + width/2)
+    ax2.set_xticklabels(nutrients)
+    ax2.set_ylabel("Value")
+    ax2.set_title(f"Ideal Ranges for {crop.title()}")
+    ax2.legend()
+    ax2.grid(True, alpha=0.3)
+    
+    plt.tight_layout()
+    
+    buf = io.BytesIO()
+    fig.savefig(buf, format='png', dpi=100)
+    plt.close(fig)
+    return buf.getvalue()
+
+@lru_cache(maxsize=CHART_CACHE_SIZE)
+@metrics.timed(STAGE_SECONDS, ("chart_render",))
+def render_soil_chart(current_values, crop, profile_key=BASE_PROFILE):
+    """PNG bytes of the moisture/pH/temperature chart for a crop"""
+    fig, ax = plt.subplots(figsize=(8, 5))
+    
+    categories = ['moisture', 'pH', 'temperature']
+    display_names = ['Moisture', 'pH', 'Temperature']
+    current_values = list(current_values)
+    x_pos = np.arange(len(categories))
+    width = 0.35
+    
+    bars = ax.bar(x_pos, current_values, width, color='#FF5722', label='Current')
+    
+    ranges = crop_ranges(crop, profile_key)
+    for i, (cat, display) in enumerate(zip(categories, display_names)):
+        key = 'pH' if cat == 'pH' else cat
+        min_val = ranges[key]["min"]
+        max_val = ranges[key]["max"]
+        
+        ax.bar(i + width, max_val - min_val, width, 
+               bottom=min_val, color='green', alpha=0.3, label='Ideal Range' if i == 0 else "")
+        
+        ax.plot([i + width/2, i + width/2], [min_val, max_val], 
+               color='darkgreen', linewidth=2)
+    
+    ax.set_xticks(x_pos + width/2)
+    ax.set_xticklabels(display_names)
+    ax.set_ylabel("Value")
+    ax.set_title(f"Soil Parameters vs Ideal for {crop.title()}")
+    ax.legend()
+    ax.grid(True, alpha=0.3)
+    
+    plt.tight_layout()
+    
+    buf = io.BytesIO()
+    fig.savefig(buf, format='png', dpi=100)
+    plt.close(fig)
+    return buf.getvalue()
+
 # =========================================================
 # ENDPOINT: GENERATE NPK CHART
 # =========================================================
@@ -276,56 +805,20 @@ def generate_npk_chart():
     try:
         data = request.get_json(force=True)
         sensor = data.get("sensor_data", latest_sensor_data)
-        crop = data.get("crop", "maize")
+        crop = data.get("crop", DEFAULT_CROP)
         
         if not sensor:
             return jsonify({"status": "error", "message": "No sensor data"}), 400
         
-        fig, (ax1, ax2) = plt.subplots(1, 2, figsize=(10, 4))
-        
-        values = [sensor.get("N", 0), sensor.get("P", 0), sensor.get("K", 0)]
-        nutrients = ["N", "P", "K"]
-        colors = ["#4CAF50", "#FFC107", "#2196F3"]
-        
-        ax1.pie(values, labels=nutrients, autopct="%1.1f%%",
-                startangle=90, colors=colors)
-        ax1.set_title("Current NPK Distribution")
-        
-        ranges = IDEAL_RANGES.get(crop, IDEAL_RANGES["maize"])
-        x_pos = np.arange(len(nutrients))
-        width = 0.35
-        
-        ax2.bar(x_pos, values, width, color='orange', label='Current')
-        
-        for i, nutrient in enumerate(nutrients):
-            min_val = ranges[nutrient]["min"]
-            max_val = ranges[nutrient]["max"]
-            ax2.bar(i + width, max_val - min_val, width, 
-                   bottom=min_val, color='green', alpha=0.3, label='Ideal Range' if i == 0 else "")
-        
-        ax2.set_xticks(x_pos + width/2)
-        ax2.set_xticklabels(nutrients)
-        ax2.set_ylabel("Value")
-        ax2.set_title(f"Ideal Ranges for {crop.title()}")
-        ax2.legend()
-        ax2.grid(True, alpha=0.3)
-        
-        plt.tight_layout()
-        
-        buf = io.BytesIO()
-        fig.savefig(buf, format='png', dpi=100)
-        buf.seek(0)
-        img_base64 = base64.b64encode(buf.read()).decode()
-        plt.close(fig)
+        png = render_npk_chart(chart_key(sensor, ["N", "P", "K"]), crop, request_profile(data))
         
         return jsonify({
             "status": "success",
-            "image": img_base64
+            "image": base64.b64encode(png).decode()
         })
         
     except Exception as e:
-        print("Error generating NPK chart:", e)
-        traceback.print_exc()
+        log.exception("Error generating NPK chart")
         return jsonify({"status": "error", "message": str(e)}), 500
 
 # =========================================================
@@ -337,172 +830,102 @@ def generate_soil_chart():
     try:
         data = request.get_json(force=True)
         sensor = data.get("sensor_data", latest_sensor_data)
-        crop = data.get("crop", "maize")
+        crop = data.get("crop", DEFAULT_CROP)
         
         if not sensor:
             return jsonify({"status": "error", "message": "No sensor data"}), 400
         
-        fig, ax = plt.subplots(figsize=(8, 5))
-        
-        categories = ['moisture', 'pH', 'temperature']
-        display_names = ['Moisture', 'pH', 'Temperature']
-        current_values = [sensor.get(c, 0) for c in categories]
-        x_pos = np.arange(len(categories))
-        width = 0.35
-        
-        bars = ax.bar(x_pos, current_values, width, color='#FF5722', label='Current')
-        
-        ranges = IDEAL_RANGES.get(crop, IDEAL_RANGES["maize"])
-        for i, (cat, display) in enumerate(zip(categories, display_names)):
-            key = 'pH' if cat == 'pH' else cat
-            min_val = ranges[key]["min"]
-            max_val = ranges[key]["max"]
-            
-            ax.bar(i + width, max_val - min_val, width, 
-                   bottom=min_val, color='green', alpha=0.3, label='Ideal Range' if i == 0 else "")
-            
-            ax.plot([i + width/2, i + width/2], [min_val, max_val], 
-                   color='darkgreen', linewidth=2)
-        
-        ax.set_xticks(x_pos + width/2)
-        ax.set_xticklabels(display_names)
-        ax.set_ylabel("Value")
-        ax.set_title(f"Soil Parameters vs Ideal for {crop.title()}")
-        ax.legend()
-        ax.grid(True, alpha=0.3)
-        
-        plt.tight_layout()
-        
-        buf = io.BytesIO()
-        fig.savefig(buf, format='png', dpi=100)
-        buf.seek(0)
-        img_base64 = base64.b64encode(buf.read()).decode()
-        plt.close(fig)
+        png = render_soil_chart(chart_key(sensor, ["moisture", "pH", "temperature"]), crop, request_profile(data))
         
         return jsonify({
             "status": "success",
-            "image": img_base64
+            "image": base64.b64encode(png).decode()
         })
         
     except Exception as e:
-        print("Error generating soil chart:", e)
-        traceback.print_exc()
+        log.exception("Error generating soil chart")
         return jsonify({"status": "error", "message": str(e)}), 500
 
 # =========================================================
 # ENDPOINT: GENERATE PDF REPORT
 # =========================================================
-@app.route("/report/pdf", methods=["POST"])
-def generate_pdf_report():
-    """Generate PDF report with all data"""
-    try:
-        data = request.get_json(force=True)
-        sensor = data.get("sensor_data", latest_sensor_data)
-        crop = data.get("crop", latest_recommendation or "maize").lower()
-        
-        if not sensor:
-            return jsonify({"status": "error", "message": "No sensor data"}), 400
-        
-        ranges = IDEAL_RANGES.get(crop, IDEAL_RANGES["maize"])
-        plan = []
-        
-        # Generate fertilizer plan directly
-        for nutrient in ["N", "P", "K"]:
-            current = sensor.get(nutrient, 0)
-            ideal_min = ranges[nutrient]["min"]
-            ideal_max = ranges[nutrient]["max"]
-            
-            if current < ideal_min:
-                deficit = ideal_min - current
-                plan.append(f"{nutrient} is low. Add {deficit:.1f} kg/ha fertilizer.")
-            elif current > ideal_max:
-                plan.append(f"{nutrient} is high. Reduce application.")
-            else:
-                plan.append(f"{nutrient} level is optimal.")
-        
-        # Check pH
-        current_ph = sensor.get("pH", 6.5)
-        ph_min = ranges["pH"]["min"]
-        ph_max = ranges["pH"]["max"]
-        
-        if current_ph < ph_min:
-            diff = ph_min - current_ph
-            plan.append(f"Soil is acidic. Add {diff:.1f} tons/ha lime.")
-        elif current_ph > ph_max:
-            diff = current_ph - ph_max
-            plan.append(f"Soil is alkaline. Add sulfur or organic matter.")
-        else:
-            plan.append("pH level is optimal.")
-        
-        # Check moisture
-        current_moisture = sensor.get("moisture", 50)
-        moisture_min = ranges["moisture"]["min"]
-        moisture_max = ranges["moisture"]["max"]
-        
-        if current_moisture < moisture_min:
-            plan.append("Moisture is low. Increase irrigation.")
-        elif current_moisture > moisture_max:
-            plan.append("Moisture is high. Improve drainage.")
-        else:
-            plan.append("Moisture level is optimal.")
-        
-        pdf = FPDF()
-        pdf.add_page()
-        
-        # Title
-        pdf.set_font("Arial", 'B', 16)
-        pdf.cell(0, 10, "Crop Recommendation Report", ln=True, align='C')
-        pdf.ln(10)
-        
-        # Date
-        pdf.set_font("Arial", '', 10)
-        pdf.cell(0, 10, f"Generated: {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}", ln=True)
-        pdf.ln(5)
-        
-        # Crop
-        pdf.set_font("Arial", 'B', 14)
-        pdf.cell(0, 10, f"Recommended Crop: {crop.title()}", ln=True)
-        pdf.ln(5)
+def report_section(field, lang, include_charts, profile_key=BASE_PROFILE):
+    """Build the report_engine section callable for one field"""
+    sensor = field["sensor_data"]
+    crop = field["crop"]
+    ranges = crop_ranges(crop, profile_key)
+    
+    def section(layout):
+        if field.get("name"):
+            layout.heading(str(field["name"]), size=14)
+        layout.heading(f"{catalog.text(lang, 'report_recommended_crop')}: {catalog.text(lang, crop).title()}", size=14)
+        layout.gap()
         
-        # Sensor Data
-        pdf.set_font("Arial", 'B', 12)
-        pdf.cell(0, 10, "Sensor Data:", ln=True)
-        pdf.set_font("Arial", '', 11)
+        layout.heading(catalog.text(lang, "report_sensor_data"))
         for key, value in sensor.items():
             display_key = key.upper() if key in ['N', 'P', 'K'] else key.capitalize()
-            pdf.cell(0, 8, f"  {display_key}: {value:.2f}", ln=True)
-        pdf.ln(5)
+            layout.row(f"  {display_key}: {value:.2f}")
+        layout.gap()
         
-        # Ideal Ranges
-        pdf.set_font("Arial", 'B', 12)
-        pdf.cell(0, 10, "Ideal Ranges:", ln=True)
-        pdf.set_font("Arial", '', 11)
+        layout.heading(catalog.text(lang, "report_ideal_ranges"))
         for key, values in ranges.items():
             display_key = key.upper() if key in ['N', 'P', 'K'] else key.capitalize()
-            pdf.cell(0, 8, f"  {display_key}: {values['min']} - {values['max']}", ln=True)
-        pdf.ln(5)
+            layout.row(f"  {display_key}: {values['min']} - {values['max']}")
+        layout.gap()
         
-        # Recommendations
-        pdf.set_font("Arial", 'B', 12)
-        pdf.cell(0, 10, "Recommendations:", ln=True)
-        pdf.set_font("Arial", '', 11)
-        for item in plan:
-            pdf.multi_cell(0, 8, f"  • {item}")
+        layout.heading(catalog.text(lang, "report_recommendations"))
+        for item in build_fertilizer_plan(sensor, crop, lang, profile_key):
+            layout.paragraph(f"• {item}")
         
-        pdf_output = io.BytesIO()
-        pdf.output(pdf_output)
-        pdf_output.seek(0)
+        if include_charts:
+            layout.gap()
+            layout.image(render_npk_chart(chart_key(sensor, ["N", "P", "K"]), crop, profile_key))
+            layout.image(render_soil_chart(chart_key(sensor, ["moisture", "pH", "temperature"]), crop, profile_key), width_mm=140)
+    
+    return section
+
+@app.route("/report/pdf", methods=["POST"])
+def generate_pdf_report():
+    """Generate PDF report; pass "fields" for a multi-field (season) report streamed page by page"""
+    try:
+        data = request.get_json(force=True)
+        default_crop = data.get("crop", latest_recommendation or DEFAULT_CROP)
+        fields = data.get("fields")
+        if fields is None:
+            fields = [{"sensor_data": data.get("sensor_data", latest_sensor_data), "crop": default_crop}]
         
-        return send_file(
-            pdf_output,
+        # Validate everything up front: once streaming starts the 200 has been sent
+        for field in fields:
+            sensor = field.get("sensor_data")
+            if not sensor:
+                return jsonify({"status": "error", "message": "No sensor data"}), 400
+            for key in FEATURE_NAMES:
+                if key not in sensor:
+                    return jsonify({"status": "error", "message": f"Missing key: {key}"}), 400
+            try:
+                field["sensor_data"] = {key: float(sensor[key]) for key in FEATURE_NAMES}
+            except (TypeError, ValueError):
+                return jsonify({"status": "error", "message": "Sensor values must be numeric"}), 400
+            field["crop"] = field.get("crop", default_crop).lower()
+        
+        lang = request_language()
+        include_charts = bool(data.get("include_charts", False))
+        generated = f"{catalog.text(lang, 'report_generated')}: {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}"
+        # Section setup (profile and range lookup) is cheap; doing it here surfaces its errors as a 500
+        sections = [report_section(field, lang, include_charts, request_profile({**data, **field}))
+                    for field in fields]
+        
+        return Response(
+            stream_with_context(metrics.timed_iter(
+                generate_report(sections, catalog.text(lang, "report_title"), generated),
+                STAGE_SECONDS, ("pdf_build",))),
             mimetype='application/pdf',
-            as_attachment=True,
-            download_name=f"crop_report_{datetime.now().strftime('%Y%m%d_%H%M%S')}.pdf"
+            headers={"Content-Disposition":
+                     f"attachment; filename=crop_report_{datetime.now().strftime('%Y%m%d_%H%M%S')}.pdf"}
         )
         
     except Exception as e:
-        print("Error generating PDF:", e)
-        traceback.print_exc()
+        log.exception("Error generating PDF")
         return jsonify({"status": "error", "message": str(e)}), 500
 
 # =========================================================
@@ -511,26 +934,26 @@ def generate_pdf_report():
 @app.route("/dashboard", methods=["GET"])
 def get_dashboard():
     """Get all data for dashboard in one request"""
-    crop = latest_recommendation or "maize"
+    crop = latest_recommendation or DEFAULT_CROP
     if crop in ["No crop recommended", "No crop recommended (physically impossible values)", "No crop recommended (unusual values)", "No crop recommended (low confidence)"]:
-        crop = "maize"
+        crop = DEFAULT_CROP
+    # "Model unavailable", or a crop restored from the WAL that the registry no longer has
+    crop = crop if crop in IDEAL_RANGES else DEFAULT_CROP
     
-    return jsonify({
+    return json_response(app.response_class, merge(members({
         "status": "success",
         "sensor_data": latest_sensor_data,
         "recommended_crop": latest_recommendation,
         "confidence": latest_confidence,
-        "ideal_ranges": IDEAL_RANGES.get(crop, IDEAL_RANGES["maize"]),
         "model_loaded": model_loaded
-    })
+    }), DASHBOARD_RANGES[(crop, request_profile())]))
 
 # =========================================================
 # ENDPOINT: POST SENSOR DATA
 # =========================================================
 @app.route("/sensor-data", methods=["POST"])
 def sensor_data():
-    global latest_sensor_data, latest_recommendation, latest_confidence
-    latest_confidence = None
+    global latest_sensor_data, latest_device_id, latest_recommendation, latest_confidence
 
     try:
         data = request.get_json(force=True)
@@ -539,40 +962,160 @@ def sensor_data():
             if key not in data:
                 return jsonify({"status": "error", "message": f"Missing key: {key}"}), 400
 
-        latest_sensor_data = {key: float(data[key]) for key in FEATURE_NAMES}
-        print("Sensor data received:", latest_sensor_data)
+        sensor = {key: float(data[key]) for key in FEATURE_NAMES}
+        device_id = data.get("device_id")
+        log.debug("Sensor data received", extra={"sample": True, "fields": {
+            "sensor_data": sensor, "device_id": device_id}})
 
-        if not within_physical_limits(latest_sensor_data):
-            latest_recommendation = "No crop recommended (physically impossible values)"
-        elif not within_zscore(latest_sensor_data):
-            latest_recommendation = "No crop recommended (unusual values)"
-        elif model_loaded:
-            features = [latest_sensor_data[f] for f in FEATURE_NAMES]
-            prediction_index = model.predict([features])[0]
-            probabilities = model.predict_proba([features])[0]
-            confidence = float(np.max(probabilities))
-            latest_confidence = round(confidence, 2)
-
-            if confidence < CONFIDENCE_THRESHOLD:
-                latest_recommendation = "No crop recommended (low confidence)"
-            else:
-                latest_recommendation = le.inverse_transform([prediction_index])[0]
-        else:
-            latest_recommendation = "Model unavailable"
+        result = assess_readings([sensor])[0]
+        # durable before it becomes the latest reading or is acknowledged
+        now = time.time()
+        ingest_log.append([sensor], [device_id], [result["recommended_crop"]], [result["confidence"]], now)
+        reading_log.append([sensor], [device_id], [result["recommended_crop"]], [result["confidence"]], now)
+        latest_sensor_data, latest_device_id = sensor, device_id
+        latest_recommendation = result["recommended_crop"]
+        latest_confidence = result["confidence"]
+
+        return jsonify({
+            "status": "success",
+            "sensor_data": sensor,
+            "model_loaded": model_loaded,
+            **result
+        })
+
+    except Exception as e:
+        log.exception("Error processing sensor data")
+        return jsonify({"status": "error", "message": str(e)}), 500
+
+# =========================================================
+# ENDPOINT: POST QUEUED SENSOR DATA (BATCH)
+# =========================================================
+# Queued readings keep the client's recorded_at unless it is implausible (clock far ahead, or too old)
+MAX_CLOCK_SKEW = 300
+MAX_QUEUE_AGE = 365 * 86400
+
+def recorded_time(item, now):
+    value = item.get("recorded_at")
+    if isinstance(value, (int, float)) and not isinstance(value, bool) \
+            and now - MAX_QUEUE_AGE <= value <= now + MAX_CLOCK_SKEW:
+        return float(min(value, now))
+    return now
+
+@app.route("/sensor-data/batch", methods=["POST"])
+def sensor_data_batch():
+    """Accept a batch of readings queued by offline clients, optionally gzip-compressed"""
+    global latest_sensor_data, latest_device_id, latest_recommendation, latest_confidence
+
+    try:
+        with metrics.timer(STAGE_SECONDS, ("json_parse",)):
+            try:
+                body = request.get_data()
+                if request.headers.get("Content-Encoding", "").lower() == "gzip":
+                    body = gzip.decompress(body)
+                envelope = json.loads(body)
+            except (OSError, EOFError, ValueError):
+                return jsonify({"status": "error", "message": "Body must be JSON (optionally gzip-compressed)"}), 400
+        items = envelope.get("readings", []) if isinstance(envelope, dict) else None
+        if not isinstance(items, list):
+            return jsonify({"status": "error", "message": "Body must be an object with a \"readings\" list"}), 400
+
+        # Bad items are reported individually so one can't block a client's queue
+        results = []
+        valid = []
+        for item in items:
+            if not isinstance(item, dict):
+                results.append({"id": None, "status": "error", "message": "Reading must be an object"})
+                continue
+            missing = [key for key in FEATURE_NAMES if key not in item]
+            if missing:
+                results.append({"id": item.get("id"), "status": "error", "message": f"Missing key: {missing[0]}"})
+                continue
+            try:
+                values = {key: float(item[key]) for key in FEATURE_NAMES}
+            except (TypeError, ValueError):
+                results.append({"id": item.get("id"), "status": "error", "message": "Sensor values must be numeric"})
+                continue
+            results.append({"id": item.get("id"), "status": "success"})
+            valid.append((len(results) - 1, values))
+
+        readings = [values for _, values in valid]
+        for (i, _), result in zip(valid, assess_readings(readings)):
+            results[i].update(result)
+        columns = (readings, [items[i].get("device_id") for i, _ in valid],
+                   [results[i]["recommended_crop"] for i, _ in valid],
+                   [results[i]["confidence"] for i, _ in valid])
+        now = time.time()
+        timestamps = [recorded_time(items[i], now) for i, _ in valid]
+        ingest_log.append(*columns, timestamps)
+        reading_log.append(*columns, timestamps)
+        if readings:
+            latest_sensor_data = readings[-1]
+            latest_device_id = items[valid[-1][0]].get("device_id")
+            latest_recommendation = results[valid[-1][0]]["recommended_crop"]
+            latest_confidence = results[valid[-1][0]]["confidence"]
 
         return jsonify({
             "status": "success",
-            "sensor_data": latest_sensor_data,
-            "recommended_crop": latest_recommendation,
-            "confidence": latest_confidence,
+            "count": len(results),
+            "results": results,
             "model_loaded": model_loaded
         })
 
     except Exception as e:
-        print("Error:", e)
-        traceback.print_exc()
+        log.exception("Error processing batch")
         return jsonify({"status": "error", "message": str(e)}), 500
 
+# =========================================================
+# ENDPOINT: BULK EXPORT
+# =========================================================
+def parse_time(value):
+    """Epoch seconds or ISO-8601 (naive times are taken as UTC)"""
+    if value is None or value == "":
+        return None
+    try:
+        return float(value)
+    except ValueError:
+        parsed = datetime.fromisoformat(value)
+        if parsed.tzinfo is None:
+            parsed = parsed.replace(tzinfo=timezone.utc)
+        return parsed.timestamp()
+
+@app.route("/export", methods=["GET"])
+def export_readings():
+    """Stream retained readings, predictions and plan columns as CSV/Parquet/Arrow"""
+    try:
+        fmt = request.args.get("format", "csv").lower()
+        if fmt not in EXPORT_FORMATS:
+            return jsonify({"status": "error", "message": f"Unknown format: {fmt}"}), 400
+        if fmt not in formats_available():
+            return jsonify({"status": "error", "message": f"{fmt} export needs pyarrow installed"}), 400
+        
+        start = parse_time(request.args.get("start"))
+        end = parse_time(request.args.get("end"))
+        devices = request.args.getlist("device") or None
+        
+        chunks = reading_log.iter_chunks(start=start, end=end, devices=devices)
+        return Response(
+            stream_with_context(metrics.timed_iter(export_stream(fmt, chunks, registry), STAGE_SECONDS, ("export_build",))),
+            mimetype=EXPORT_FORMATS[fmt],
+            headers={"Content-Disposition":
+                     f"attachment; filename=readings_{datetime.now().strftime('%Y%m%d_%H%M%S')}.{fmt}"}
+        )
+        
+    except ValueError as e:
+        return jsonify({"status": "error", "message": f"Invalid time filter: {e}"}), 400
+    except Exception as e:
+        log.exception("Error exporting readings")
+        return jsonify({"status": "error", "message": str(e)}), 500
+
+# =========================================================
+# ENDPOINT: METRICS
+# =========================================================
+@app.route("/metrics", methods=["GET"])
+def get_metrics():
+    """Prometheus text exposition of request and stage metrics for all workers"""
+    return Response(metrics.render(), mimetype="text/plain; version=0.0.4")
+
 # =========================================================
 # ENDPOINT: GET LATEST RECOMMENDATION
 # =========================================================
@@ -591,30 +1134,36 @@ def recommend_crops():
 # =========================================================
 # ENDPOINT: HEALTH CHECK
 # =========================================================
+HOME_STATIC = members({
+    "name": "Crop Recommendation API",
+    "version": "2.0",
+    "supported_crops": list(IDEAL_RANGES.keys()),
+    "available_endpoints": [
+        "GET / - Health check",
+        "GET /crops - List all crops",
+        "GET /ideal-ranges/<crop> - Get ideal ranges",
+        "POST /sensor-data - Submit sensor data",
+        "POST /sensor-data/batch - Submit queued sensor data (gzip accepted)",
+        "GET /recommend-crops - Get recommendation",
+        "POST /fertilizer-plan - Get fertilizer plan",
+        "POST /chart/npk - Get NPK chart",
+        "POST /chart/soil - Get soil parameters chart",
+        "POST /report/pdf - Download PDF report",
+        "GET /dashboard - Get all data",
+        "GET /export - Export readings (csv/parquet/arrow, start/end/device filters)",
+        "GET /metrics - Request/stage metrics (Prometheus format)"
+    ]
+})
+
 @app.route("/", methods=["GET"])
 def home():
-    return jsonify({
+    return json_response(app.response_class, merge(members({
         "status": "online",
-        "name": "Crop Recommendation API",
-        "version": "2.0",
         "model_loaded": model_loaded,
         "feature_stats_loaded": feature_means is not None,
         "latest_recommendation": latest_recommendation,
-        "latest_confidence": latest_confidence,
-        "supported_crops": list(IDEAL_RANGES.keys()),
-        "available_endpoints": [
-            "GET / - Health check",
-            "GET /crops - List all crops",
-            "GET /ideal-ranges/<crop> - Get ideal ranges",
-            "POST /sensor-data - Submit sensor data",
-            "GET /recommend-crops - Get recommendation",
-            "POST /fertilizer-plan - Get fertilizer plan",
-            "POST /chart/npk - Get NPK chart",
-            "POST /chart/soil - Get soil parameters chart",
-            "POST /report/pdf - Download PDF report",
-            "GET /dashboard - Get all data"
-        ]
-    })
+        "latest_confidence": latest_confidence
+    }), HOME_STATIC))
 
 # =========================================================
 # RUN
@@ -0,0 +1,231 @@
+"""
+shared_model.py
+
+Shared-memory model serving for gunicorn (MODEL_SERVING=shared):
+
+- The fitted forest is flattened (same per-tree arrays as crop_model_lite.py)
+  into one segment file: a JSON header followed by 64-byte aligned node
+  arrays. Every worker maps the file read-only, so the forest lives once in
+  the page cache instead of once per worker
+- Segments are tagged with a version (hash of the model pickle) and named
+  <version>.bin; the CURRENT file names the one to serve. publish() writes a
+  new segment and swaps CURRENT atomically, and workers pick it up within
+  CHECK_INTERVAL seconds without a restart
+- SharedForest.predict_proba() walks all trees for a batch of readings at
+  once with numpy and returns what RandomForestClassifier.predict_proba would
+
+The gunicorn master publishes on startup (gunicorn.conf.py). To swap in a
+retrained model on a running server:
+
+    python shared_model.py publish [crop_recommendation_model.pkl]
+"""
+
+import argparse
+import hashlib
+import json
+import mmap
+import os
+import struct
+import sys
+import threading
+import time
+
+import numpy as np
+
+MODEL_FILE = "crop_recommendation_model.pkl"
+SHARED_MODEL_DIR = os.environ.get("SHARED_MODEL_DIR", os.path.join("data", "model"))
+CURRENT_FILE = "CURRENT"
+CHECK_INTERVAL = 5.0
+KEEP_VERSIONS = 2
+MAGIC = b"CRFOREST"
+ALIGN = 64
+
+_header_size = struct.Struct("<I")
+
+
+def model_version(path=MODEL_FILE):
+    with open(path, "rb") as f:
+        return hashlib.sha256(f.read()).hexdigest()[:16]
+
+
+# ---------------------------
+# Packing (master / publisher)
+# ---------------------------
+def pack_forest(model):
+    """Concatenate every tree's nodes into flat arrays; child links become global node ids."""
+    from crop_model_lite import export_forest
+
+    trees = export_forest(model)
+    roots, offset, depth = [], 0, 0
+    left, right, feature, threshold, proba = [], [], [], [], []
+    for tree_left, tree_right, tree_feature, tree_threshold, tree_proba in trees:
+        roots.append(offset)
+        tree_left = np.asarray(tree_left, dtype=np.int32)
+        tree_right = np.asarray(tree_right, dtype=np.int32)
+        left.append(np.where(tree_left == -1, -1, tree_left + offset))
+        right.append(np.where(tree_right == -1, -1, tree_right + offset))
+        feature.append(np.maximum(np.asarray(tree_feature, dtype=np.int32), 0))
+        threshold.append(np.asarray(tree_threshold, dtype=np.float64))
+        proba.append(np.asarray(tree_proba, dtype=np.float64))
+        depth = max(depth, model.estimators_[len(roots) - 1].tree_.max_depth)
+        offset += len(tree_left)
+    arrays = {
+        "roots": np.asarray(roots, dtype=np.int32),
+        "left": np.concatenate(left).astype(np.int32),
+        "right": np.concatenate(right).astype(np.int32),
+        "feature": np.concatenate(feature).astype(np.int32),
+        "threshold": np.concatenate(threshold),
+        "proba": np.concatenate(proba),
+    }
+    return arrays, depth
+
+
+def write_segment(model, version, directory=SHARED_MODEL_DIR):
+    arrays, depth = pack_forest(model)
+    layout, position = {}, 0
+    for name, array in arrays.items():
+        position = -(-position // ALIGN) * ALIGN
+        layout[name] = [array.dtype.str, list(array.shape), position]
+        position += array.nbytes
+    header = json.dumps({
+        "version": version,
+        "max_depth": int(depth),
+        "n_features": int(model.n_features_in_),
+        "classes": [int(c) for c in model.classes_],
+        "arrays": layout,
+    }).encode()
+    start = -(-(len(MAGIC) + _header_size.size + len(header)) // ALIGN) * ALIGN
+
+    os.makedirs(directory, exist_ok=True)
+    path = os.path.join(directory, f"{version}.bin")
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+    with open(tmp_path, "wb") as f:
+        f.write(MAGIC + _header_size.pack(len(header)) + header)
+        for name, array in arrays.items():
+            f.seek(start + layout[name][2])
+            f.write(np.ascontiguousarray(array).tobytes())
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp_path, path)
+    return path
+
+
+def publish(model_path=MODEL_FILE, directory=SHARED_MODEL_DIR):
+    """Write the model's segment if needed and make it current; returns the version."""
+    version = model_version(model_path)
+    path = os.path.join(directory, f"{version}.bin")
+    if not os.path.exists(path):
+        import joblib
+        write_segment(joblib.load(model_path), version, directory)
+    current = os.path.join(directory, CURRENT_FILE)
+    tmp_path = f"{current}.{os.getpid()}.tmp"
+    with open(tmp_path, "w") as f:
+        f.write(version)
+    os.replace(tmp_path, current)
+
+    # workers still serving an older segment keep their mapping after the unlink
+    segments = sorted((e for e in os.listdir(directory) if e.endswith(".bin")),
+                      key=lambda e: os.path.getmtime(os.path.join(directory, e)), reverse=True)
+    for entry in segments[KEEP_VERSIONS:]:
+        if entry != f"{version}.bin":
+            os.remove(os.path.join(directory, entry))
+    return version
+
+
+# ---------------------------
+# Serving (workers)
+# ---------------------------
+class SharedForest:
+    """Read-only forest over the current segment, a drop-in for the model's predict_proba()."""
+
+    def __init__(self, directory=SHARED_MODEL_DIR):
+        self.directory = directory
+        self._current = os.path.join(directory, CURRENT_FILE)
+        self._lock = threading.Lock()
+        self._checked = 0.0
+        self._stamp = None
+        self._state = None
+        self.version = None
+        self.refresh(force=True)
+
+    def _attach(self, version):
+        with open(os.path.join(self.directory, f"{version}.bin"), "rb") as f:
+            segment = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        if segment[:len(MAGIC)] != MAGIC:
+            raise ValueError(f"Not a shared model segment: {version}.bin")
+        size = _header_size.unpack_from(segment, len(MAGIC))[0]
+        header_end = len(MAGIC) + _header_size.size + size
+        header = json.loads(segment[len(MAGIC) + _header_size.size:header_end])
+        start = -(-header_end // ALIGN) * ALIGN
+        arrays = {}
+        for name, (dtype, shape, offset) in header["arrays"].items():
+            count = int(np.prod(shape))
+            arrays[name] = np.frombuffer(segment, dtype=dtype, count=count,
+                                         offset=start + offset).reshape(shape)
+        return header, arrays
+
+    def refresh(self, force=False):
+        """Re-read CURRENT (at most every CHECK_INTERVAL s) and attach a new version if it changed."""
+        now = time.monotonic()
+        if not force and now - self._checked < CHECK_INTERVAL:
+            return
+        with self._lock:
+            self._checked = now
+            stat = os.stat(self._current)
+            stamp = (stat.st_mtime_ns, stat.st_ino)
+            if stamp == self._stamp:
+                return
+            with open(self._current, "r") as f:
+                version = f.read().strip()
+            if version != self.version:
+                header, arrays = self._attach(version)
+                # one assignment, so concurrent predictions see either the old or the new model
+                self._state = (header["max_depth"], np.asarray(header["classes"]), arrays)
+                self.version = version
+            self._stamp = stamp
+
+    @property
+    def classes_(self):
+        return self._state[1]
+
+    def predict_proba(self, X):
+        self.refresh()
+        max_depth, classes, arrays = self._state
+        # sklearn compares float32 inputs against the float64 thresholds
+        X = np.asarray(X, dtype=np.float32)
+        left, right = arrays["left"], arrays["right"]
+        feature, threshold = arrays["feature"], arrays["threshold"]
+        rows = np.arange(len(X))[:, None]
+        node = np.repeat(arrays["roots"][None, :], len(X), axis=0)
+        for _ in range(max_depth):
+            children = left[node]
+            inner = children != -1
+            if not inner.any():
+                break
+            go_left = X[rows, feature[node]] <= threshold[node]
+            node = np.where(inner, np.where(go_left, children, right[node]), node)
+        return arrays["proba"][node].mean(axis=1)
+
+
+def attach(model_path=MODEL_FILE, directory=SHARED_MODEL_DIR):
+    """The current shared forest, publishing the model first if nothing has been (e.g. no gunicorn)."""
+    if not os.path.exists(os.path.join(directory, CURRENT_FILE)):
+        publish(model_path, directory)
+    return SharedForest(directory)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Manage the shared model segment")
+    commands = parser.add_subparsers(dest="command", required=True)
+    release = commands.add_parser("publish", help="Build the model's segment and make it current")
+    release.add_argument("model", nargs="?", default=MODEL_FILE)
+    release.add_argument("--dir", default=SHARED_MODEL_DIR)
+    args = parser.parse_args(argv)
+
+    version = publish(args.model, args.dir)
+    print(f"✅ Serving model version {version} from {args.dir}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
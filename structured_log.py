@@ -0,0 +1,148 @@
+"""
+structured_log.py
+
+Structured JSON logging that stays off the request path:
+
+- Handlers on the request thread only enqueue the record (never format or
+  write); a background QueueListener formats JSON lines and writes them
+- A full queue drops records and counts them instead of blocking
+- Records logged with extra={"sample": True} pass 1 in LOG_SAMPLE_EVERY
+  (per-reading debug logs)
+- ERROR records are rate limited per call site; suppressed counts are
+  reported on the next record that gets through
+- The current request id (a context variable set per request) is attached
+  to every record
+"""
+
+import atexit
+import contextvars
+import json
+import logging
+import logging.handlers
+import os
+import queue
+import sys
+import threading
+import time
+from datetime import datetime, timezone
+
+LOG_LEVEL = os.environ.get("LOG_LEVEL", "INFO").upper()
+LOG_SAMPLE_EVERY = int(os.environ.get("LOG_SAMPLE_EVERY", "100"))
+ERROR_BURST = 5
+ERROR_WINDOW = 60.0
+QUEUE_SIZE = 10000
+
+request_id = contextvars.ContextVar("request_id", default=None)
+
+_listener = None
+
+
+class JsonFormatter(logging.Formatter):
+    def format(self, record):
+        entry = {
+            "ts": datetime.fromtimestamp(record.created, timezone.utc).isoformat(timespec="milliseconds"),
+            "level": record.levelname,
+            "logger": record.name,
+            "msg": record.getMessage(),
+        }
+        if getattr(record, "request_id", None):
+            entry["request_id"] = record.request_id
+        fields = getattr(record, "fields", None)
+        if fields:
+            entry.update(fields)
+        if getattr(record, "suppressed", 0):
+            entry["suppressed"] = record.suppressed
+        if record.exc_info:
+            entry["exc"] = self.formatException(record.exc_info)
+        return json.dumps(entry, default=str)
+
+
+class ContextFilter(logging.Filter):
+    """Tags records with the request id, samples flagged records, rate limits errors."""
+
+    def __init__(self, sample_every=LOG_SAMPLE_EVERY, burst=ERROR_BURST, window=ERROR_WINDOW):
+        super().__init__()
+        self.sample_every = max(1, sample_every)
+        self.burst = burst
+        self.window = window
+        self._sampled = 0
+        self._errors = {}
+        self._lock = threading.Lock()
+
+    def filter(self, record):
+        record.request_id = request_id.get()
+        if getattr(record, "sample", False):
+            with self._lock:
+                self._sampled += 1
+                if self._sampled % self.sample_every:
+                    return False
+        if record.levelno >= logging.ERROR:
+            return self._allow_error(record)
+        return True
+
+    def _allow_error(self, record):
+        key = (record.pathname, record.lineno)
+        now = time.monotonic()
+        with self._lock:
+            start, count, suppressed = self._errors.get(key, (now, 0, 0))
+            if now - start >= self.window:
+                start, count = now, 0
+            if count >= self.burst:
+                self._errors[key] = (start, count, suppressed + 1)
+                return False
+            self._errors[key] = (start, count + 1, 0)
+        record.suppressed = suppressed
+        return True
+
+
+class NonBlockingQueueHandler(logging.handlers.QueueHandler):
+    def __init__(self, log_queue):
+        super().__init__(log_queue)
+        self.dropped = 0
+
+    def prepare(self, record):
+        # formatting (and traceback rendering) happens on the listener thread
+        return record
+
+    def enqueue(self, record):
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            self.dropped += 1
+
+
+def _start_listener(handler, stream):
+    global _listener
+    output = logging.StreamHandler(stream)
+    output.setFormatter(JsonFormatter())
+    _listener = logging.handlers.QueueListener(handler.queue, output, respect_handler_level=False)
+    _listener.start()
+
+
+def setup_logging(level=LOG_LEVEL, stream=None):
+    """Route the root logger through the background JSON writer; safe to call once per process."""
+    root = logging.getLogger()
+    if any(isinstance(h, NonBlockingQueueHandler) for h in root.handlers):
+        return
+    stream = stream or sys.stdout
+    handler = NonBlockingQueueHandler(queue.Queue(QUEUE_SIZE))
+    handler.addFilter(ContextFilter())
+    root.addHandler(handler)
+    root.setLevel(level)
+    _start_listener(handler, stream)
+    atexit.register(stop_logging)
+
+    def restart_in_child():
+        # gunicorn --preload forks after import: threads don't survive, so start a fresh writer
+        handler.queue = queue.Queue(QUEUE_SIZE)
+        _start_listener(handler, stream)
+
+    os.register_at_fork(after_in_child=restart_in_child)
+
+
+def stop_logging():
+    """Flush queued records (e.g. at exit or in tests)."""
+    global _listener
+    if _listener is not None:
+        _listener.stop()
+        _listener = None
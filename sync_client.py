@@ -0,0 +1,248 @@
+"""
+sync_client.py
+
+Offline-first sync for the Kivy apps (standard library only, runs on-device):
+
+- Persistent local queue of readings and their on-device results
+- Uploads the queue in gzip-compressed batches to server.py's
+  /sensor-data/batch whenever the server is reachable; each batch carries
+  an Idempotency-Key derived from its reading ids, so resending it is safe
+- A batch the server refuses (4xx) is parked in a separate file instead of
+  being resent forever; server errors (5xx, 429) back off exponentially,
+  honouring Retry-After
+- Local cache of /crops and /ideal-ranges/<crop> revalidated with
+  If-None-Match / If-Modified-Since, served from disk while offline
+"""
+
+import gzip
+import hashlib
+import json
+import os
+import threading
+import time
+import urllib.error
+import urllib.request
+import uuid
+
+SERVER_URL = os.environ.get("CROP_SERVER_URL", "http://raspberrypi.local:10000")
+QUEUE_FILE = "sync_queue.jsonl"
+CACHE_FILE = "sync_cache.json"
+REJECTED_FILE = "sync_rejected.jsonl"
+BATCH_SIZE = 200
+TIMEOUT = 10
+SYNC_INTERVAL = 60
+MAX_BACKOFF = 3600
+# worth retrying later as they are: rate limited, or the same batch still in flight
+RETRY_STATUSES = {408, 409, 429}
+
+
+class SyncClient:
+    def __init__(self, data_dir=".", server_url=SERVER_URL, batch_size=BATCH_SIZE, timeout=TIMEOUT):
+        self.server_url = server_url.rstrip("/")
+        self.batch_size = batch_size
+        self.timeout = timeout
+        self.queue_path = os.path.join(data_dir, QUEUE_FILE)
+        self.cache_path = os.path.join(data_dir, CACHE_FILE)
+        self.rejected_path = os.path.join(data_dir, REJECTED_FILE)
+        self.online = False
+        self._failures = 0
+        self._retry_at = 0.0
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread = None
+        self._cache = self._load_cache()
+
+    # ---------------------------
+    # Local queue
+    # ---------------------------
+    def enqueue(self, readings, result=None):
+        """Persist one reading (and the result computed on-device) for upload."""
+        item = dict(readings)
+        item["id"] = uuid.uuid4().hex
+        item["recorded_at"] = time.time()
+        if result is not None:
+            item["local_result"] = result
+        line = json.dumps(item, separators=(",", ":")) + "\n"
+        with self._lock:
+            with open(self.queue_path, "a") as f:
+                f.write(line)
+                f.flush()
+                os.fsync(f.fileno())
+        return item["id"]
+
+    def pending(self):
+        with self._lock:
+            return self._read_queue()
+
+    def _read_queue(self):
+        if not os.path.exists(self.queue_path):
+            return []
+        items = []
+        with open(self.queue_path, "r") as f:
+            for line in f:
+                line = line.strip()
+                if not line:
+                    continue
+                try:
+                    items.append(json.loads(line))
+                except ValueError:
+                    # torn write from a crash mid-append; drop it
+                    continue
+        return items
+
+    def _park_rejected(self, batch, status, message):
+        """Move a batch the server refused out of the queue, keeping it for inspection."""
+        with self._lock:
+            with open(self.rejected_path, "a") as f:
+                for item in batch:
+                    f.write(json.dumps({**item, "rejected": {"status": status, "message": message}},
+                                       separators=(",", ":")) + "\n")
+                f.flush()
+                os.fsync(f.fileno())
+        self._drop_uploaded({item["id"] for item in batch})
+
+    def _back_off(self, retry_after=None):
+        self._failures += 1
+        delay = min(MAX_BACKOFF, SYNC_INTERVAL * 2 ** (self._failures - 1))
+        try:
+            delay = max(delay, float(retry_after))
+        except (TypeError, ValueError):
+            pass
+        self._retry_at = time.time() + delay
+
+    def _drop_uploaded(self, ids):
+        """Rewrite the queue without the uploaded items (atomic replace)."""
+        with self._lock:
+            remaining = [item for item in self._read_queue() if item["id"] not in ids]
+            tmp_path = self.queue_path + ".tmp"
+            with open(tmp_path, "w") as f:
+                for item in remaining:
+                    f.write(json.dumps(item, separators=(",", ":")) + "\n")
+                f.flush()
+                os.fsync(f.fileno())
+            os.replace(tmp_path, self.queue_path)
+
+    def flush(self):
+        """Upload queued readings in compressed batches.
+
+        Returns the server results for everything uploaded; stops at the first
+        network or server failure and keeps the rest queued.
+        """
+        uploaded = []
+        if time.time() < self._retry_at:
+            return uploaded
+        items = self.pending()
+        for start in range(0, len(items), self.batch_size):
+            batch = items[start:start + self.batch_size]
+            body = gzip.compress(json.dumps({"readings": batch}, separators=(",", ":")).encode())
+            # a retried batch (response lost on a bad link) is answered without re-processing
+            batch_key = hashlib.sha256(",".join(item["id"] for item in batch).encode()).hexdigest()
+            try:
+                response = self._request("/sensor-data/batch", data=body, headers={
+                    "Content-Type": "application/json",
+                    "Content-Encoding": "gzip",
+                    "Idempotency-Key": batch_key,
+                })
+            except urllib.error.HTTPError as e:
+                # HTTPError is a URLError too, but the server was reached and answered
+                self.online = True
+                if e.code >= 500 or e.code in RETRY_STATUSES:
+                    self._back_off(e.headers.get("Retry-After"))
+                    break
+                self._park_rejected(batch, e.code, e.read().decode(errors="replace")[:500])
+                continue
+            except (urllib.error.URLError, OSError):
+                self.online = False
+                break
+            result = json.loads(response.read())
+            self._drop_uploaded({item["id"] for item in batch})
+            self._failures = 0
+            uploaded.extend(result.get("results", []))
+        return uploaded
+
+    # ---------------------------
+    # Reference data cache
+    # ---------------------------
+    def get_crops(self):
+        data = self._get_cached("/crops")
+        return data["crops"] if data else []
+
+    def get_ideal_ranges(self, crop):
+        data = self._get_cached(f"/ideal-ranges/{crop.lower()}")
+        return data["ranges"] if data else None
+
+    def _get_cached(self, path):
+        """Conditional GET; falls back to the cached body when offline."""
+        entry = self._cache.get(path)
+        headers = {"Accept-Encoding": "gzip"}
+        if entry:
+            if entry.get("etag"):
+                headers["If-None-Match"] = entry["etag"]
+            if entry.get("last_modified"):
+                headers["If-Modified-Since"] = entry["last_modified"]
+        try:
+            response = self._request(path, headers=headers)
+        except urllib.error.HTTPError as e:
+            if e.code == 304 and entry:
+                self.online = True
+                return entry["body"]
+            return entry["body"] if entry else None
+        except (urllib.error.URLError, OSError):
+            self.online = False
+            return entry["body"] if entry else None
+
+        raw = response.read()
+        if response.headers.get("Content-Encoding") == "gzip":
+            raw = gzip.decompress(raw)
+        body = json.loads(raw)
+        self._cache[path] = {
+            "etag": response.headers.get("ETag"),
+            "last_modified": response.headers.get("Last-Modified"),
+            "body": body,
+        }
+        self._save_cache()
+        return body
+
+    def _load_cache(self):
+        if not os.path.exists(self.cache_path):
+            return {}
+        try:
+            with open(self.cache_path, "r") as f:
+                return json.load(f)
+        except ValueError:
+            return {}
+
+    def _save_cache(self):
+        tmp_path = self.cache_path + ".tmp"
+        with open(tmp_path, "w") as f:
+            json.dump(self._cache, f)
+        os.replace(tmp_path, self.cache_path)
+
+    # ---------------------------
+    # Network + background sync
+    # ---------------------------
+    def _request(self, path, data=None, headers=None):
+        req = urllib.request.Request(self.server_url + path, data=data, headers=headers or {})
+        response = urllib.request.urlopen(req, timeout=self.timeout)
+        self.online = True
+        return response
+
+    def start(self, interval=SYNC_INTERVAL):
+        """Flush the queue periodically on a daemon thread."""
+        if self._thread is not None:
+            return
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, args=(interval,), daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        self._thread = None
+
+    def _run(self, interval):
+        while not self._stop.is_set():
+            try:
+                self.flush()
+            except Exception as e:
+                print("⚠️ Sync failed:", e)
+            self._stop.wait(interval)
@@ -0,0 +1,42 @@
+import json
+import os
+import tempfile
+
+import pytest
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Scratch data directories and fixtures, set before anything imports the registry or server
+SCRATCH = tempfile.mkdtemp(prefix="crop-tests-")
+for _name in ("METRICS_DIR", "READINGS_DIR", "RATE_LIMIT_DIR", "WAL_DIR", "DEDUP_DIR"):
+    os.environ[_name] = os.path.join(SCRATCH, _name.lower())
+os.environ.update({"LOG_LEVEL": "WARNING", "DEVICE_RATE": "0", "GLOBAL_UPLOAD_RATE": "0"})
+
+# The shipped registry plus a regional and a seasonal overlay, and a device in that region
+PROFILE_REGION = "kgalagadi"
+PROFILE_DEVICE = "kgalagadi-01"
+with open(os.path.join(ROOT, "crop_registry.json"), "r") as _f:
+    _registry = json.load(_f)
+_registry["profiles"] = [
+    {"region": PROFILE_REGION, "crops": {"maize": {"moisture": [40, 60], "N": [50, 90]}}},
+    {"region": PROFILE_REGION, "season": "dry", "crops": {"maize": {"moisture": [30, 50]}}},
+]
+os.environ["CROP_REGISTRY"] = os.path.join(SCRATCH, "crop_registry.json")
+with open(os.environ["CROP_REGISTRY"], "w") as _f:
+    json.dump(_registry, _f)
+os.environ["DEVICE_METADATA"] = os.path.join(SCRATCH, "device_metadata.json")
+with open(os.environ["DEVICE_METADATA"], "w") as _f:
+    json.dump({PROFILE_DEVICE: {"region": PROFILE_REGION}}, _f)
+
+
+@pytest.fixture(scope="session")
+def server():
+    """server.py imported against the scratch directories, with admission limits off."""
+    os.chdir(ROOT)  # model artifacts are loaded relative to the repo root
+    import server
+    return server
+
+
+@pytest.fixture
+def client(server):
+    return server.app.test_client()
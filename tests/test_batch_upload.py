@@ -0,0 +1,18 @@
+import pytest
+
+READING = {"N": 50, "P": 40, "K": 40, "moisture": 30, "temperature": 25, "pH": 6.5}
+
+
+@pytest.mark.parametrize("body", ["[1, 2]", '{"readings": {"a": 1}}', '"readings"', "not json"])
+def test_bad_envelope_is_a_400(client, body):
+    response = client.post("/sensor-data/batch", data=body, content_type="application/json")
+    assert response.status_code == 400
+    assert response.json["status"] == "error"
+
+
+def test_non_object_items_are_reported_individually(client):
+    readings = [{**READING, "id": "good"}, 7, "text", None, {"id": "partial", "N": 1}]
+    response = client.post("/sensor-data/batch", json={"readings": readings})
+    assert response.status_code == 200
+    statuses = [r["status"] for r in response.json["results"]]
+    assert statuses == ["success", "error", "error", "error", "error"]
@@ -0,0 +1,72 @@
+"""The rule table (scalar and vectorized) must agree with the original if/elif rules."""
+
+import itertools
+
+import numpy as np
+
+from crop_rules import RULES, RULE_FEATURES, rule_based_recommendation, rule_based_recommendation_batch
+
+
+def baseline_recommendation(N, P, K, temperature, rainfall):
+    # frozen copy of the if/elif chain the apps shipped before RULES existed; do not edit
+    if N > 60 and P > 40 and K > 30 and temperature > 25 and rainfall > 120:
+        return "Maize"
+    elif N < 40 and P > 50 and K > 20 and rainfall > 150:
+        return "Beans"
+    elif temperature > 30 and rainfall < 80:
+        return "Mango"
+    elif N < 30 and rainfall < 100:
+        return "Cowpeas"
+    elif N > 50 and P > 50 and K > 30 and rainfall > 200:
+        return "Watermelon"
+    else:
+        return "Groundnuts"
+
+
+def baseline(X):
+    return [baseline_recommendation(*row) for row in X.tolist()]
+
+
+def scalar(X):
+    return [rule_based_recommendation(*row) for row in X.tolist()]
+
+
+def assert_matches_baseline(X):
+    expected = baseline(X)
+    assert baseline(X) == expected
+    assert_matches_baseline(X)
+
+
+def test_random_readings_match_baseline():
+    rng = np.random.default_rng(0)
+    X = np.column_stack([rng.uniform(0, 150, 20000), rng.uniform(0, 150, 20000), rng.uniform(0, 150, 20000),
+                         rng.uniform(0, 45, 20000), rng.uniform(0, 300, 20000)])
+    assert_matches_baseline(X)
+
+
+def test_threshold_boundaries_match_baseline():
+    # every threshold, just below/above it, and a far value, crossed over all features
+    values = {f: set() for f in RULE_FEATURES}
+    for _, conditions in RULES:
+        for feature, _, threshold in conditions:
+            values[feature].update([threshold - 1e-9, threshold, threshold + 1e-9])
+    for feature in RULE_FEATURES:
+        values[feature].update([0.0, 1000.0])
+    X = np.array(list(itertools.product(*(sorted(values[f]) for f in RULE_FEATURES))))
+    assert_matches_baseline(X)
+
+
+def test_every_rule_and_the_default_are_reachable():
+    X = np.array([[70, 50, 40, 28, 130],   # Maize
+                  [30, 60, 25, 20, 160],   # Beans
+                  [70, 10, 10, 35, 50],    # Mango
+                  [20, 10, 10, 20, 90],    # Cowpeas
+                  [55, 55, 35, 20, 250],   # Watermelon
+                  [45, 10, 10, 20, 110]])  # default
+    expected = [crop for crop, _ in RULES] + ["Groundnuts"]
+    assert baseline(X) == expected
+    assert_matches_baseline(X)
+
+
+def test_scalar_inputs_broadcast():
+    assert rule_based_recommendation_batch(70, 50, 40, 28, [130, 100]).tolist() == ["Maize", "Groundnuts"]
@@ -0,0 +1,6 @@
+def test_dashboard_falls_back_to_default_crop_ranges(server, client, monkeypatch):
+    monkeypatch.setattr(server, "latest_recommendation", "Model unavailable")
+    response = client.get("/dashboard")
+    assert response.status_code == 200
+    assert response.json["ideal_ranges"] == server.crop_ranges(server.DEFAULT_CROP)
+    assert response.json["recommended_crop"] == "Model unavailable"
@@ -0,0 +1,43 @@
+import os
+
+import pytest
+
+import ingest_log
+from ingest_log import IngestLog
+
+READING = {"N": 50.0, "P": 40.0, "K": 40.0, "moisture": 30.0, "temperature": 25.0, "pH": 6.5}
+
+
+def test_non_string_device_ids_are_logged_as_text(tmp_path):
+    log = IngestLog(str(tmp_path), sync="off")
+    log.append([READING, READING], [42, None], ["maize", None], [0.9, None], timestamp=[1.0, 2.0])
+    records = list(log.replay())
+    assert [r["device_id"] for r in records] == ["42", None]
+    assert records[0]["sensor_data"] == READING
+
+
+def test_failed_write_does_not_hide_later_records(tmp_path, monkeypatch):
+    log = IngestLog(str(tmp_path), sync="off")
+    log.append([READING], ["a"], ["maize"], [0.9], timestamp=1.0)
+
+    real_write = os.write
+
+    def torn_write(fd, data):
+        real_write(fd, bytes(data[:10]))
+        raise OSError("disk full")
+
+    monkeypatch.setattr(ingest_log.os, "write", torn_write)
+    with pytest.raises(OSError):
+        log.append([READING], ["b"], ["maize"], [0.9], timestamp=2.0)
+    monkeypatch.setattr(ingest_log.os, "write", real_write)
+
+    log.append([READING], ["c"], ["maize"], [0.9], timestamp=3.0)
+    assert [r["device_id"] for r in log.replay()] == ["a", "c"]
+
+
+def test_numeric_device_id_uploads(client):
+    reading = {**READING, "device_id": 42}
+    assert client.post("/sensor-data", json=reading).status_code == 200
+    response = client.post("/sensor-data/batch", json={"readings": [{**reading, "id": "x"}]})
+    assert response.status_code == 200
+    assert response.json["results"][0]["status"] == "success"
@@ -0,0 +1,13 @@
+READING = {"N": 50.0, "P": 40.0, "K": 40.0, "moisture": 30.0, "temperature": 25.0, "pH": 6.5,
+           "device_id": "metrics-01", "seq": 1}
+
+
+def json_parse_count(server):
+    values = server.metrics.collect().get((server.STAGE_SECONDS, ("json_parse",)))
+    return 0 if values is None else values[-1]
+
+
+def test_upload_records_one_json_parse(server, client):
+    before = json_parse_count(server)
+    assert client.post("/sensor-data", json=READING).status_code == 200
+    assert json_parse_count(server) - before == 1
@@ -0,0 +1,37 @@
+from tests.conftest import PROFILE_DEVICE, PROFILE_REGION
+
+
+def test_profile_overlays_change_crop_ranges(server):
+    base = server.crop_ranges("maize")
+    regional = server.crop_ranges("maize", (PROFILE_REGION, None))
+    dry = server.crop_ranges("maize", (PROFILE_REGION, "dry"))
+    assert regional != base
+    assert regional["moisture"] == {"min": 40, "max": 60} and regional["N"] == {"min": 50, "max": 90}
+    # the seasonal overlay applies on top of the regional one
+    assert dry["moisture"] == {"min": 30, "max": 50} and dry["N"] == regional["N"]
+    assert base["pH"] == regional["pH"] == dry["pH"]
+
+
+def test_device_metadata_selects_the_profile(client):
+    profiled = client.get("/ideal-ranges/maize?season=dry", headers={"X-Device-Id": PROFILE_DEVICE}).json
+    assert profiled["profile"] == {"region": PROFILE_REGION, "season": "dry"}
+    anonymous = client.get("/ideal-ranges/maize?season=dry").json
+    assert anonymous["profile"]["region"] is None
+    assert anonymous["ranges"] != profiled["ranges"]
+
+
+def test_non_scalar_device_ids_are_ignored(client):
+    sensor = {"N": 50, "P": 40, "K": 40, "moisture": 30, "temperature": 25, "pH": 6.5}
+    for device in (["a"], {"id": 1}):
+        response = client.post("/fertilizer-plan", json={"sensor_data": sensor, "crop": "maize", "device_id": device})
+        assert response.status_code == 200
+
+
+def test_if_modified_since_only_revalidates_base_ranges(client):
+    base = client.get("/ideal-ranges/maize")
+    since = {"If-Modified-Since": base.headers["Last-Modified"]}
+    assert client.get("/ideal-ranges/maize", headers=since).status_code == 304
+    profiled = client.get("/ideal-ranges/maize", headers={**since, "X-Device-Id": PROFILE_DEVICE})
+    assert profiled.status_code == 200
+    assert "Last-Modified" not in profiled.headers
+    assert profiled.json["ranges"] != base.json["ranges"]
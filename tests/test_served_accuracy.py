@@ -0,0 +1,23 @@
+"""Readings must reach the forest in its training column order (feature_order.pkl)."""
+
+import joblib
+import numpy as np
+import pandas as pd
+from sklearn.base import clone
+
+
+def test_served_accuracy_on_held_out_slice(server, monkeypatch):
+    data = pd.read_csv("Final_crop_data.csv")
+    held_out = np.arange(len(data)) % 5 == 0
+    train = data[~held_out]
+    # a forest like the shipped one, fitted without the held-out rows
+    columns = joblib.load("feature_order.pkl")
+    model = clone(joblib.load("crop_recommendation_model.pkl"))
+    model.fit(train[columns].to_numpy(dtype=float), server.le.transform(train["label"]))
+    monkeypatch.setattr(server, "model", model)
+
+    rows = data[held_out]
+    readings = [{"N": r.N, "P": r.P, "K": r.K, "moisture": r.moisture, "temperature": r.temperature, "pH": r.ph}
+                for r in rows.itertuples()]
+    served = np.array([r["recommended_crop"].lower() for r in server.assess_readings(readings)])
+    assert (served == rows["label"].str.lower().to_numpy()).mean() >= 0.9